@@ -0,0 +1,207 @@
+"""Content-addressed caption cache.
+
+Captions are keyed by a SHA-256 of the image bytes plus the generation
+settings (model, ``max_length``, ``num_beams``, ...), so renamed or copied
+files still hit, and changing any setting never returns a stale caption. A
+hit skips decoding and inference entirely; only the file bytes are read to
+hash them.
+
+Two tiers:
+
+- an in-process LRU (``OrderedDict``) for repeated images within one run
+- an SQLite database shared by all runs and processes (WAL mode), bounded in
+  size: when the stored captions exceed ``max_bytes``, the least recently
+  used ones are evicted down to 90% of the limit
+
+Hits served from memory are written back to the database's ``last_used`` in
+batches: with the next database write, before any eviction, at least every
+``TOUCH_FLUSH_SECONDS`` and on ``close``, so captions that stay hot in
+memory are not the first ones evicted on disk.
+
+The total size is kept in a ``meta`` row maintained by triggers, so checking
+the bound never scans the table.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+DEFAULT_CACHE_FILE = Path(os.environ.get(
+    'CAPTION_CACHE', Path.home() / '.cache' / 'image-caption' / 'captions.sqlite3'))
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 4096
+ROW_OVERHEAD = 48
+LOW_WATER = 0.9
+MAX_QUERY_KEYS = 500
+TOUCH_FLUSH_SECONDS = 5.0
+TOUCH_FLUSH_ENTRIES = 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captions (
+    key BLOB PRIMARY KEY,
+    caption TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS captions_last_used ON captions (last_used);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('bytes', 0);
+CREATE TRIGGER IF NOT EXISTS captions_insert AFTER INSERT ON captions BEGIN
+    UPDATE meta SET value = value + new.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS captions_update AFTER UPDATE OF size ON captions BEGIN
+    UPDATE meta SET value = value + new.size - old.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS captions_delete AFTER DELETE ON captions BEGIN
+    UPDATE meta SET value = value - old.size WHERE name = 'bytes';
+END;
+"""
+
+
+def cache_key(image_bytes: bytes, settings: Mapping) -> bytes:
+    """Hash of the image content and everything that affects its caption"""
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(image_bytes)
+    return digest.digest()
+
+
+class CaptionCache:
+    """Two-tier (memory + SQLite) LRU cache of captions by content key"""
+
+    def __init__(self, path: Path = DEFAULT_CACHE_FILE, max_bytes: int = DEFAULT_MAX_BYTES,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: 'OrderedDict[bytes, str]' = OrderedDict()
+        # Memory hits whose last_used is not on disk yet, and when the oldest happened
+        self._touched: Dict[bytes, float] = {}
+        self._touched_since = 0.0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def _remember(self, key: bytes, caption: str):
+        self._memory[key] = caption
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key: bytes, now: float):
+        if not self._touched:
+            self._touched_since = now
+        self._touched[key] = now
+
+    def _flush_touched(self):
+        """Write pending memory-hit recency to disk (inside the caller's write transaction)"""
+        if self._touched:
+            self._db.executemany("UPDATE captions SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def _flush_due(self, now: float) -> bool:
+        return bool(self._touched) and (len(self._touched) >= TOUCH_FLUSH_ENTRIES
+                                        or now - self._touched_since >= TOUCH_FLUSH_SECONDS)
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, str]:
+        """Return the cached captions among ``keys``, refreshing their recency"""
+        found: Dict[bytes, str] = {}
+        now = time.time()
+        with self._lock:
+            missing = []
+            for key in keys:
+                caption = self._memory.get(key)
+                if caption is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    self._touch(key, now)
+                    found[key] = caption
+            unique = list(dict.fromkeys(missing))
+            rows = []
+            for start in range(0, len(unique), MAX_QUERY_KEYS):
+                chunk = unique[start:start + MAX_QUERY_KEYS]
+                rows += self._db.execute(
+                    f"SELECT key, caption FROM captions WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+            if rows or self._flush_due(now):
+                with self._db:
+                    self._db.execute("BEGIN IMMEDIATE")
+                    self._flush_touched()
+                    self._db.executemany("UPDATE captions SET last_used = ? WHERE key = ?",
+                                         [(now, key) for key, _ in rows])
+                for key, caption in rows:
+                    found[bytes(key)] = caption
+                    self._remember(bytes(key), caption)
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def get(self, key: bytes) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Iterable[Tuple[bytes, str]]):
+        """Store captions, evicting least recently used ones past the size bound"""
+        now = time.time()
+        rows = [(key, caption, len(key) + len(caption.encode('utf-8')) + ROW_OVERHEAD, now)
+                for key, caption in items]
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                # Eviction below must see the recency of memory hits
+                self._flush_touched()
+                self._db.executemany(
+                    "INSERT INTO captions (key, caption, size, last_used) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET caption = excluded.caption, "
+                    "size = excluded.size, last_used = excluded.last_used", rows)
+                self._evict()
+            for key, caption, _, _ in rows:
+                self._remember(key, caption)
+
+    def put(self, key: bytes, caption: str):
+        self.put_many([(key, caption)])
+
+    def _evict(self):
+        total = self.size_bytes()
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * LOW_WATER)
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM captions ORDER BY last_used"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM captions WHERE key = ?", victims)
+        for (key,) in victims:
+            self._memory.pop(bytes(key), None)
+
+    def size_bytes(self) -> int:
+        """Approximate bytes of captions stored on disk"""
+        return self._db.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT count(*) FROM captions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._touched:
+                with self._db:
+                    self._db.execute("BEGIN IMMEDIATE")
+                    self._flush_touched()
+            self._db.close()
@@ -0,0 +1,172 @@
+"""Reduced-resolution decode and NumPy preprocessing for captioning.
+
+``ViTImageProcessor`` needs the fully decoded image, which for a
+multi-megapixel JPEG like ``Sunset.jpg`` means decoding ~11 million pixels to
+keep 50 thousand. This path asks libjpeg for a reduced-size decode instead
+(PIL's draft mode scales by 1/2, 1/4 or 1/8 in the DCT domain), keeping at
+least ``draft_factor`` times the target size so the final resize still has
+enough pixels to filter. The image is then resized with the processor's
+filter and stored as a small uint8 array.
+
+Normalization is done per batch: every image is converted straight into a
+preallocated ``(batch, 3, H, W)`` float32 buffer with the processor's
+rescale, mean and std folded into one multiply-subtract per channel. No
+per-image float arrays or tensors are allocated, and ``torch.from_numpy``
+on the buffer shares its memory.
+
+Non-JPEG images are decoded in full, so for them the output matches the
+processor up to float rounding. For JPEGs, check that captions stay the same::
+
+    python fast_preprocess.py                 # sample images
+    python fast_preprocess.py photos/*.jpg
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from instrumentation import stage
+
+DEFAULT_DRAFT_FACTOR = 2
+
+
+class FastPreprocessor:
+    """Draft-mode decoder plus batch normalizer into a reused buffer.
+
+    The defaults are the processor settings of
+    ``nlpconnect/vit-gpt2-image-captioning``; ``from_processor`` reads them
+    from any ``ViTImageProcessor``. ``normalize_batch`` returns a view of the
+    internal buffer that is only valid until the next call, so use one
+    instance per inference thread.
+    """
+
+    def __init__(self, size: Tuple[int, int] = (224, 224), resample: int = Image.BILINEAR,
+                 image_mean: Sequence[float] = (0.5, 0.5, 0.5), image_std: Sequence[float] = (0.5, 0.5, 0.5),
+                 rescale_factor: float = 1 / 255, draft: bool = True, draft_factor: int = DEFAULT_DRAFT_FACTOR):
+        self.size = size  # (height, width)
+        self.resample = resample
+        self.draft = draft
+        self.draft_factor = draft_factor
+        mean = np.asarray(image_mean, dtype=np.float32)
+        std = np.asarray(image_std, dtype=np.float32)
+        # (x * rescale - mean) / std == x * scale - offset
+        self._scale = (np.float32(rescale_factor) / std).reshape(3, 1, 1)
+        self._offset = (mean / std).reshape(3, 1, 1)
+        self._buffer = np.empty((0, 3) + tuple(size), dtype=np.float32)
+
+    @classmethod
+    def from_processor(cls, processor, **options) -> 'FastPreprocessor':
+        """Use the resize and normalization settings of a ``ViTImageProcessor``"""
+        size = processor.size
+        if isinstance(size, dict):
+            size = (size['height'], size['width'])
+        elif isinstance(size, int):
+            size = (size, size)
+        rescale = processor.rescale_factor if getattr(processor, 'do_rescale', True) else 1.0
+        if getattr(processor, 'do_normalize', True):
+            mean, std = processor.image_mean, processor.image_std
+        else:
+            mean, std = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+        return cls(tuple(size), int(processor.resample), mean, std, rescale, **options)
+
+    def load_resized(self, source: Union[str, bytes, os.PathLike]) -> np.ndarray:
+        """Decode (at reduced resolution for JPEGs) and resize to an (H, W, 3) uint8 array"""
+        with stage('open'):
+            image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        height, width = self.size
+        if self.draft and image.format == 'JPEG':
+            image.draft('RGB', (width * self.draft_factor, height * self.draft_factor))
+        with stage('decode'):
+            image.load()
+        if image.mode != "RGB":
+            with stage('convert'):
+                image = image.convert(mode="RGB")
+        if image.size != (width, height):
+            with stage('resize'):
+                image = image.resize((width, height), self.resample)
+        return np.asarray(image)
+
+    def normalize_batch(self, images: Sequence[np.ndarray]) -> np.ndarray:
+        """Normalize uint8 (H, W, 3) images into the shared (N, 3, H, W) float32 buffer"""
+        count = len(images)
+        if self._buffer.shape[0] < count:
+            self._buffer = np.empty((count, 3) + tuple(self.size), dtype=np.float32)
+        batch = self._buffer[:count]
+        with stage('normalize'):
+            for index, image in enumerate(images):
+                np.multiply(image.transpose(2, 0, 1), self._scale, out=batch[index], casting='unsafe')
+            batch -= self._offset
+        return batch
+
+    def __call__(self, sources: Sequence[Union[str, bytes, os.PathLike]]) -> np.ndarray:
+        return self.normalize_batch([self.load_resized(source) for source in sources])
+
+
+def fast_preprocessor(**options) -> FastPreprocessor:
+    """A fast preprocessor for the captioning model (without loading it)"""
+    return FastPreprocessor(**options)
+
+
+def compare(paths: Sequence[str], draft_factor: int = DEFAULT_DRAFT_FACTOR) -> List[dict]:
+    """Compare pixels, captions and preprocessing time with the processor path"""
+    from image_caption import decode, generate, get_model, load_image, preprocess
+
+    fast = FastPreprocessor.from_processor(get_model().feature_extractor, draft_factor=draft_factor)
+    rows = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        reference = preprocess([load_image(data)])
+        reference_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        pixels = fast([data])
+        fast_seconds = time.perf_counter() - start
+
+        reference_caption = decode(generate(reference))[0]
+        fast_caption = decode(generate(pixels))[0]
+        rows.append({
+            'path': path,
+            'max_pixel_difference': float(np.abs(reference - pixels).max()),
+            'reference_caption': reference_caption,
+            'fast_caption': fast_caption,
+            'reference_seconds': reference_seconds,
+            'fast_seconds': fast_seconds,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from image_caption import SAMPLE_IMAGES
+
+    parser = argparse.ArgumentParser(description="Check the fast preprocessing path against the processor")
+    parser.add_argument('images', nargs='*', help="images to check (default: samples)")
+    parser.add_argument('--draft-factor', type=int, default=DEFAULT_DRAFT_FACTOR,
+                        help="decode JPEGs to at least this multiple of the model input size")
+    args = parser.parse_args(argv)
+
+    here = Path(__file__).parent
+    paths = args.images or [str(here / name) for name in SAMPLE_IMAGES]
+    rows = compare(paths, args.draft_factor)
+    mismatches = 0
+    for row in rows:
+        same = row['fast_caption'] == row['reference_caption']
+        mismatches += not same
+        print(f"{'✅' if same else '❌'} {os.path.basename(row['path'])}: "
+              f"preprocess {row['reference_seconds'] * 1000:.0f} ms -> {row['fast_seconds'] * 1000:.0f} ms, "
+              f"max pixel difference {row['max_pixel_difference']:.3f}")
+        print(f"   processor: {row['reference_caption']}")
+        if not same:
+            print(f"   fast:      {row['fast_caption']}")
+    print(f"\n{len(rows) - mismatches}/{len(rows)} captions identical")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,21 @@
 """
-IMAGE CAPTIONING 
+IMAGE CAPTIONING
+
+Caption one image, a list of images or whole photo folders:
+
+    python image_caption.py                              # sample images
+    python image_caption.py photos/ more.jpg --batch-size 16 > captions.jsonl
+    find archive -name '*.jpg' | python image_caption.py --list - -o captions.jsonl
+
+Importing this module is cheap and has no side effects: transformers and
+torch are imported and the model is loaded on the first caption. With a
+local snapshot (``python image_caption.py --snapshot``) the weights are read
+offline from memory-mapped safetensors files. Start a long-lived worker with
+``python worker.py`` and later invocations hand their images to it over a
+Unix socket instead of loading the model themselves.
 """
+import time
+STARTED = time.perf_counter()
 
 # Suppress all warnings and messages
 import warnings
@@ -10,76 +25,472 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 os.environ['TRANSFORMERS_VERBOSITY'] = 'error'
 
-# Import libraries (silently)
-from transformers import VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer
-from transformers import logging as transformers_logging
-transformers_logging.set_verbosity_error()
+import argparse
+import io
+import json
+import struct
+import sys
+import threading
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
 
-import torch
 from PIL import Image
 
-# Load model silently
-print("Loading model...")
-model = VisionEncoderDecoderModel.from_pretrained("nlpconnect/vit-gpt2-image-captioning")
-feature_extractor = ViTImageProcessor.from_pretrained("nlpconnect/vit-gpt2-image-captioning")
-tokenizer = AutoTokenizer.from_pretrained("nlpconnect/vit-gpt2-image-captioning")
+import instrumentation
+from caption_cache import DEFAULT_CACHE_FILE, DEFAULT_MAX_BYTES, CaptionCache, cache_key
+from inference_modes import MODES
+from instrumentation import active, emit, new_record, stage
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
-print("Model ready!\n")
+MODEL_NAME = "nlpconnect/vit-gpt2-image-captioning"
+SNAPSHOT_DIR = Path(os.environ.get('CAPTION_MODEL_DIR', Path(__file__).with_name('model')))
+MAX_LENGTH = 16
+NUM_BEAMS = 4
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tif', '.tiff'}
+SAMPLE_IMAGES = ["Cat.jpg", "Dog.jpg", "Sunset.jpg"]
 
-def caption_image(image_path):
-    """Generate caption for an image (silent mode)"""
-    image = Image.open(image_path)
+# What PIL raises for unreadable, corrupt or oversized images; each becomes a
+# per-image error instead of ending the batch
+DECODE_ERRORS = (OSError, ValueError, SyntaxError, EOFError, struct.error, Image.DecompressionBombError)
+
+
+class CaptionModel(NamedTuple):
+    model: Any
+    feature_extractor: Any
+    tokenizer: Any
+    device: Any
+    load_seconds: float
+    mode: str = 'fp32'
+
+
+# Inference settings (see inference_modes.py); change them with configure()
+INFERENCE_MODE = os.environ.get('CAPTION_MODE', 'fp32')
+THREADS = int(os.environ.get('CAPTION_THREADS', 0)) or None
+INTEROP_THREADS = int(os.environ.get('CAPTION_INTEROP_THREADS', 0)) or None
+# Reduced-resolution JPEG decode and NumPy preprocessing (see fast_preprocess.py)
+FAST_PREPROCESS = os.environ.get('CAPTION_FAST_PREPROCESS', '') not in ('', '0')
+
+_loaded_models: Dict[str, CaptionModel] = {}
+_load_lock = threading.Lock()
+
+
+def configure(mode: Optional[str] = None, threads: Optional[int] = None, interop_threads: Optional[int] = None,
+              fast_preprocess: Optional[bool] = None):
+    """Choose the inference mode, thread counts and preprocessing used by later captions"""
+    global INFERENCE_MODE, THREADS, INTEROP_THREADS, FAST_PREPROCESS
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown inference mode '{mode}' (choose from {', '.join(MODES)})")
+        INFERENCE_MODE = mode
+    THREADS = threads or THREADS
+    INTEROP_THREADS = interop_threads or INTEROP_THREADS
+    if fast_preprocess is not None:
+        FAST_PREPROCESS = fast_preprocess
+
+
+def _import_transformers():
+    # Import libraries (silently)
+    import torch
+    from transformers import VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer
+    from transformers import logging as transformers_logging
+    transformers_logging.set_verbosity_error()
+    return torch, VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer
+
+
+def get_model(mode: Optional[str] = None) -> CaptionModel:
+    """Load the model for an inference mode on first use, once per process.
+
+    A local snapshot in ``SNAPSHOT_DIR`` is loaded offline, with the
+    safetensors weights memory-mapped instead of read into fresh buffers;
+    otherwise the model comes from the Hugging Face hub (or its cache).
+    """
+    mode = mode or INFERENCE_MODE
+    loaded = _loaded_models.get(mode)
+    if loaded is not None:
+        return loaded
+    with _load_lock:
+        if mode in _loaded_models:
+            return _loaded_models[mode]
+        import inference_modes
+        effective_mode = inference_modes.resolve_mode(mode)
+        # A mode that falls back (bf16 without native support) shares the fallback's model
+        if effective_mode in _loaded_models:
+            _loaded_models[mode] = _loaded_models[effective_mode]
+            return _loaded_models[mode]
+        start = time.perf_counter()
+        torch, VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer = _import_transformers()
+        inference_modes.set_threads(THREADS, INTEROP_THREADS)
+        # Load model silently (status goes to stderr so stdout stays clean JSONL)
+        print(f"Loading model ({effective_mode})...", file=sys.stderr)
+        if (SNAPSHOT_DIR / 'config.json').exists():
+            source, options = str(SNAPSHOT_DIR), {'local_files_only': True, 'use_safetensors': True}
+        else:
+            source, options = MODEL_NAME, {}
+        feature_extractor = ViTImageProcessor.from_pretrained(source, **options)
+        tokenizer = AutoTokenizer.from_pretrained(source, **options)
+
+        # The reduced-precision modes are CPU modes
+        use_cuda = effective_mode == 'fp32' and torch.cuda.is_available()
+        device = torch.device("cuda" if use_cuda else "cpu")
+        if effective_mode == 'onnx':
+            model = inference_modes.load_onnx(source, THREADS, INTEROP_THREADS)
+        else:
+            model = VisionEncoderDecoderModel.from_pretrained(source, low_cpu_mem_usage=True, **options)
+            model.to(device)
+            model.eval()
+            if effective_mode == 'int8':
+                model = inference_modes.quantize_int8(model)
+        loaded = CaptionModel(model, feature_extractor, tokenizer, device,
+                              time.perf_counter() - start, effective_mode)
+        _loaded_models[effective_mode] = _loaded_models[mode] = loaded
+        print("Model ready!\n", file=sys.stderr)
+        return loaded
+
+
+def save_snapshot(path: Path = SNAPSHOT_DIR) -> Path:
+    """Download the model once and store it locally as safetensors for offline loading"""
+    _, VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer = _import_transformers()
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    VisionEncoderDecoderModel.from_pretrained(MODEL_NAME).save_pretrained(path, safe_serialization=True)
+    ViTImageProcessor.from_pretrained(MODEL_NAME).save_pretrained(path)
+    AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(path)
+    return path
+
+
+def load_image(image_path):
+    """Open and decode an image (a path, or the file's bytes) as RGB"""
+    with stage('open'):
+        image = Image.open(io.BytesIO(image_path) if isinstance(image_path, bytes) else image_path)
+    with stage('decode'):
+        image.load()  # decode now, so a broken file fails here and not mid-batch
     if image.mode != "RGB":
-        image = image.convert(mode="RGB")
-    
-    pixel_values = feature_extractor(images=image, return_tensors="pt").pixel_values
-    pixel_values = pixel_values.to(device)
-    
+        with stage('convert'):
+            image = image.convert(mode="RGB")
+    return image
+
+
+def decode_error_message(error: Exception, path: Optional[str] = None) -> str:
+    """The error reported for an image that failed to decode"""
+    if isinstance(error, Image.UnidentifiedImageError):
+        # PIL names the in-memory buffer instead of the file
+        return f"cannot identify image file {path!r}" if path is not None else "cannot identify image file"
+    return str(error) or type(error).__name__
+
+
+def generation_settings() -> Dict:
+    """Everything that changes the caption produced for a given image"""
+    from inference_modes import effective_mode
+    settings = {"model": MODEL_NAME, "max_length": MAX_LENGTH, "num_beams": NUM_BEAMS}
+    # Keyed on the mode that runs: bf16 falling back to fp32 produces fp32 captions
+    mode = effective_mode(INFERENCE_MODE)
+    if mode != 'fp32':
+        # fp32 keys stay as they were before inference modes existed
+        settings["mode"] = mode
+    if FAST_PREPROCESS:
+        settings["preprocess"] = "draft"
+    return settings
+
+
+def preprocess(images: List[Image.Image], loaded: Optional[CaptionModel] = None):
+    """Resize and normalize decoded images into a (N, 3, 224, 224) float array"""
+    feature_extractor = (loaded or get_model()).feature_extractor
+    with stage('preprocess'):
+        return feature_extractor(images=images, return_tensors="np").pixel_values
+
+
+def generate(pixel_values, loaded: Optional[CaptionModel] = None, **generate_kwargs):
+    """Run the encoder and beam search on a preprocessed batch"""
+    import torch
+    from inference_modes import inference_context
+    loaded = loaded or get_model()
+    with stage('to_device', process_cpu=True):
+        pixel_values = torch.from_numpy(pixel_values).to(loaded.device)
+    generate_kwargs = {"max_length": MAX_LENGTH, "num_beams": NUM_BEAMS, **generate_kwargs}
+
     # Generate with no warnings
-    with warnings.catch_warnings():
+    with warnings.catch_warnings(), inference_context(loaded.mode), instrumentation.generate_stage(loaded.model):
         warnings.simplefilter("ignore")
-        output_ids = model.generate(pixel_values, max_length=16, num_beams=4)
-    
-    caption = tokenizer.decode(output_ids[0], skip_special_tokens=True)
-    return caption
-
-# ========== CHANGE YOUR IMAGE HERE ==========
-image_path = "Sunset.jpg"  # 👈 Change to your image!
-# ============================================
-
-print("="*50)
-print("IMAGE CAPTIONING RESULTS")
-print("="*50 + "\n")
-
-# Caption single image
-if os.path.exists(image_path):
-    caption = caption_image(image_path)
-    print(f"📸 {image_path}")
-    print(f"💬 {caption}\n")
-else:
-    print(f"❌ File not found: {image_path}\n")
-
-# Caption multiple images
-print("-"*50)
-print("Multiple Images:")
-print("-"*50 + "\n")
-
-# ========== ADD YOUR IMAGES HERE ==========
-images = [
-    "cat.jpg",
-    "dog.jpg"
-]
-# ==========================================
-
-for img in images:
-    if os.path.exists(img):
-        caption = caption_image(img)
-        print(f"📸 {img} → {caption}")
-    else:
-        print(f"⚠️  {img} → Not found")
-
-print("\n" + "="*50)
-print("✅ Done!")
-print("="*50)
+        return loaded.model.generate(pixel_values, **generate_kwargs)
+
+
+def decode(output_ids, loaded: Optional[CaptionModel] = None) -> List[str]:
+    """Turn generated token ids into caption strings"""
+    tokenizer = (loaded or get_model()).tokenizer
+    with stage('detokenize'):
+        return [caption.strip() for caption in tokenizer.batch_decode(output_ids, skip_special_tokens=True)]
+
+
+def caption_batch(images: List[Image.Image], loaded: Optional[CaptionModel] = None) -> List[str]:
+    """Caption several decoded images with one encoder pass and one beam search"""
+    # Every image is resized to the same 224x224 input, so the batch stacks
+    # without padding; generate pads the shorter captions with pad tokens
+    loaded = loaded or get_model()
+    return decode(generate(preprocess(images, loaded), loaded), loaded)
+
+
+def caption_image(image_path, cache: Optional['CaptionCache'] = None):
+    """Generate caption for an image (silent mode)"""
+    result = next(caption_images([image_path], cache=cache))
+    if "error" in result:
+        raise OSError(result["error"])
+    return result["caption"]
+
+
+def caption_images(paths: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                   cache: Optional['CaptionCache'] = None) -> Iterator[Dict]:
+    """Caption images in batches, yielding one result per path in input order.
+
+    Results are ``{"path": ..., "caption": ...}``, or ``{"path": ..., "error": ...}``
+    for files that cannot be read; they are produced batch by batch, so
+    arbitrarily long path streams use bounded memory. With a ``cache``, images
+    whose content was captioned before (with the same settings) are neither
+    decoded nor run through the model. Identical images within a batch are
+    captioned once either way.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    settings = generation_settings()
+    fast = None
+    if FAST_PREPROCESS:
+        from fast_preprocess import fast_preprocessor
+        fast = fast_preprocessor()
+    paths = iter(paths)
+    while True:
+        chunk = list(islice(paths, batch_size))
+        if not chunk:
+            return
+        results: List[Dict] = []
+        records = []
+        contents: Dict[bytes, bytes] = {}
+        waiting: Dict[bytes, List[Dict]] = {}
+        image_records = {}
+        for path in chunk:
+            result = {"path": str(path)}
+            results.append(result)
+            record = new_record('image', path=str(path))
+            records.append(record)
+            try:
+                with active(record), stage('read'):
+                    with open(path, 'rb') as f:
+                        data = f.read()
+            except OSError as e:
+                result["error"] = str(e)
+                continue
+            key = cache_key(data, settings)
+            contents[key] = data
+            waiting.setdefault(key, []).append(result)
+            image_records.setdefault(key, record)
+
+        if cache is not None and waiting:
+            for key, caption in cache.get_many(list(waiting)).items():
+                for result in waiting.pop(key):
+                    result["caption"] = caption
+
+        images = []
+        keys = []
+        for key in waiting:
+            try:
+                with active(image_records[key]):
+                    images.append(fast.load_resized(contents[key]) if fast else load_image(contents[key]))
+                keys.append(key)
+            except DECODE_ERRORS as e:
+                for result in waiting[key]:
+                    result["error"] = decode_error_message(e, result["path"])
+        if images:
+            batch_record = new_record('batch', size=len(images))
+            with active(batch_record):
+                captions = decode(generate(fast.normalize_batch(images))) if fast else caption_batch(images)
+            emit(batch_record)
+            for key, caption in zip(keys, captions):
+                for result in waiting[key]:
+                    result["caption"] = caption
+            if cache is not None:
+                cache.put_many(zip(keys, captions))
+        for record in records:
+            emit(record)
+        yield from results
+
+
+def iter_image_paths(inputs: Iterable[str]) -> Iterator[str]:
+    """Expand directories (recursively, in sorted order) into image files"""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        yield os.path.join(root, name)
+        else:
+            yield item
+
+
+def read_path_list(list_file: str) -> Iterator[str]:
+    """Paths from a file (or '-' for stdin), one per line"""
+    stream = sys.stdin if list_file == '-' else open(list_file, encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def show_samples():
+    """Caption the bundled sample images"""
+    print("="*50)
+    print("IMAGE CAPTIONING RESULTS")
+    print("="*50 + "\n")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    images = [os.path.join(here, name) for name in SAMPLE_IMAGES]
+    found = [img for img in images if os.path.exists(img)]
+    for img in images:
+        if img not in found:
+            print(f"⚠️  {os.path.basename(img)} → Not found")
+    for result in caption_images(found):
+        name = os.path.basename(result["path"])
+        if "error" in result:
+            print(f"❌ {name} → {result['error']}")
+        else:
+            print(f"📸 {name} → {result['caption']}")
+
+    print("\n" + "="*50)
+    print("✅ Done!")
+    print("="*50)
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--cache', type=Path, default=DEFAULT_CACHE_FILE, help="caption cache database")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help="cache size limit in MB (least recently used captions are evicted)")
+    parser.add_argument('--no-cache', action='store_true', help="always run the model")
+
+
+def add_inference_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--mode', choices=MODES, default=INFERENCE_MODE,
+                        help="inference mode (see inference_modes.py)")
+    parser.add_argument('--threads', type=int, default=THREADS, help="intra-op threads")
+    parser.add_argument('--interop-threads', type=int, default=INTEROP_THREADS, help="inter-op threads")
+    parser.add_argument('--fast-preprocess', action='store_true', default=FAST_PREPROCESS,
+                        help="decode JPEGs at reduced resolution and preprocess with NumPy")
+
+
+def add_timing_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--stages', metavar='FILE', default=None,
+                        help="append per-stage timings as JSON lines ('-': stderr; see instrumentation.py)")
+    parser.add_argument('--stages-prometheus', metavar='FILE', default=None,
+                        help="write stage timing totals in Prometheus text format at exit ('-': stderr)")
+
+
+def open_cache(args: argparse.Namespace) -> Optional[CaptionCache]:
+    if args.no_cache:
+        return None
+    return CaptionCache(args.cache, max_bytes=int(args.cache_size * 2**20))
+
+
+def session_settings(args: argparse.Namespace) -> Dict:
+    """Settings a caption worker must share with this process to caption the way it would"""
+    from inference_modes import effective_mode
+    return {
+        "mode": effective_mode(INFERENCE_MODE),
+        "threads": THREADS,
+        "interop_threads": INTEROP_THREADS,
+        "fast_preprocess": FAST_PREPROCESS,
+        "workers": args.workers,
+        "cache": None if args.no_cache else str(Path(args.cache).expanduser().resolve()),
+        "cache_size": args.cache_size,
+    }
+
+
+def run_captioning(paths: Iterable[str], batch_size: int, workers: int,
+                   cache: Optional[CaptionCache] = None) -> Iterator[Dict]:
+    """Overlapped pipeline with ``workers`` decode threads, or the serial path for 0"""
+    if workers:
+        from pipeline import caption_pipeline
+        return caption_pipeline(paths, batch_size, workers, cache=cache)
+    return caption_images(paths, batch_size, cache)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Caption images with ViT-GPT2 and write JSON lines")
+    parser.add_argument('paths', nargs='*', help="image files or directories (searched recursively)")
+    parser.add_argument('--list', dest='list_file', help="file with one image path per line ('-' for stdin)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="decode/preprocess threads overlapping with inference (0: run serially)")
+    parser.add_argument('-o', '--output', help="JSONL output file (default: stdout)")
+    parser.add_argument('--socket', type=Path, default=None, help="caption worker socket (see worker.py)")
+    parser.add_argument('--no-worker', action='store_true', help="always load the model in this process")
+    parser.add_argument('--snapshot', action='store_true',
+                        help=f"save a local safetensors snapshot of the model to {SNAPSHOT_DIR} and exit")
+    parser.add_argument('--timings', action='store_true', help="report startup and time-to-first-caption")
+    add_cache_arguments(parser)
+    add_inference_arguments(parser)
+    add_timing_arguments(parser)
+    args = parser.parse_args(argv)
+    configure(args.mode, args.threads, args.interop_threads, args.fast_preprocess)
+    instrumentation.configure(args.stages, args.stages_prometheus)
+
+    if args.snapshot:
+        print(f"Model snapshot saved to {save_snapshot()}")
+        return 0
+    if not args.paths and not args.list_file:
+        show_samples()
+        return 0
+
+    started_main = time.perf_counter()
+    inputs = iter_image_paths(chain(args.paths, read_path_list(args.list_file) if args.list_file else []))
+    worker_socket = None
+    if not args.no_worker:
+        import worker
+        worker_socket = worker.connect(args.socket or worker.DEFAULT_SOCKET)
+    cache = None
+    if worker_socket is not None:
+        try:
+            # The worker has its own cache; it refuses requests for other settings
+            results = worker.caption_via_worker(worker_socket, inputs, args.batch_size, session_settings(args))
+        except ConnectionError as e:
+            print(f"⚠️  {e}; captioning in this process instead", file=sys.stderr)
+            worker_socket = None
+    if worker_socket is None:
+        cache = open_cache(args)
+        results = run_captioning(inputs, args.batch_size, args.workers, cache)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    failures = 0
+    count = 0
+    first_caption = None
+    try:
+        with instrumentation.profiled():
+            for result in results:
+                if first_caption is None:
+                    first_caption = time.perf_counter()
+                count += 1
+                failures += "error" in result
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if cache is not None:
+            cache.close()
+
+    if args.timings:
+        finished = time.perf_counter()
+        mode = "worker" if worker_socket is not None else "in-process"
+        loaded = _loaded_models.get(INFERENCE_MODE)
+        load = f"{loaded.load_seconds:.2f}s" if loaded else "none"
+        first = f"{first_caption - STARTED:.2f}s" if first_caption else "n/a"
+        hits = f" | cache hits {cache.hits}/{cache.hits + cache.misses}" if cache is not None else ""
+        print(f"[{mode}] import {started_main - STARTED:.3f}s | model load {load} | "
+              f"first caption {first} | {count} images in {finished - STARTED:.2f}s{hits}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
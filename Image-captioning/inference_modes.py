@@ -0,0 +1,192 @@
+"""CPU inference modes for the ViT-GPT2 captioner.
+
+- ``fp32``: the original full-precision eager model
+- ``int8``: dynamic int8 quantization of every linear layer, in the ViT
+  encoder and in the GPT-2 decoder (GPT-2's ``Conv1D`` projections are turned
+  into ``nn.Linear`` first so they are quantized too). Weights are stored as
+  int8 and activations are quantized on the fly
+- ``bf16``: bfloat16 autocast. Only used when the CPU has native bf16
+  (AVX512-BF16 or AMX); elsewhere bf16 is emulated and slower than fp32, so
+  the model stays in fp32
+- ``onnx``: the model exported to ONNX Runtime through ``optimum``
+  (``pip install optimum[onnxruntime]``), exported once and reused from
+  ``model-onnx/``
+
+Every mode runs under ``torch.inference_mode``. Because cheaper modes can
+change captions, compare a mode against fp32 on the sample images before
+using it::
+
+    python inference_modes.py --modes int8 bf16 onnx --threads 4
+"""
+import argparse
+import contextlib
+import difflib
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+MODES = ('fp32', 'int8', 'bf16', 'onnx')
+ONNX_DIR = Path(os.environ.get('CAPTION_ONNX_DIR', Path(__file__).with_name('model-onnx')))
+
+
+def cpu_supports_bf16() -> bool:
+    """True if the CPU computes bfloat16 natively"""
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as f:
+            flags = next((line for line in f if line.startswith('flags')), '')
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags.split() or 'amx_bf16' in flags.split()
+
+
+def set_threads(intra_op: Optional[int] = None, inter_op: Optional[int] = None):
+    """Set torch's intra-op and inter-op thread pools (before the first inference)"""
+    import torch
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # Only allowed once, before any inter-op work has started
+            print("Inter-op threads already fixed for this process", file=sys.stderr)
+
+
+def _linearize_conv1d(module) -> int:
+    """Replace GPT-2 ``Conv1D`` layers by equivalent ``nn.Linear`` ones"""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+    replaced = 0
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            # Conv1D stores its weight as (in, out); Linear as (out, in)
+            linear = torch.nn.Linear(child.weight.shape[0], child.nf)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+            replaced += 1
+        else:
+            replaced += _linearize_conv1d(child)
+    return replaced
+
+
+def quantize_int8(model):
+    """Dynamically quantize every linear layer of the encoder and decoder to int8"""
+    import torch
+    _linearize_conv1d(model.decoder)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_onnx(source: str, intra_op: Optional[int] = None, inter_op: Optional[int] = None):
+    """ONNX Runtime model with the ``generate`` API, exported on first use"""
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForVision2Seq
+    except ImportError as e:
+        raise RuntimeError("The onnx mode needs optimum with ONNX Runtime: "
+                           "pip install optimum[onnxruntime]") from e
+    options = onnxruntime.SessionOptions()
+    if intra_op:
+        options.intra_op_num_threads = intra_op
+    if inter_op:
+        options.inter_op_num_threads = inter_op
+    if (ONNX_DIR / 'config.json').exists():
+        return ORTModelForVision2Seq.from_pretrained(ONNX_DIR, session_options=options)
+    model = ORTModelForVision2Seq.from_pretrained(source, export=True, session_options=options)
+    model.save_pretrained(ONNX_DIR)
+    return model
+
+
+def effective_mode(mode: str) -> str:
+    """The mode that will actually run on this machine"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown inference mode '{mode}' (choose from {', '.join(MODES)})")
+    if mode == 'bf16' and not cpu_supports_bf16():
+        return 'fp32'
+    return mode
+
+
+def resolve_mode(mode: str) -> str:
+    """``effective_mode``, saying so when the requested mode is not available"""
+    effective = effective_mode(mode)
+    if effective != mode:
+        print(f"No native {mode} on this CPU; using {effective}", file=sys.stderr)
+    return effective
+
+
+def inference_context(mode: str):
+    """Context manager for one generate call in ``mode``"""
+    import torch
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if mode == 'bf16':
+        stack.enter_context(torch.autocast('cpu', dtype=torch.bfloat16))
+    return stack
+
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a.split(), b.split()).ratio()
+
+
+def compare_modes(modes: Sequence[str], image_paths: Sequence[str], repeats: int = 3) -> List[Dict]:
+    """Caption ``image_paths`` in fp32 and every mode; report agreement and speed"""
+    from image_caption import caption_batch, get_model, load_image
+
+    images = [load_image(path) for path in image_paths]
+    rows = []
+    reference = None
+    reference_seconds = None
+    for mode in ('fp32',) + tuple(m for m in modes if m != 'fp32'):
+        loaded = get_model(mode)
+        captions = caption_batch(images, loaded)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            captions = caption_batch(images, loaded)
+        seconds = (time.perf_counter() - start) / repeats / len(images)
+        if reference is None:
+            reference, reference_seconds = captions, seconds
+        rows.append({
+            'mode': mode,
+            'effective_mode': loaded.mode,
+            'captions': captions,
+            'exact': sum(a == b for a, b in zip(captions, reference)),
+            'similarity': sum(_similarity(a, b) for a, b in zip(captions, reference)) / len(images),
+            'seconds_per_image': seconds,
+            'speedup': reference_seconds / seconds,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from image_caption import SAMPLE_IMAGES, configure
+
+    parser = argparse.ArgumentParser(description="Compare captioning inference modes against fp32")
+    parser.add_argument('--modes', nargs='+', default=['int8', 'bf16'], choices=MODES)
+    parser.add_argument('--images', nargs='+', default=None, help="images to compare on (default: samples)")
+    parser.add_argument('--threads', type=int, default=None, help="intra-op threads")
+    parser.add_argument('--interop-threads', type=int, default=None, help="inter-op threads")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--min-similarity', type=float, default=0.8,
+                        help="exit with 1 if any mode's mean word similarity to fp32 is lower")
+    args = parser.parse_args(argv)
+
+    here = Path(__file__).parent
+    images = args.images or [str(here / name) for name in SAMPLE_IMAGES]
+    configure(threads=args.threads, interop_threads=args.interop_threads)
+    rows = compare_modes(args.modes, images, args.repeats)
+
+    reference = rows[0]['captions']
+    for row in rows:
+        label = row['mode'] if row['mode'] == row['effective_mode'] else f"{row['mode']} (ran as {row['effective_mode']})"
+        print(f"== {label}: {row['seconds_per_image'] * 1000:.0f} ms/image, {row['speedup']:.2f}x, "
+              f"{row['exact']}/{len(images)} identical, word similarity {row['similarity']:.2f}")
+        for path, caption, expected in zip(images, row['captions'], reference):
+            marker = "=" if caption == expected else "≠"
+            print(f"   {marker} {os.path.basename(path)}: {caption}")
+    return 0 if all(row['similarity'] >= args.min_similarity for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Per-stage timing of the captioning path.
+
+Every step of captioning runs inside a named ``stage``:
+
+- per image: ``read`` (file bytes), ``open`` (PIL header parse), ``decode``,
+  ``convert`` (to RGB), ``resize`` (fast path only)
+- per batch: ``preprocess`` (``feature_extractor``; per image in the
+  pipeline), ``normalize`` (fast path only), ``to_device``, ``generate``,
+  split into ``encoder`` and ``decoder`` (beam search), and ``detokenize``
+
+Stages add their wall and CPU time to the current record, and every finished
+image or batch record also carries the process peak RSS. Image stages use
+the calling thread's CPU time. Model stages use the whole process's CPU
+time, because torch runs them on its own thread pool; in the overlapped
+pipeline that also counts the decode threads running alongside.
+
+Everything is off unless configured, and then ``stage`` is a shared no-op
+context manager::
+
+    CAPTION_STAGES=stages.jsonl python image_caption.py photos/       # JSON line per record
+    CAPTION_STAGES_PROMETHEUS=- python image_caption.py photos/       # totals at exit
+
+(or ``--stages`` / ``--stages-prometheus``; ``-`` is stderr). The Prometheus
+text dump has per-stage ``_sum``/``_count``/``_max`` series and the peak RSS.
+
+``CAPTION_PROFILE`` turns on a profiler around the captioning run without
+code changes: ``cprofile[:file]`` writes ``pstats`` data (the calling thread
+only, so use ``--workers 0`` to see the whole path), ``torch[:file]`` writes a
+Chrome trace of every torch op and prints the top ops to stderr.
+"""
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterator, Optional, TextIO
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# macOS reports ru_maxrss in bytes, Linux in kilobytes
+_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+# Parts of ``generate``, left out of a record's total
+_SUBSTAGES = {'encoder', 'decoder'}
+_NOOP = contextlib.nullcontext()
+
+_jsonl: Optional[TextIO] = None
+_prometheus_path: Optional[str] = None
+_lock = threading.Lock()
+_local = threading.local()
+_batches = itertools.count()
+# (kind, stage) -> [wall sum, cpu sum, count, wall max]
+_totals: Dict[tuple, list] = {}
+_records: Dict[str, int] = {}
+ENABLED = False
+
+
+def peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+class Record:
+    """Stage timings of one image or one batch"""
+    __slots__ = ('kind', 'labels', 'stages')
+
+    def __init__(self, kind: str, labels: Dict):
+        self.kind = kind
+        self.labels = labels
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def add(self, name: str, wall: float, cpu: float):
+        entry = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+
+
+def configure(jsonl: Optional[str] = None, prometheus: Optional[str] = None):
+    """Send records to ``jsonl`` and/or a Prometheus dump at exit (``-``: stderr)"""
+    global _jsonl, _prometheus_path, ENABLED
+    if jsonl and _jsonl is None:
+        _jsonl = sys.stderr if jsonl == '-' else open(jsonl, 'a', encoding='utf-8', buffering=1)
+    if prometheus and _prometheus_path is None:
+        import atexit
+        _prometheus_path = prometheus
+        atexit.register(write_prometheus)
+    ENABLED = _jsonl is not None or _prometheus_path is not None
+
+
+def new_record(kind: str, **labels) -> Optional[Record]:
+    """A record to collect stages into, or None when timing is off"""
+    if not ENABLED:
+        return None
+    if kind == 'batch' and 'batch' not in labels:
+        labels['batch'] = next(_batches)
+    return Record(kind, labels)
+
+
+@contextlib.contextmanager
+def active(record: Optional[Record]) -> Iterator[Optional[Record]]:
+    """Make ``record`` the one this thread's stages are added to"""
+    previous = getattr(_local, 'record', None)
+    _local.record = record
+    try:
+        yield record
+    finally:
+        _local.record = previous
+
+
+@contextlib.contextmanager
+def _timed(record: Record, name: str, process_cpu: bool):
+    cpu_clock = time.process_time if process_cpu else time.thread_time
+    wall, cpu = time.perf_counter(), cpu_clock()
+    try:
+        yield
+    finally:
+        record.add(name, time.perf_counter() - wall, cpu_clock() - cpu)
+
+
+def stage(name: str, process_cpu: bool = False):
+    """Time a block as stage ``name`` of this thread's active record"""
+    record = getattr(_local, 'record', None) if ENABLED else None
+    if record is None:
+        return _NOOP
+    return _timed(record, name, process_cpu)
+
+
+@contextlib.contextmanager
+def _timed_generate(record: Record, model):
+    encoder = {"wall": 0.0, "cpu": 0.0, "start": None}
+
+    def before(module, args):
+        encoder["start"] = (time.perf_counter(), time.process_time())
+
+    def after(module, args, output):
+        wall, cpu = encoder.pop("start")
+        encoder["wall"] += time.perf_counter() - wall
+        encoder["cpu"] += time.process_time() - cpu
+
+    hooks = [model.encoder.register_forward_pre_hook(before), model.encoder.register_forward_hook(after)]
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        for hook in hooks:
+            hook.remove()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        record.add("generate", wall, cpu)
+        record.add("encoder", encoder["wall"], encoder["cpu"])
+        record.add("decoder", wall - encoder["wall"], cpu - encoder["cpu"])
+
+
+def generate_stage(model):
+    """Time ``model.generate``, split into the encoder pass and the decoder steps"""
+    record = getattr(_local, 'record', None) if ENABLED else None
+    if record is None:
+        return _NOOP
+    if not hasattr(getattr(model, 'encoder', None), 'register_forward_pre_hook'):
+        # ONNX Runtime models have no torch encoder to hook
+        return _timed(record, "generate", True)
+    return _timed_generate(record, model)
+
+
+def emit(record: Optional[Record]):
+    """Finish a record: add it to the totals and write its JSON line"""
+    if record is None:
+        return
+    rss = peak_rss_bytes()
+    with _lock:
+        _records[record.kind] = _records.get(record.kind, 0) + 1
+        for name, entry in record.stages.items():
+            totals = _totals.setdefault((record.kind, name), [0.0, 0.0, 0, 0.0])
+            totals[0] += entry["wall"]
+            totals[1] += entry["cpu"]
+            totals[2] += 1
+            totals[3] = max(totals[3], entry["wall"])
+        if _jsonl is not None:
+            line = {"kind": record.kind, **record.labels,
+                    "stages": {name: {key: round(value, 6) for key, value in entry.items()}
+                               for name, entry in record.stages.items()},
+                    "wall": round(sum(entry["wall"] for name, entry in record.stages.items()
+                                      if name not in _SUBSTAGES), 6),
+                    "peak_rss_bytes": rss}
+            _jsonl.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def prometheus_text() -> str:
+    """Totals so far in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        totals = sorted(_totals.items())
+        records = sorted(_records.items())
+    for metric, index, help_text in (("caption_stage_wall_seconds", 0, "Wall time per captioning stage"),
+                                     ("caption_stage_cpu_seconds", 1, "CPU time per captioning stage")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+        for (kind, name), values in totals:
+            labels = f'kind="{kind}",stage="{name}"'
+            lines.append(f"{metric}_sum{{{labels}}} {values[index]:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {values[2]}")
+    lines += ["# HELP caption_stage_wall_seconds_max Slowest single occurrence of a stage",
+              "# TYPE caption_stage_wall_seconds_max gauge"]
+    for (kind, name), values in totals:
+        lines.append(f'caption_stage_wall_seconds_max{{kind="{kind}",stage="{name}"}} {values[3]:.6f}')
+    lines += ["# HELP caption_records_total Images and batches timed", "# TYPE caption_records_total counter"]
+    lines += [f'caption_records_total{{kind="{kind}"}} {count}' for kind, count in records]
+    rss = peak_rss_bytes()
+    if rss is not None:
+        lines += ["# HELP caption_peak_rss_bytes Peak resident set size of the process",
+                  "# TYPE caption_peak_rss_bytes gauge", f"caption_peak_rss_bytes {rss}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: Optional[str] = None):
+    path = path or _prometheus_path
+    if path == '-':
+        sys.stderr.write(prometheus_text())
+    elif path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(prometheus_text())
+
+
+@contextlib.contextmanager
+def profiled(spec: Optional[str] = None) -> Iterator[None]:
+    """Run the block under the profiler named by ``CAPTION_PROFILE``, if any"""
+    spec = spec if spec is not None else os.environ.get('CAPTION_PROFILE', '')
+    if not spec:
+        yield
+        return
+    kind, _, path = spec.partition(':')
+    if kind == 'cprofile':
+        import cProfile
+        path = path or 'caption.prof'
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            print(f"cProfile stats written to {path} (python -m pstats {path})", file=sys.stderr)
+    elif kind == 'torch':
+        from torch.profiler import ProfilerActivity, profile
+        path = path or 'caption-trace.json'
+        profiler = profile(activities=[ProfilerActivity.CPU])
+        try:
+            with profiler:
+                yield
+        finally:
+            # Also on Ctrl-C, the only way the server and the worker stop
+            profiler.export_chrome_trace(path)
+            print(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=20), file=sys.stderr)
+            print(f"Chrome trace written to {path}", file=sys.stderr)
+    else:
+        raise ValueError(f"Unknown CAPTION_PROFILE '{spec}' (use cprofile[:file] or torch[:file])")
+
+
+configure(os.environ.get('CAPTION_STAGES'), os.environ.get('CAPTION_STAGES_PROMETHEUS'))
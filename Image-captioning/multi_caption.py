@@ -0,0 +1,204 @@
+"""Several captions per image from a single encoder pass.
+
+``model.generate`` runs the ViT encoder every time it is called, so asking
+for captions with different beam widths, lengths or sampling seeds pays for
+the encoder again and again. Here the images are encoded once and every
+decoding strategy runs against the same ``encoder_outputs``.
+
+With ``batched=True`` compatible strategies also share decoder passes:
+
+- beam/greedy configs with the same ``num_beams`` and ``max_length`` run once
+  with the largest ``num_return_sequences``; beam search returns its
+  hypotheses best first, so the first ``n`` are exactly what a separate run
+  asking for ``n`` would return
+- sampling configs with the same sampling parameters are drawn in one pass
+  (seeded with the first config's seed), so individual seeds are not honoured;
+  pass ``batched=False`` to reproduce each seed exactly
+
+Each decoder pass gets its own ``BaseModelOutput`` around the encoder's
+hidden states: ``generate`` expands ``encoder_outputs`` in place for beam
+search and ``num_return_sequences``, so a shared object would reach later
+passes already expanded. ``--compare`` checks the shared-encoder captions
+against one full ``generate`` call per config.
+
+Usage::
+
+    python multi_caption.py Cat.jpg --beams 1 4 8 --samples 3 --seed 0 --compare
+"""
+import argparse
+import sys
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from image_caption import CaptionModel, MAX_LENGTH, NUM_BEAMS, decode, generate, get_model, load_image, preprocess
+
+
+@dataclass(frozen=True)
+class DecodeConfig:
+    """One decoding strategy"""
+    num_beams: int = NUM_BEAMS
+    max_length: int = MAX_LENGTH
+    num_return_sequences: int = 1
+    do_sample: bool = False
+    seed: Optional[int] = None
+    temperature: float = 1.0
+    top_k: int = 50
+    top_p: float = 1.0
+
+    def generate_kwargs(self, num_return_sequences: int) -> Dict:
+        kwargs = {"max_length": self.max_length, "num_beams": self.num_beams,
+                  "num_return_sequences": num_return_sequences}
+        if self.do_sample:
+            kwargs.update(do_sample=True, temperature=self.temperature, top_k=self.top_k, top_p=self.top_p)
+        return kwargs
+
+    def group_key(self) -> Tuple:
+        """Configs with equal keys can share one decoder pass"""
+        if self.do_sample:
+            return ('sample', self.num_beams, self.max_length, self.temperature, self.top_k, self.top_p)
+        return ('search', self.num_beams, self.max_length)
+
+
+def encode(pixel_values, loaded: Optional[CaptionModel] = None):
+    """Run only the ViT encoder on a preprocessed batch"""
+    import torch
+    from inference_modes import inference_context
+    loaded = loaded or get_model()
+    with inference_context(loaded.mode):
+        return loaded.model.encoder(pixel_values=torch.from_numpy(pixel_values).to(loaded.device))
+
+
+def _generate(encoder_outputs, config: DecodeConfig, num_return_sequences: int, loaded: CaptionModel,
+              seed: Optional[int]) -> List[List[str]]:
+    """Captions per image for one decoder pass"""
+    import warnings
+    import torch
+    from transformers.modeling_outputs import BaseModelOutput
+    from inference_modes import inference_context
+    if seed is not None:
+        torch.manual_seed(seed)
+    # A fresh wrapper per pass: generate replaces its tensors with expanded copies
+    encoder_outputs = BaseModelOutput(last_hidden_state=encoder_outputs.last_hidden_state)
+    with warnings.catch_warnings(), inference_context(loaded.mode):
+        warnings.simplefilter("ignore")
+        output_ids = loaded.model.generate(encoder_outputs=encoder_outputs,
+                                           **config.generate_kwargs(num_return_sequences))
+    captions = decode(output_ids, loaded)
+    # generate returns the sequences of each image consecutively
+    return [captions[i:i + num_return_sequences] for i in range(0, len(captions), num_return_sequences)]
+
+
+def caption_variants(images: Sequence, configs: Sequence[DecodeConfig], batched: bool = True,
+                     loaded: Optional[CaptionModel] = None) -> List[List[List[str]]]:
+    """Caption every image with every config, encoding each image only once.
+
+    ``images`` are paths or decoded images. Returns ``result[image][config]``,
+    a list of ``num_return_sequences`` captions.
+    """
+    loaded = loaded or get_model()
+    images = [load_image(image) if isinstance(image, (str, bytes)) or hasattr(image, '__fspath__') else image
+              for image in images]
+    encoder_outputs = encode(preprocess(images, loaded), loaded)
+    results: List[List[Optional[List[str]]]] = [[None] * len(configs) for _ in images]
+
+    if batched:
+        groups: Dict[Tuple, List[int]] = {}
+        for index, config in enumerate(configs):
+            groups.setdefault(config.group_key(), []).append(index)
+        passes = list(groups.values())
+    else:
+        passes = [[index] for index in range(len(configs))]
+
+    for members in passes:
+        first = configs[members[0]]
+        if first.do_sample:
+            total = sum(configs[index].num_return_sequences for index in members)
+        else:
+            total = max(configs[index].num_return_sequences for index in members)
+        per_image = _generate(encoder_outputs, first, total, loaded, first.seed)
+        offset = 0
+        for index in members:
+            count = configs[index].num_return_sequences
+            for image_index, captions in enumerate(per_image):
+                results[image_index][index] = captions[offset:offset + count]
+            if first.do_sample:
+                # Each sampling config takes its own slice of the samples
+                offset += count
+    return results
+
+
+def separate_captions(images: Sequence, configs: Sequence[DecodeConfig],
+                      loaded: Optional[CaptionModel] = None) -> List[List[List[str]]]:
+    """``caption_variants`` the slow way: one full ``generate`` call (encoder included) per config"""
+    import torch
+    loaded = loaded or get_model()
+    pixel_values = preprocess(images, loaded)
+    results: List[List[List[str]]] = [[] for _ in images]
+    for config in configs:
+        if config.seed is not None:
+            torch.manual_seed(config.seed)
+        count = config.num_return_sequences
+        captions = decode(generate(pixel_values, loaded, **config.generate_kwargs(count)), loaded)
+        for image_index in range(len(images)):
+            results[image_index].append(captions[image_index * count:(image_index + 1) * count])
+    return results
+
+
+def compare_with_separate(shared: List[List[List[str]]], separate: List[List[List[str]]],
+                          configs: Sequence[DecodeConfig], batched: bool = True) -> List[Tuple[int, int]]:
+    """``(image, config)`` pairs whose captions differ; batched sampling is skipped (its seeds are shared)"""
+    return [(image_index, index)
+            for image_index, (per_shared, per_separate) in enumerate(zip(shared, separate))
+            for index, config in enumerate(configs)
+            if not (config.do_sample and (batched or config.seed is None))
+            and per_shared[index] != per_separate[index]]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Several captions per image from one encoder pass")
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--beams', type=int, nargs='*', default=[NUM_BEAMS], help="beam widths to decode with")
+    parser.add_argument('--max-length', type=int, nargs='*', default=[MAX_LENGTH])
+    parser.add_argument('--samples', type=int, default=0, help="additional sampled captions per image")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--separate-seeds', action='store_true',
+                        help="draw each sample in its own pass so every seed is reproducible")
+    parser.add_argument('--compare', action='store_true',
+                        help="also run one full generate call per config, timing it and checking the captions match")
+    args = parser.parse_args(argv)
+
+    configs = [DecodeConfig(num_beams=beams, max_length=length) for beams in args.beams for length in args.max_length]
+    sample = DecodeConfig(num_beams=1, do_sample=True, seed=args.seed)
+    configs += [replace(sample, seed=None if args.seed is None else args.seed + i) for i in range(args.samples)]
+
+    images = [load_image(path) for path in args.images]
+    start = time.perf_counter()
+    results = caption_variants(images, configs, batched=not args.separate_seeds)
+    shared = time.perf_counter() - start
+
+    for path, per_config in zip(args.images, results):
+        print(f"📸 {path}")
+        for config, captions in zip(configs, per_config):
+            label = f"sample seed={config.seed}" if config.do_sample else \
+                f"beams={config.num_beams} max_length={config.max_length}"
+            for caption in captions:
+                print(f"   [{label}] {caption}")
+    print(f"\n{len(configs)} configs x {len(images)} images with a shared encoder: {shared:.2f}s")
+
+    if args.compare:
+        start = time.perf_counter()
+        separate = separate_captions(images, configs)
+        print(f"Same configs as separate generate calls: {time.perf_counter() - start:.2f}s")
+        mismatches = compare_with_separate(results, separate, configs, batched=not args.separate_seeds)
+        for image_index, index in mismatches:
+            print(f"❌ {args.images[image_index]} config {index}: shared {results[image_index][index]} "
+                  f"!= separate {separate[image_index][index]}")
+        if mismatches:
+            return 1
+        print("Shared-encoder captions match the separate calls")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
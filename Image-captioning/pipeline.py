@@ -0,0 +1,264 @@
+"""Overlapped captioning pipeline for large image archives.
+
+``caption_images`` runs every step of a batch on one thread, so the cores sit
+idle while PIL decodes and the model waits for the next batch to be decoded.
+Here each step runs concurrently on its own thread(s):
+
+    paths -> [feeder] -> prepare pool (read, cache lookup, decode, preprocess)
+          -> bounded queue -> [inference] batches -> model.generate
+          -> bounded queue -> [detokenize] captions, cache store
+          -> bounded queue -> caller (writes the output)
+
+Every queue has a fixed depth, so a slow stage makes the stages in front of
+it wait instead of piling up decoded images: memory stays bounded however
+many images are streamed through. Results come out in input order, in the
+same format as ``caption_images``, and identical images within a batch are
+captioned once, as there.
+
+Stopping early (the caller closes the generator) never waits on the path
+iterator: a feeder blocked reading paths from stdin is left behind as a
+daemon thread and exits at its next path.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+import image_caption
+from caption_cache import CaptionCache, cache_key
+from fast_preprocess import FastPreprocessor, fast_preprocessor
+from image_caption import (DECODE_ERRORS, DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, decode, decode_error_message,
+                           generate, generation_settings, load_image, preprocess)
+from instrumentation import active, emit, new_record, stage
+
+_DONE = object()
+
+# How long a stopped pipeline waits for the feeder, which may be blocked in the path iterator
+FEEDER_JOIN_SECONDS = 1.0
+
+
+class _Item:
+    """One image on its way through the pipeline"""
+    __slots__ = ('result', 'key', 'pixels', 'same_as')
+
+    def __init__(self, result: Dict, key: Optional[bytes] = None, pixels: Optional[np.ndarray] = None):
+        self.result = result
+        self.key = key
+        self.pixels = pixels
+        # An identical image earlier in the same batch, whose caption this one reuses
+        self.same_as: Optional['_Item'] = None
+
+
+class _Failure:
+    """Carries an exception from a stage thread to the caller"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def prepare_bytes(data: bytes, result: Dict, settings: Dict, cache: Optional[CaptionCache],
+                  fast: Optional[FastPreprocessor]) -> _Item:
+    """Cache lookup, then decode and preprocess one image's bytes (unless cached or broken)"""
+    key = cache_key(data, settings)
+    if cache is not None:
+        caption = cache.get(key)
+        if caption is not None:
+            result["caption"] = caption
+            return _Item(result)
+    try:
+        if fast is not None:
+            # Small uint8 image; the inference stage normalizes the whole batch
+            return _Item(result, key, fast.load_resized(data))
+        image = load_image(data)
+    except DECODE_ERRORS as e:
+        result["error"] = decode_error_message(e, result.get("path"))
+        return _Item(result)
+    return _Item(result, key, preprocess([image])[0])
+
+
+def _prepare(path: str, settings: Dict, cache: Optional[CaptionCache], fast: Optional[FastPreprocessor]) -> _Item:
+    result = {"path": str(path)}
+    record = new_record('image', path=str(path))
+    try:
+        with active(record):
+            try:
+                with stage('read'):
+                    with open(path, 'rb') as f:
+                        data = f.read()
+            except OSError as e:
+                result["error"] = str(e)
+                return _Item(result)
+            return prepare_bytes(data, result, settings, cache, fast)
+    finally:
+        emit(record)
+
+
+class CaptionPipeline:
+    """Streams paths through concurrent prepare, inference and detokenize stages"""
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, workers: int = DEFAULT_WORKERS,
+                 queue_depth: Optional[int] = None, cache: Optional[CaptionCache] = None):
+        if batch_size < 1 or workers < 1:
+            raise ValueError("batch_size and workers must be at least 1")
+        self.batch_size = batch_size
+        self.workers = workers
+        # Enough prepared images to fill the next two batches while one is generating
+        self.queue_depth = queue_depth or 2 * batch_size
+        self.cache = cache
+        self.fast: Optional[FastPreprocessor] = None
+        self._stop = threading.Event()
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Blocking put that gives up once the pipeline is stopped"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _feed(self, paths: Iterable[str], pool: ThreadPoolExecutor, prepared: queue.Queue):
+        settings = generation_settings()
+        # This run's event: a later run gets a new one, so a feeder left blocked in
+        # the path iterator still sees that its own run was stopped
+        stop = self._stop
+        try:
+            for path in paths:
+                if stop.is_set():
+                    return
+                # Futures are queued in input order; the bounded queue limits
+                # how far decoding can run ahead of inference
+                if not self._put(prepared, pool.submit(_prepare, path, settings, self.cache, self.fast)):
+                    return
+        except BaseException as e:
+            self._put(prepared, _Failure(e))
+            return
+        self._put(prepared, _DONE)
+
+    def _infer(self, prepared: queue.Queue, generated: queue.Queue):
+        finished = False
+        try:
+            while not finished:
+                batch: List[_Item] = []
+                inputs: List[_Item] = []
+                by_key: Dict[bytes, _Item] = {}
+                while len(inputs) < self.batch_size:
+                    future = self._get(prepared)
+                    if future is _DONE:
+                        finished = True
+                        break
+                    if isinstance(future, _Failure):
+                        self._put(generated, future)
+                        return
+                    item = future.result()
+                    batch.append(item)
+                    if item.pixels is None:
+                        continue
+                    if item.key in by_key:
+                        item.same_as = by_key[item.key]
+                        item.pixels = None
+                    else:
+                        by_key[item.key] = item
+                        inputs.append(item)
+                if self._stop.is_set():
+                    return
+                pixels = [item.pixels for item in inputs]
+                record = new_record('batch', size=len(inputs)) if inputs else None
+                with active(record):
+                    if not inputs:
+                        output_ids = None
+                    elif self.fast is not None:
+                        output_ids = generate(self.fast.normalize_batch(pixels))
+                    else:
+                        output_ids = generate(np.stack(pixels))
+                for item in inputs:
+                    item.pixels = None
+                if batch and not self._put(generated, (batch, inputs, output_ids, record)):
+                    return
+        except BaseException as e:
+            self._put(generated, _Failure(e))
+            return
+        self._put(generated, _DONE)
+
+    def _detokenize(self, generated: queue.Queue, finished: queue.Queue):
+        try:
+            while True:
+                message = self._get(generated)
+                if message is _DONE or isinstance(message, _Failure):
+                    self._put(finished, message)
+                    return
+                batch, inputs, output_ids, record = message
+                if inputs:
+                    with active(record):
+                        captions = decode(output_ids)
+                    emit(record)
+                    for item, caption in zip(inputs, captions):
+                        item.result["caption"] = caption
+                    if self.cache is not None:
+                        self.cache.put_many((item.key, item.result["caption"]) for item in inputs)
+                for item in batch:
+                    if item.same_as is not None:
+                        item.result["caption"] = item.same_as.result["caption"]
+                if not self._put(finished, [item.result for item in batch]):
+                    return
+        except BaseException as e:
+            self._put(finished, _Failure(e))
+
+    def run(self, paths: Iterable[str]) -> Iterator[Dict]:
+        """Caption ``paths``, yielding one result per path in input order"""
+        self._stop = threading.Event()
+        self.fast = fast_preprocessor() if image_caption.FAST_PREPROCESS else None
+        prepared: queue.Queue = queue.Queue(self.queue_depth)
+        generated: queue.Queue = queue.Queue(2)
+        finished: queue.Queue = queue.Queue(2)
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix='caption-prepare')
+        threads = [
+            threading.Thread(target=self._feed, args=(paths, pool, prepared), name='caption-feed', daemon=True),
+            threading.Thread(target=self._infer, args=(prepared, generated), name='caption-infer', daemon=True),
+            threading.Thread(target=self._detokenize, args=(generated, finished),
+                             name='caption-detokenize', daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                message = finished.get()
+                if message is _DONE:
+                    return
+                if isinstance(message, _Failure):
+                    raise message.error
+                yield from message
+        finally:
+            # Also reached when the caller stops early: unblock and wind down every stage
+            self._stop.set()
+            feeder, *stages = threads
+            for thread in stages:
+                thread.join()
+            feeder.join(FEEDER_JOIN_SECONDS)
+            # Images queued but not yet prepared are dropped rather than decoded
+            while True:
+                try:
+                    future = prepared.get_nowait()
+                except queue.Empty:
+                    break
+                if hasattr(future, 'cancel'):
+                    future.cancel()
+            pool.shutdown(wait=True)
+
+
+def caption_pipeline(paths: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                     workers: int = DEFAULT_WORKERS, queue_depth: Optional[int] = None,
+                     cache: Optional[CaptionCache] = None) -> Iterator[Dict]:
+    """Overlapped equivalent of ``caption_images`` (see the module docstring)"""
+    return CaptionPipeline(batch_size, workers, queue_depth, cache).run(paths)
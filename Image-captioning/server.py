@@ -0,0 +1,365 @@
+"""HTTP captioning server with dynamic micro-batching.
+
+Clients POST the raw bytes of an image and get its caption back as JSON.
+Concurrent requests are collected into batches: a batch is sent to the
+model as soon as it holds ``max_batch`` images or ``max_wait`` seconds after
+its first image arrived, whichever comes first. A lone request therefore
+waits at most ``max_wait`` (a few milliseconds) before inference, while under
+load the model runs full batches. Images that arrive while a batch is
+generating join the next one.
+
+Threads:
+
+- the asyncio event loop parses HTTP and batches requests
+- a prepare pool does the cache lookup, decode and preprocessing per upload
+- one model thread runs ``generate`` and detokenizes, batch after batch, and
+  resolves every request's future with its caption
+
+``GET /health`` reports the server's counters, and ``GET /metrics`` the
+per-stage timings in Prometheus text format when they are enabled (see
+``instrumentation.py``).
+
+At most ``max_in_flight`` requests are admitted at a time. Beyond that,
+requests are either rejected straight away with ``503`` and ``Retry-After``
+(the default), or made to wait for a free slot (``--queue``).
+
+Usage::
+
+    python server.py --port 8080 --max-batch 8 --max-wait-ms 10
+    curl --data-binary @Cat.jpg http://localhost:8080/caption
+    curl http://localhost:8080/health
+"""
+import argparse
+import asyncio
+import functools
+import json
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+import image_caption
+import instrumentation
+from caption_cache import CaptionCache
+from fast_preprocess import FastPreprocessor, fast_preprocessor
+from image_caption import (DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, add_cache_arguments, add_inference_arguments,
+                           add_timing_arguments, configure, decode, generate, generation_settings, get_model,
+                           open_cache)
+from instrumentation import active, emit, new_record, profiled
+from pipeline import prepare_bytes
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_WAIT = 0.010
+DEFAULT_MAX_IN_FLIGHT = 64
+
+
+class HTTPError(Exception):
+    """An error reply; the connection is closed unless the request was read in full"""
+
+    def __init__(self, status: HTTPStatus, message: Optional[str] = None, request_read: bool = False):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.request_read = request_read
+
+
+class MicroBatcher:
+    """Groups queued images into batches for a dedicated model thread"""
+
+    def __init__(self, max_batch: int = DEFAULT_BATCH_SIZE, max_wait: float = DEFAULT_MAX_WAIT,
+                 cache: Optional[CaptionCache] = None, fast: Optional[FastPreprocessor] = None):
+        if max_batch < 1 or max_wait < 0:
+            raise ValueError("max_batch must be at least 1 and max_wait not negative")
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache = cache
+        self.fast = fast
+        self.batches = 0
+        self.images = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._model = ThreadPoolExecutor(1, thread_name_prefix='caption-model')
+
+    async def caption(self, item) -> str:
+        """Queue a prepared image and wait for its caption"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def _caption(self, items: List) -> List[str]:
+        # Runs on the model thread, which is also the only user of the fast
+        # preprocessor's batch buffer
+        pixels = [item.pixels for item in items]
+        record = new_record('batch', size=len(items))
+        with active(record):
+            captions = decode(generate(self.fast.normalize_batch(pixels) if self.fast else np.stack(pixels)))
+        emit(record)
+        if self.cache is not None:
+            self.cache.put_many(zip((item.key for item in items), captions))
+        return captions
+
+    @staticmethod
+    def _resolve(futures: List[asyncio.Future], running: asyncio.Future):
+        error = running.exception() if not running.cancelled() else asyncio.CancelledError()
+        for index, future in enumerate(futures):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(running.result()[index])
+
+    async def _collect(self, loop: asyncio.AbstractEventLoop) -> List[Tuple]:
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        running: Optional[asyncio.Future] = None
+        try:
+            while True:
+                batch = await self._collect(loop)
+                if running is not None:
+                    # Images that arrive while the model is busy join this batch
+                    await asyncio.wait([running])
+                    while len(batch) < self.max_batch and not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                # Drop requests whose client has gone away
+                batch = [(item, future) for item, future in batch if not future.done()]
+                if not batch:
+                    running = None
+                    continue
+                self.batches += 1
+                self.images += len(batch)
+                running = loop.run_in_executor(self._model, self._caption, [item for item, _ in batch])
+                running.add_done_callback(functools.partial(self._resolve, [future for _, future in batch]))
+        finally:
+            # At most the running batch is in the pool: the next is only submitted once it finishes
+            self._model.shutdown(wait=False)
+
+
+class CaptionServer:
+    """HTTP/1.1 front end: admission control, uploads and JSON replies"""
+
+    def __init__(self, max_batch: int = DEFAULT_BATCH_SIZE, max_wait: float = DEFAULT_MAX_WAIT,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, queue_when_full: bool = False,
+                 workers: int = DEFAULT_WORKERS, cache: Optional[CaptionCache] = None,
+                 idle_timeout: Optional[float] = 60.0):
+        if max_in_flight < 1 or workers < 1:
+            raise ValueError("max_in_flight and workers must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.queue_when_full = queue_when_full
+        self.cache = cache
+        self.idle_timeout = idle_timeout
+        self.settings = generation_settings()
+        fast = fast_preprocessor() if image_caption.FAST_PREPROCESS else None
+        self.batcher = MicroBatcher(max_batch, max_wait, cache, fast)
+        self.prepare_pool = ThreadPoolExecutor(workers, thread_name_prefix='caption-prepare')
+        # Uploads submitted to prepare_pool and not finished, cancelled when the server stops
+        self._preparing: Set[Future] = set()
+        self.in_flight = 0
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def stats(self) -> Dict:
+        batches = self.batcher.batches
+        return {"in_flight": self.in_flight, "waiting": self.waiting, "served": self.served,
+                "rejected": self.rejected, "batches": batches,
+                "mean_batch_size": round(self.batcher.images / batches, 2) if batches else 0.0}
+
+    def _prepare(self, data: bytes):
+        record = new_record('image', bytes=len(data))
+        try:
+            with active(record):
+                return prepare_bytes(data, {}, self.settings, self.cache, self.batcher.fast)
+        finally:
+            emit(record)
+
+    async def caption(self, data: bytes) -> Dict:
+        """Caption one uploaded image; raises HTTPError for unusable uploads"""
+        future = self.prepare_pool.submit(self._prepare, data)
+        self._preparing.add(future)
+        future.add_done_callback(self._preparing.discard)
+        item = await asyncio.wrap_future(future)
+        if "error" in item.result:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, item.result["error"], request_read=True)
+        if item.pixels is None:
+            return {"caption": item.result["caption"], "cached": True}
+        return {"caption": await self.batcher.caption(item), "cached": False}
+
+    async def _read_upload(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                           headers: Dict[str, str]) -> bytes:
+        try:
+            length = int(headers['content-length'])
+        except KeyError:
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED) from None
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "invalid Content-Length") from None
+        if length > MAX_UPLOAD_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        if headers.get('expect', '').lower() == '100-continue':
+            # Only ask for the body once the request has been admitted
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        return await asyncio.wait_for(reader.readexactly(length), self.idle_timeout)
+
+    async def _caption_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               headers: Dict[str, str]) -> Dict:
+        if self._slots.locked() and not self.queue_when_full:
+            self.rejected += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "too many requests in flight")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            started = time.perf_counter()
+            reply = await self.caption(await self._read_upload(reader, writer, headers))
+            reply["seconds"] = round(time.perf_counter() - started, 4)
+            self.served += 1
+            return reply
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    @staticmethod
+    def _parse_head(head: bytes) -> Tuple[str, str, Dict[str, str]]:
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "malformed request line") from None
+        if not version.startswith('HTTP/1.'):
+            raise HTTPError(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        if version == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive':
+            headers['connection'] = 'close'
+        return method, target.split('?', 1)[0], headers
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, body, keep_alive: bool):
+        if isinstance(body, str):
+            payload, content_type = body.encode('utf-8'), "text/plain; version=0.0.4"
+        else:
+            payload, content_type = json.dumps(body, ensure_ascii=False).encode('utf-8'), "application/json"
+        head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + payload)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+                except asyncio.IncompleteReadError:
+                    break
+                status, body = HTTPStatus.OK, None
+                try:
+                    method, path, headers = self._parse_head(head)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    if path == '/caption' and method == 'POST':
+                        body = await self._caption_request(reader, writer, headers)
+                    elif path == '/health' and method == 'GET':
+                        body = self.stats()
+                    elif path == '/metrics' and method == 'GET':
+                        body = instrumentation.prometheus_text()
+                    elif path in ('/caption', '/health', '/metrics'):
+                        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+                    else:
+                        raise HTTPError(HTTPStatus.NOT_FOUND)
+                except HTTPError as e:
+                    status, body = e.status, {"error": str(e)}
+                    keep_alive = keep_alive and e.request_read
+                except (OSError, RuntimeError) as e:
+                    status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+                self._respond(writer, status, body, keep_alive)
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, asyncio.IncompleteReadError,
+                ValueError, ConnectionError):
+            # Idle, oversized headers, truncated upload or client gone: drop the connection
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str, port: int, backlog: int = 1024):
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_client, host, port,
+                                            limit=MAX_HEADER_BYTES, backlog=backlog)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        loaded = get_model()
+        print(f"Caption server listening on {addresses} ({loaded.mode}, max batch {self.batcher.max_batch}, "
+              f"max wait {self.batcher.max_wait * 1000:.0f} ms)", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            # shutdown(cancel_futures=True) needs Python 3.9; queued uploads are cancelled by hand
+            for future in list(self._preparing):
+                future.cancel()
+            self.prepare_pool.shutdown(wait=False)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="HTTP image captioning server with micro-batching")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_BATCH_SIZE, help="largest batch sent to the model")
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help="longest a request waits for others to join its batch")
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="requests admitted at once; the rest are rejected with 503 (or queued)")
+    parser.add_argument('--queue', action='store_true', help="queue requests over the limit instead of rejecting")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="decode/preprocess threads")
+    parser.add_argument('--idle-timeout', type=float, default=60.0,
+                        help="seconds before an idle connection is closed (0 to disable)")
+    add_cache_arguments(parser)
+    add_inference_arguments(parser)
+    add_timing_arguments(parser)
+    args = parser.parse_args(argv)
+    configure(args.mode, args.threads, args.interop_threads, args.fast_preprocess)
+    instrumentation.configure(args.stages, args.stages_prometheus)
+
+    get_model()  # load before accepting requests
+    caption_server = CaptionServer(args.max_batch, args.max_wait_ms / 1000, args.max_in_flight, args.queue,
+                                   args.workers, open_cache(args), args.idle_timeout or None)
+    try:
+        with profiled():
+            asyncio.run(caption_server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        stats = caption_server.stats()
+        print(f"\nServed {stats['served']} captions in {stats['batches']} batches "
+              f"(mean batch {stats['mean_batch_size']}), rejected {stats['rejected']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Long-lived captioning worker.
+
+Loads the model once and serves caption requests over a Unix socket, so
+``image_caption.py`` invocations skip the transformers import and the model
+load entirely and only pay for the captions themselves.
+
+Protocol: the client sends a JSON header line (``{"batch_size": 8,
+"settings": {...}}``) and the worker answers ``{"ready": true}``, or an
+``error`` record with ``"done": true`` when the client's ``settings`` (see
+``image_caption.session_settings``) differ from its own. The client then
+sends one absolute image path per line and an empty line to finish. The
+worker streams back one JSON line per image, in input order, in the same
+format as ``caption_images``, followed by ``{"done": true}``. Clients are
+served one at a time, so requests never compete for the model.
+
+Usage::
+
+    python worker.py &                  # load the model once
+    python image_caption.py photos/     # uses the worker while it is running
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import instrumentation
+from caption_cache import CaptionCache
+from image_caption import (DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, add_cache_arguments, add_inference_arguments,
+                           add_timing_arguments, configure, get_model, open_cache, run_captioning,
+                           session_settings)
+
+DEFAULT_SOCKET = Path(os.environ.get(
+    'CAPTION_SOCKET', Path(tempfile.gettempdir()) / f"image-caption-{os.getuid()}.sock"))
+MAX_HEADER_BYTES = 4096
+
+
+class CaptionRequestHandler(socketserver.StreamRequestHandler):
+    def _read_paths(self) -> Iterator[str]:
+        for raw in self.rfile:
+            path = raw.decode('utf-8').rstrip('\r\n')
+            if not path:
+                return
+            yield path
+
+    def _send(self, message: Dict):
+        self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8'))
+
+    def handle(self):
+        try:
+            header = json.loads(self.rfile.readline(MAX_HEADER_BYTES) or b'{}')
+            batch_size = int(header.get('batch_size', DEFAULT_BATCH_SIZE))
+            if batch_size < 1:
+                raise ValueError("batch_size must be at least 1")
+            requested = header.get('settings')
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send({"error": f"bad request: {e}", "done": True})
+            return
+        settings = self.server.settings
+        if requested is not None and requested != settings:
+            differences = ', '.join(f"{name} {requested.get(name)!r} (worker: {value!r})"
+                                    for name, value in settings.items() if requested.get(name) != value)
+            self._send({"error": f"settings differ: {differences or requested!r}", "done": True})
+            return
+        try:
+            self._send({"ready": True})
+            self.wfile.flush()
+            for result in run_captioning(self._read_paths(), batch_size, self.server.workers, self.server.cache):
+                self._send(result)
+                self.wfile.flush()
+            self._send({"done": True})
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-request
+            pass
+
+
+class CaptionWorker(socketserver.UnixStreamServer):
+    """Unix socket server handling one client at a time"""
+
+    def __init__(self, socket_path: str, cache: Optional[CaptionCache] = None, workers: int = DEFAULT_WORKERS,
+                 settings: Optional[Dict] = None):
+        super().__init__(socket_path, CaptionRequestHandler)
+        self.cache = cache
+        self.workers = workers
+        # What session_settings gave for the worker's own arguments; requests must match
+        self.settings = settings or {}
+
+
+def connect(socket_path: Path = DEFAULT_SOCKET) -> Optional[socket.socket]:
+    """Connect to a running worker, or return None if there is none"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def caption_via_worker(sock: socket.socket, paths: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                       settings: Optional[Dict] = None) -> Iterator[Dict]:
+    """Stream paths to a connected worker and yield its results in input order.
+
+    The worker answers the header before any path is read, so a refused
+    request (other ``settings``, bad header) raises ``ConnectionError`` here
+    with ``paths`` untouched.
+    """
+    header: Dict = {"batch_size": batch_size}
+    if settings is not None:
+        header["settings"] = settings
+    replies = sock.makefile('rb')
+    try:
+        sock.sendall((json.dumps(header) + "\n").encode('utf-8'))
+        answer = json.loads(replies.readline() or b'{}')
+    except (OSError, ValueError) as e:
+        answer = {"error": str(e)}
+    if not answer.get("ready"):
+        replies.close()
+        sock.close()
+        raise ConnectionError(f"Caption worker rejected the request: {answer.get('error', 'no answer')}")
+    return _stream_paths(sock, replies, paths)
+
+
+def _stream_paths(sock: socket.socket, replies, paths: Iterable[str]) -> Iterator[Dict]:
+    originals = deque()
+
+    def send():
+        try:
+            with sock.makefile('wb') as out:
+                for path in paths:
+                    originals.append(str(path))
+                    out.write((os.path.abspath(path) + "\n").encode('utf-8'))
+                out.write(b"\n")
+        except OSError:
+            pass
+
+    # Paths are sent from their own thread so a long path stream never
+    # blocks on the worker's replies (and vice versa)
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    with sock, replies:
+        for line in replies:
+            result = json.loads(line)
+            if result.get("done"):
+                if "error" in result:
+                    raise ConnectionError(f"Caption worker rejected the request: {result['error']}")
+                return
+            # Report the path as the caller gave it, not the absolute one sent
+            result["path"] = originals.popleft()
+            yield result
+    raise ConnectionError("Caption worker closed the connection")
+
+
+def serve(socket_path: Path = DEFAULT_SOCKET, cache: Optional[CaptionCache] = None,
+          workers: int = DEFAULT_WORKERS, settings: Optional[Dict] = None):
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        live = connect(socket_path)
+        if live is not None:
+            live.close()
+            raise RuntimeError(f"A caption worker is already listening on {socket_path}")
+        socket_path.unlink()
+
+    loaded = get_model()
+    server = CaptionWorker(str(socket_path), cache, workers, settings)
+    os.chmod(socket_path, 0o600)
+    print(f"Caption worker ready on {socket_path} ({loaded.mode}, model loaded in {loaded.load_seconds:.1f}s)",
+          file=sys.stderr)
+    try:
+        with instrumentation.profiled():
+            server.serve_forever()
+    finally:
+        server.server_close()
+        if socket_path.exists():
+            socket_path.unlink()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Persistent image captioning worker")
+    parser.add_argument('--socket', type=Path, default=DEFAULT_SOCKET)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="decode/preprocess threads overlapping with inference (0: run serially)")
+    add_cache_arguments(parser)
+    add_inference_arguments(parser)
+    add_timing_arguments(parser)
+    args = parser.parse_args(argv)
+    configure(args.mode, args.threads, args.interop_threads, args.fast_preprocess)
+    instrumentation.configure(args.stages, args.stages_prometheus)
+    try:
+        serve(args.socket, open_cache(args), args.workers, session_settings(args))
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
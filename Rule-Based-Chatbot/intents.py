@@ -0,0 +1,199 @@
+"""Fuzzy intent matching for messages no keyword rule catches.
+
+Every rule's keywords, words and ``examples`` are turned into TF-IDF vectors
+of character n-grams (3 to 4 characters, taken inside each word), hashed into
+a fixed number of dimensions. A message is vectorized the same way and scored
+against all examples at once: the example matrix is kept in sparse form with
+its non-zeros sorted by column, so the matrix-vector product only gathers
+the columns of the n-grams in the message and sums them per example with one
+``bincount``, independent of the size of the hashed vocabulary. Typos and rewordings
+("richset person", "wealthiest individuals") still land on the right rule,
+and anything below ``threshold`` falls back to the default reply.
+
+Common words ("what", "are", "you") share n-grams with most examples, so their
+n-grams count ``STOP_WORD_WEIGHT`` of a normal occurrence and a message made
+only of them ("who are you") must be a near copy of an example
+(``VAGUE_THRESHOLD``) to match anything.
+
+The vectors are cached next to the rules file, keyed by a hash of the rules
+and the vectorizer settings, so startup does not re-vectorize the rule base.
+"""
+import hashlib
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DIMENSIONS = 1 << 18
+NGRAM_SIZES = (3, 4)
+CACHE_VERSION = 3
+
+STOP_WORD_WEIGHT = 0.2
+VAGUE_THRESHOLD = 0.9
+STOP_WORDS = frozenset("""
+    a about am an and any are as at be been can could did do does for from had has have he her him his how
+    i if in is it its me my of on or our she so that the their them there they this to u was we were what
+    when where which who why will with would you your
+""".split())
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, drop punctuation and split into words"""
+    return _NON_WORD.sub(" ", text.lower()).split()
+
+
+def ngram_counts(text: str) -> Dict[int, float]:
+    """Hashed character n-gram counts of the words in ``text``, stop words weighted down"""
+    counts: Dict[int, float] = {}
+    for token in tokenize(text):
+        weight = STOP_WORD_WEIGHT if token in STOP_WORDS else 1.0
+        padded = f" {token} "
+        for size in NGRAM_SIZES:
+            for start in range(max(1, len(padded) - size + 1)):
+                bucket = zlib.crc32(padded[start:start + size].encode('utf-8')) % DIMENSIONS
+                counts[bucket] = counts.get(bucket, 0) + weight
+    return counts
+
+
+def is_vague(text: str) -> bool:
+    """True when every word of ``text`` is a stop word"""
+    return all(token in STOP_WORDS for token in tokenize(text))
+
+
+class IntentIndex:
+    """Sparse TF-IDF example matrix (non-zeros sorted by column) scored in one vectorized pass"""
+
+    def __init__(self, rows: np.ndarray, cols: np.ndarray, values: np.ndarray,
+                 idf: np.ndarray, example_rules: np.ndarray, threshold: float = 0.45):
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.idf = idf
+        self.example_rules = example_rules
+        self.threshold = threshold
+
+    @classmethod
+    def build(cls, examples: Sequence[Tuple[int, str]], threshold: float = 0.45) -> 'IntentIndex':
+        """Vectorize ``(rule priority, example text)`` pairs"""
+        counts = [ngram_counts(text) for _, text in examples]
+        document_frequency = np.zeros(DIMENSIONS, dtype=np.float32)
+        for example in counts:
+            document_frequency[list(example)] += 1
+        idf = (np.log((1 + len(counts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        rows, cols, values = [], [], []
+        for row, example in enumerate(counts):
+            if not example:
+                continue
+            buckets = np.fromiter(example.keys(), dtype=np.int64, count=len(example))
+            weights = np.log1p(np.fromiter(example.values(), dtype=np.float32, count=len(example))) * idf[buckets]
+            weights /= np.linalg.norm(weights)
+            rows.append(np.full(len(buckets), row, dtype=np.int32))
+            cols.append(buckets.astype(np.int32))
+            values.append(weights.astype(np.float32))
+
+        if rows:
+            rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+            order = np.argsort(cols, kind='stable')
+            rows, cols, values = rows[order], cols[order], values[order]
+        else:
+            rows = cols = np.zeros(0, dtype=np.int32)
+            values = np.zeros(0, dtype=np.float32)
+        return cls(
+            rows, cols, values, idf,
+            np.array([priority for priority, _ in examples], dtype=np.int32),
+            threshold
+        )
+
+    def vectorize(self, text: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Normalized TF-IDF vector of a message as (buckets, weights)"""
+        counts = ngram_counts(text)
+        if not counts:
+            return None
+        buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts))) * self.idf[buckets]
+        norm = np.linalg.norm(weights)
+        if not norm:
+            return None
+        return buckets, weights / norm
+
+    def scores(self, text: str) -> np.ndarray:
+        """Cosine similarity of the message to every example"""
+        scores = np.zeros(len(self.example_rules), dtype=np.float32)
+        vector = self.vectorize(text)
+        if vector is None or not len(self.values):
+            return scores
+        buckets, weights = vector
+        starts = np.searchsorted(self.cols, buckets, side='left')
+        lengths = np.searchsorted(self.cols, buckets, side='right') - starts
+        total = int(lengths.sum())
+        if not total:
+            return scores
+        # Indices of every non-zero in the message's columns, without a Python loop
+        offsets = np.cumsum(lengths) - lengths
+        nonzeros = np.repeat(starts - offsets, lengths) + np.arange(total)
+        products = self.values[nonzeros] * np.repeat(weights, lengths)
+        return np.bincount(self.rows[nonzeros], weights=products, minlength=len(self.example_rules))
+
+    def best(self, text: str) -> Optional[Tuple[int, float]]:
+        """Return (rule priority, confidence) of the best example, or None below the threshold"""
+        if not len(self.example_rules):
+            return None
+        scores = self.scores(text)
+        best = int(np.argmax(scores))
+        confidence = float(scores[best])
+        if confidence < (max(self.threshold, VAGUE_THRESHOLD) if is_vague(text) else self.threshold):
+            return None
+        return int(self.example_rules[best]), confidence
+
+    def save(self, path: Path, digest: str):
+        """Write the vectors atomically so concurrent readers never see a partial file"""
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, rows=self.rows, cols=self.cols, values=self.values, idf=self.idf,
+                         example_rules=self.example_rules, digest=np.array(digest))
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @classmethod
+    def load(cls, path: Path, digest: str, threshold: float = 0.45) -> Optional['IntentIndex']:
+        """Load cached vectors if they were built from the same rules"""
+        try:
+            with np.load(path) as data:
+                if str(data['digest']) != digest:
+                    return None
+                return cls(data['rows'], data['cols'], data['values'], data['idf'],
+                           data['example_rules'], threshold)
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def rules_digest(rules_bytes: bytes) -> str:
+    settings = f"{CACHE_VERSION}:{DIMENSIONS}:{NGRAM_SIZES}".encode()
+    return hashlib.sha256(settings + rules_bytes).hexdigest()
+
+
+def load_intents(examples: Sequence[Tuple[int, str]], rules_bytes: bytes, cache_path: Optional[Path],
+                 threshold: float = 0.45) -> IntentIndex:
+    """Load the intent vectors from the cache, or build and cache them"""
+    digest = rules_digest(rules_bytes)
+    if cache_path is not None:
+        cached = IntentIndex.load(cache_path, digest, threshold)
+        if cached is not None:
+            return cached
+    index = IntentIndex.build(examples, threshold)
+    if cache_path is not None:
+        try:
+            index.save(cache_path, digest)
+        except OSError:
+            pass
+    return index
@@ -0,0 +1,112 @@
+"""Load generator for the chatbot server.
+
+Opens many concurrent sessions, sends each a sequence of messages built from
+the rule keywords (plus follow-up answers and unmatched text), and reports
+requests per second and latency percentiles.
+
+Usage::
+
+    python server.py &
+    python loadgen.py --sessions 2000 --messages 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import List, Optional
+
+from rules import RULES_FILE
+
+FILLERS = ["tell me", "please", "what about", "hmm", "so", "i wonder", "ok"]
+ANSWERS = ["yes", "no", "sure", "nope"]
+UNMATCHED = ["asdf qwerty", "what is the capital of peru", "sing a song", "12345"]
+
+
+def build_corpus(rules_path=RULES_FILE, size: int = 1000, seed: int = 0) -> List[str]:
+    """Messages hitting every rule (except goodbye), answers and the default reply"""
+    with open(rules_path, encoding='utf-8') as f:
+        rules = json.load(f)['rules']
+    triggers = [k for rule in rules if rule.get('name') != 'bye'
+                for k in rule.get('keywords', []) + rule.get('words', [])
+                if 'bye' not in k]
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.7:
+            corpus.append(f"{rng.choice(FILLERS)} {rng.choice(triggers)}")
+        elif kind < 0.85:
+            corpus.append(rng.choice(ANSWERS))
+        else:
+            corpus.append(rng.choice(UNMATCHED))
+    return corpus
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def run_session(host: str, port: int, messages: List[str], latencies: List[float], errors: List[str]):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        errors.append(str(e))
+        return
+    try:
+        for message in messages:
+            start = time.perf_counter()
+            writer.write((message + '\n').encode('utf-8'))
+            await writer.drain()
+            reply = await reader.readline()
+            if not reply:
+                errors.append("connection closed")
+                return
+            latencies.append(time.perf_counter() - start)
+    except OSError as e:
+        errors.append(str(e))
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, sessions: int, messages: int, seed: int):
+    corpus = build_corpus(seed=seed)
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    errors: List[str] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_session(host, port, [rng.choice(corpus) for _ in range(messages)], latencies, errors)
+        for _ in range(sessions)
+    ))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load generator for the chatbot server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--sessions', type=int, default=1000, help="concurrent sessions")
+    parser.add_argument('--messages', type=int, default=20, help="messages per session")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    latencies, errors, elapsed = asyncio.run(
+        run_load(args.host, args.port, args.sessions, args.messages, args.seed))
+    latencies.sort()
+    print(f"Sessions:   {args.sessions} x {args.messages} messages")
+    print(f"Requests:   {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s)")
+    print(f"Latency:    p50 {percentile(latencies, 0.50) * 1000:.2f} ms | "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms | "
+          f"max {(latencies[-1] if latencies else 0) * 1000:.2f} ms")
+    if errors:
+        print(f"Errors:     {len(errors)} (first: {errors[0]})")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
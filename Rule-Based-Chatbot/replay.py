@@ -0,0 +1,368 @@
+"""Replay chat transcripts through the chatbot and report where the time goes.
+
+Transcripts are JSONL: one JSON object per line, the user's message in
+``text``, ``message`` or ``content`` (or ``--field``). Lines whose ``role``
+or ``speaker`` names someone other than the user are skipped, and a line that
+is just a JSON string is a message by itself. ``.gz`` files are read as
+gzip. The file is streamed, and every statistic is kept in fixed-size
+structures (latencies in log-spaced buckets, one counter per rule, at most
+``--max-sessions`` open conversations), so memory does not grow with the
+transcript.
+
+The report has overall and matching throughput, latency percentiles, and
+per rule the hit count, share, total and mean time, with the default
+fallback rate. Options:
+
+- ``--sessions FIELD``: replay through ``Conversation`` per session id, so
+  "yes"/"no" answers go to follow-up questions as they did live (default:
+  stateless ``get_response``)
+- ``--profile FILE``: sample the replay's stack every ``--profile-interval``
+  seconds and write collapsed stacks (flame graph input); the hottest
+  functions are printed too. Sampling slows the replay a little
+- ``--reorder FILE``: write the rule table sorted by hit count and replay the
+  transcript again to list the messages whose rule would change. Order
+  decides which rule wins when several match; keyword matching itself costs
+  the same in any order, only regex rules are tried in order
+
+Usage::
+
+    python replay.py transcripts.jsonl
+    python replay.py transcripts.jsonl.gz --sessions session_id --json
+    python replay.py transcripts.jsonl --profile replay.folded
+    python replay.py transcripts.jsonl --reorder rules.by-hits.json
+"""
+import argparse
+import gzip
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import Chatbot
+from Chatbot import Conversation, reply_for
+from rules import INTENT_THRESHOLD, RULES_FILE, RuleMatcher, compile_rules, load_intents, load_rules
+
+MESSAGE_FIELDS = ('text', 'message', 'content')
+ROLE_FIELDS = ('role', 'speaker')
+USER_ROLES = {'user', 'human', 'customer', 'client'}
+DECLINED = '(declined follow-up)'
+
+
+class LatencyHistogram:
+    """Constant-memory latency distribution: log-spaced buckets about 2% wide"""
+
+    BUCKETS_PER_E = 50
+
+    def __init__(self):
+        self.buckets: Counter = Counter()
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, nanoseconds: int):
+        self.buckets[int(math.log(nanoseconds) * self.BUCKETS_PER_E) if nanoseconds > 1 else 0] += 1
+        self.count += 1
+        self.total_ns += nanoseconds
+        if nanoseconds > self.max_ns:
+            self.max_ns = nanoseconds
+
+    def percentile(self, fraction: float) -> float:
+        """Seconds below which ``fraction`` of the samples fall (to the bucket's resolution)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(math.exp((bucket + 0.5) / self.BUCKETS_PER_E), self.max_ns) / 1e9
+        return self.max_ns / 1e9
+
+
+class ReplayStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.hits: Counter = Counter()
+        self.rule_ns: Counter = Counter()
+        self.skipped_lines = 0
+        self.elapsed = 0.0
+        self.default_name = 'default'
+
+    def add(self, rule_name: str, nanoseconds: int):
+        self.latency.add(nanoseconds)
+        self.hits[rule_name] += 1
+        self.rule_ns[rule_name] += nanoseconds
+
+    def to_dict(self) -> Dict:
+        messages = self.latency.count
+        matching = self.latency.total_ns / 1e9
+        return {
+            'messages': messages,
+            'skipped_lines': self.skipped_lines,
+            'elapsed': self.elapsed,
+            'messages_per_second': messages / self.elapsed if self.elapsed else 0.0,
+            'matching_messages_per_second': messages / matching if matching else 0.0,
+            'latency_us': {**{name: self.latency.percentile(fraction) * 1e6
+                              for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+                           'max': self.latency.max_ns / 1e3},
+            'default_rate': self.hits[self.default_name] / messages if messages else 0.0,
+            'rules': [{'name': name, 'hits': hits, 'share': hits / messages,
+                       'total_ms': self.rule_ns[name] / 1e6, 'mean_us': self.rule_ns[name] / hits / 1e3}
+                      for name, hits in self.hits.most_common()],
+        }
+
+
+def _open(path: Path):
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def read_messages(path: Path, field: Optional[str] = None, session_field: Optional[str] = None,
+                  stats: Optional[ReplayStats] = None) -> Iterator[Tuple[Optional[str], str]]:
+    """Stream ``(session id, message)`` pairs from a JSONL transcript"""
+    fields = (field,) if field else MESSAGE_FIELDS
+    with _open(path) as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = None
+            if isinstance(entry, str):
+                yield None, entry
+                continue
+            if not isinstance(entry, dict):
+                if stats is not None:
+                    stats.skipped_lines += 1
+                continue
+            role = next((entry[key] for key in ROLE_FIELDS if key in entry), None)
+            if role is not None and str(role).lower() not in USER_ROLES:
+                continue
+            text = next((entry[key] for key in fields if isinstance(entry.get(key), str)), None)
+            if text is None:
+                if stats is not None:
+                    stats.skipped_lines += 1
+                continue
+            session = entry.get(session_field) if session_field else None
+            yield (None if session is None else str(session)), text
+
+
+def replay(messages: Iterator[Tuple[Optional[str], str]], stats: ReplayStats,
+           matcher: Optional[RuleMatcher] = None, sessions: bool = False,
+           max_sessions: int = 10000) -> ReplayStats:
+    """Answer every message, timing each reply and attributing it to its rule"""
+    matcher = matcher or Chatbot.get_matcher()
+    stats.default_name = matcher.default.name
+    clock = time.perf_counter_ns
+    add = stats.add
+    start = time.perf_counter()
+    if not sessions:
+        match = matcher.match
+        for _, text in messages:
+            began = clock()
+            rule = match(text)
+            reply_for(rule)
+            add(rule.name, clock() - began)
+    else:
+        # Least recently used conversations are dropped beyond max_sessions
+        conversations: 'OrderedDict[Optional[str], Conversation]' = OrderedDict()
+        for session, text in messages:
+            conversation = conversations.get(session)
+            if conversation is None:
+                conversation = conversations[session] = Conversation(matcher)
+                if len(conversations) > max_sessions:
+                    conversations.popitem(last=False)
+            else:
+                conversations.move_to_end(session)
+            began = clock()
+            conversation.reply(text)
+            elapsed = clock() - began
+            rule = conversation.last_rule
+            add(rule.name if rule is not None else DECLINED, elapsed)
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+class StackSampler:
+    """Sample one thread's Python stack from a background thread at a fixed interval"""
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        labels: Dict[object, str] = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self) -> 'StackSampler':
+        self._thread = threading.Thread(target=self._sample, name='replay-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_folded(self, path: Path):
+        """Collapsed stacks, one ``frame;frame;frame count`` line each (flamegraph.pl, speedscope)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def top_functions(self, limit: int = 10) -> List[Tuple[str, int, int]]:
+        """``(function, self samples, total samples)`` ordered by self samples"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return [(label, count, total[label]) for label, count in own.most_common(limit)]
+
+
+def reorder_rules(data: Dict, hits: Counter) -> Dict:
+    """The rules file with its rules sorted by hit count (ties keep their order)"""
+    rules = data.get('rules', [])
+    order = sorted(range(len(rules)), key=lambda index: -hits.get(rules[index].get('name') or f"rule_{index}", 0))
+    return dict(data, rules=[rules[index] for index in order])
+
+
+def compile_in_memory(data: Dict, rules_bytes: bytes) -> RuleMatcher:
+    """Compile a rules dict like ``load_rules`` would, without writing an intent cache"""
+    if load_intents is None:
+        return compile_rules(data)
+    threshold = float(data.get('intent_threshold', INTENT_THRESHOLD))
+    return compile_rules(data, lambda examples: load_intents(examples, rules_bytes, None, threshold))
+
+
+def changed_answers(messages: Iterator[Tuple[Optional[str], str]], before: RuleMatcher, after: RuleMatcher,
+                    examples: int = 5) -> Tuple[int, List[Tuple[str, str, str]]]:
+    """How many messages get a different rule, and the first few ``(message, before, after)``"""
+    changed = 0
+    samples = []
+    for _, text in messages:
+        old = before.match(text).name
+        new = after.match(text).name
+        if old != new:
+            changed += 1
+            if len(samples) < examples:
+                samples.append((text, old, new))
+    return changed, samples
+
+
+def print_report(summary: Dict, top: Sequence[Tuple[str, int, int]] = ()):
+    messages = summary['messages']
+    latency = summary['latency_us']
+    print(f"Messages:   {messages} in {summary['elapsed']:.2f}s ({summary['messages_per_second']:.0f} msg/s, "
+          f"{summary['matching_messages_per_second']:.0f} msg/s matching only)")
+    if summary['skipped_lines']:
+        print(f"Skipped:    {summary['skipped_lines']} lines without a message")
+    print(f"Latency:    p50 {latency['p50']:.1f} us | p95 {latency['p95']:.1f} us | "
+          f"p99 {latency['p99']:.1f} us | max {latency['max']:.1f} us")
+    print(f"Default:    {summary['default_rate'] * 100:.1f}% of messages fell back to the default reply\n")
+    if summary['rules']:
+        width = max(len(rule['name']) for rule in summary['rules'])
+        print(f"{'Rule':<{width}}  {'Hits':>9}  {'Share':>6}  {'Total ms':>9}  {'Mean us':>8}")
+        for rule in summary['rules']:
+            print(f"{rule['name']:<{width}}  {rule['hits']:>9}  {rule['share'] * 100:>5.1f}%  "
+                  f"{rule['total_ms']:>9.1f}  {rule['mean_us']:>8.1f}")
+    if top:
+        samples = sum(own for _, own, _ in top)
+        print(f"\nHottest functions (self / total samples, top {len(top)}):")
+        for label, own, total in top:
+            print(f"  {own:>6} {total:>6}  {label}")
+        if not samples:
+            print("  (no samples; lower --profile-interval)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay chat transcripts through the chatbot")
+    parser.add_argument('transcript', type=Path, help="JSONL transcript (.gz allowed)")
+    parser.add_argument('--rules', type=Path, default=RULES_FILE)
+    parser.add_argument('--field', help=f"message field (default: first of {', '.join(MESSAGE_FIELDS)})")
+    parser.add_argument('--sessions', metavar='FIELD', help="replay per-session conversations keyed by FIELD")
+    parser.add_argument('--max-sessions', type=int, default=10000, help="open conversations kept in memory")
+    parser.add_argument('--profile', type=Path, metavar='FILE', help="write sampled stacks in collapsed format")
+    parser.add_argument('--profile-interval', type=float, default=0.001, help="seconds between stack samples")
+    parser.add_argument('--reorder', type=Path, metavar='FILE', help="write the rules sorted by hit count")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.transcript.exists():
+        parser.error(f"{args.transcript} does not exist")
+    try:
+        matcher = load_rules(args.rules)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    Chatbot.set_matcher(matcher)
+
+    stats = ReplayStats()
+    messages = read_messages(args.transcript, args.field, args.sessions, stats)
+    sampler = StackSampler(threading.get_ident(), args.profile_interval).start() if args.profile else None
+    try:
+        replay(messages, stats, matcher, sessions=bool(args.sessions), max_sessions=args.max_sessions)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+
+    summary = stats.to_dict()
+    top = ()
+    if sampler is not None:
+        sampler.write_folded(args.profile)
+        top = sampler.top_functions()
+        summary['profile'] = {'file': str(args.profile), 'samples': sum(sampler.stacks.values())}
+
+    if args.reorder:
+        raw = args.rules.read_bytes()
+        reordered = reorder_rules(json.loads(raw.decode('utf-8')), stats.hits)
+        text = json.dumps(reordered, indent=2, ensure_ascii=False) + "\n"
+        args.reorder.write_text(text, encoding='utf-8')
+        changed, samples = changed_answers(read_messages(args.transcript, args.field), matcher,
+                                           compile_in_memory(reordered, text.encode('utf-8')))
+        summary['reorder'] = {'file': str(args.reorder), 'changed_messages': changed,
+                              'examples': [{'message': m, 'before': b, 'after': a} for m, b, a in samples]}
+
+    if args.json:
+        summary['hottest_functions'] = [{'function': label, 'self': own, 'total': total}
+                                        for label, own, total in top]
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+        return 0
+
+    print_report(summary, top)
+    if sampler is not None:
+        print(f"\nStacks written to {args.profile} ({summary['profile']['samples']} samples)")
+    if args.reorder:
+        reorder = summary['reorder']
+        print(f"\nRules sorted by hits written to {args.reorder}")
+        if reorder['changed_messages']:
+            print(f"  {reorder['changed_messages']} replayed messages would get a different rule, e.g.:")
+            for example in reorder['examples']:
+                print(f"    {example['message']!r}: {example['before']} -> {example['after']}")
+        else:
+            print("  Every replayed message keeps its rule")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
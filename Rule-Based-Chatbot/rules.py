@@ -0,0 +1,414 @@
+"""Rule table for the chatbot, compiled into a single keyword automaton.
+
+Rules live in ``rules.json`` in priority order. Each rule has:
+
+- ``keywords``: substrings that trigger the rule anywhere in the message
+- ``words``: keywords that must appear as whole words (like ``\\bhi\\b``)
+- ``patterns``: optional regular expressions for anything more complex
+- ``responses``: reply texts; ``{date}`` and ``{time}`` are filled in when used
+- ``question``: follow-up question appended to the reply, or null
+- ``follow_up``: optional reply when the user answers "yes" to the question
+- ``examples``: optional sample phrasings used only by the fuzzy intent layer
+
+All keywords and words are compiled into one Aho-Corasick automaton, so a
+message is scanned once no matter how many rules there are. Every state
+knows the highest-priority rule ending there, and the earliest rule found
+anywhere in the message wins, which is the same result as checking the rules
+one by one in file order.
+
+A rules file is validated as a whole before anything is built from it:
+every problem (bad patterns, wrong types, duplicate names, ...) is reported
+in one ``InvalidRules`` error. ``RulesWatcher`` reloads a rules file in the
+background when it changes and hands the new matcher over only once it has
+been fully built, so a running server never sees a half-built or invalid
+rule base.
+
+Messages no keyword catches go to the intent layer in ``intents.py`` (when
+NumPy is installed), which finds the closest rule by character n-gram
+similarity to its keywords and examples and falls back to the default reply
+below a confidence threshold.
+"""
+import json
+import os
+import re
+import string
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+try:
+    from intents import IntentIndex, load_intents
+except ImportError:  # NumPy not installed: keyword matching only
+    IntentIndex = None
+    load_intents = None
+
+RULES_FILE = Path(__file__).with_name('rules.json')
+INTENT_THRESHOLD = 0.45
+
+DYNAMIC_FIELDS = {
+    'date': lambda: datetime.now().strftime("%d %B %Y"),
+    'time': lambda: datetime.now().strftime("%I:%M %p"),
+}
+
+
+class Rule(NamedTuple):
+    priority: int
+    name: str
+    keywords: Tuple[str, ...]
+    words: Tuple[str, ...]
+    patterns: Tuple[Pattern, ...]
+    responses: Tuple[str, ...]
+    question: Optional[str]
+    follow_up: Optional[str]
+    fields: Tuple[str, ...]
+
+    def _fill(self, text: str) -> str:
+        if self.fields and '{' in text:
+            text = text.format(**{field: DYNAMIC_FIELDS[field]() for field in self.fields})
+        return text
+
+    def render(self, index: int = 0) -> str:
+        """Fill in any dynamic fields of the chosen response"""
+        return self._fill(self.responses[index % len(self.responses)])
+
+    def render_follow_up(self) -> str:
+        """Fill in any dynamic fields of the follow-up answer"""
+        return self._fill(self.follow_up)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton returning the highest-priority rule found in a text"""
+
+    def __init__(self, entries: Sequence[Tuple[str, int, bool]], no_match: int):
+        """``entries`` are ``(keyword, rule priority, whole_word)``; ``no_match`` is returned when nothing matches"""
+        self.no_match = no_match
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[Tuple[int, int, bool]]] = [[]]
+        for keyword, priority, whole_word in entries:
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append((len(keyword), priority, whole_word))
+
+        fail = [0] * len(goto)
+        order = []
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for char, child in goto[state].items():
+                queue.append(child)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+
+        # Fold outputs along the failure chain (parents are processed before children)
+        best = [no_match] * len(goto)
+        word_outputs: List[Tuple[Tuple[int, int], ...]] = [()] * len(goto)
+        for state in order:
+            inherited_best = best[fail[state]]
+            inherited_words = word_outputs[fail[state]]
+            own_best = min((p for _, p, whole in outputs[state] if not whole), default=no_match)
+            own_words = tuple((length, p) for length, p, whole in outputs[state] if whole)
+            best[state] = min(own_best, inherited_best)
+            word_outputs[state] = own_words + inherited_words
+
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+        self._word_outputs = word_outputs
+
+    def first_match(self, text: str, limit: Optional[int] = None) -> int:
+        """Return the lowest rule priority whose keyword occurs in ``text``"""
+        goto = self._goto
+        fail = self._fail
+        best_at = self._best
+        word_outputs = self._word_outputs
+        found = self.no_match if limit is None else limit
+        state = 0
+        last = len(text) - 1
+        for index, char in enumerate(text):
+            next_state = goto[state].get(char)
+            while next_state is None and state:
+                state = fail[state]
+                next_state = goto[state].get(char)
+            state = next_state or 0
+            if best_at[state] < found:
+                found = best_at[state]
+                if found == 0:
+                    return 0
+            if not word_outputs[state]:
+                continue
+            for length, priority in word_outputs[state]:
+                if priority < found:
+                    start = index - length + 1
+                    if (start == 0 or not _is_word_char(text[start - 1])) and \
+                            (index == last or not _is_word_char(text[index + 1])):
+                        found = priority
+        return found
+
+
+class RuleMatcher:
+    """Compiled, read-only rule base"""
+
+    def __init__(self, rules: Sequence[Rule], default: Rule, intents: Optional['IntentIndex'] = None):
+        self.rules = tuple(rules)
+        self.default = default
+        self.intents = intents
+        entries = []
+        for rule in self.rules:
+            entries.extend((keyword, rule.priority, False) for keyword in rule.keywords)
+            entries.extend((word, rule.priority, True) for word in rule.words)
+        self.automaton = KeywordAutomaton(entries, len(self.rules))
+        self.pattern_rules = tuple(rule for rule in self.rules if rule.patterns)
+
+    def match(self, user_input: str) -> Rule:
+        """Return the first rule (in priority order) that matches the message"""
+        text = user_input.lower()
+        found = self.automaton.first_match(text)
+        # Regex rules are only checked if they could beat the keyword match
+        for rule in self.pattern_rules:
+            if rule.priority >= found:
+                break
+            if any(pattern.search(text) for pattern in rule.patterns):
+                found = rule.priority
+                break
+        if found < len(self.rules):
+            return self.rules[found]
+        intent = self.match_intent(user_input)
+        return intent[0] if intent else self.default
+
+    def match_intent(self, user_input: str) -> Optional[Tuple[Rule, float]]:
+        """Closest rule by n-gram similarity with its confidence, or None below the threshold"""
+        if self.intents is None:
+            return None
+        best = self.intents.best(user_input)
+        if best is None:
+            return None
+        priority, confidence = best
+        return self.rules[priority], confidence
+
+
+class InvalidRules(ValueError):
+    """A rules file with one or more problems; ``errors`` lists all of them"""
+
+    def __init__(self, errors: Sequence[str]):
+        self.errors = list(errors)
+        super().__init__("Invalid rules:\n  " + "\n  ".join(self.errors))
+
+
+def _template_fields(text: str) -> List[str]:
+    fields = []
+    for _, field, _, _ in string.Formatter().parse(text):
+        if field is not None:
+            if field not in DYNAMIC_FIELDS:
+                raise ValueError(f"Unknown field '{{{field}}}' in response: {text!r}")
+            fields.append(field)
+    return fields
+
+
+def _strings(data: dict, key: str, name: str) -> List[str]:
+    values = data.get(key, [])
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ValueError(f"Rule '{name}': {key} must be a list of strings")
+    return values
+
+
+def _optional_string(data: dict, key: str, name: str) -> Optional[str]:
+    value = data.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"Rule '{name}': {key} must be a string or null")
+    return value
+
+
+def compile_rule(priority: int, data: dict) -> Rule:
+    """Validate one rule entry from the data file and build a Rule"""
+    if not isinstance(data, dict):
+        raise ValueError(f"Rule {priority} is not an object")
+    name = data.get('name') or f"rule_{priority}"
+    if not isinstance(name, str):
+        raise ValueError(f"Rule {priority}: name must be a string")
+    keywords = tuple(k.lower() for k in _strings(data, 'keywords', name))
+    words = tuple(w.lower() for w in _strings(data, 'words', name))
+    patterns = []
+    for source in _strings(data, 'patterns', name):
+        try:
+            pattern = re.compile(source)
+        except re.error as e:
+            raise ValueError(f"Rule '{name}': invalid pattern {source!r}: {e}") from e
+        if pattern.search('') is not None:
+            raise ValueError(f"Rule '{name}': pattern {source!r} matches every message")
+        patterns.append(pattern)
+    responses = tuple(_strings(data, 'responses', name))
+    if not responses:
+        raise ValueError(f"Rule '{name}' has no responses")
+    if any(not k for k in keywords + words):
+        raise ValueError(f"Rule '{name}' has an empty keyword")
+    examples = data.get('examples', [])
+    if not isinstance(examples, list) or not all(isinstance(e, str) and e.strip() for e in examples):
+        raise ValueError(f"Rule '{name}': examples must be a list of non-empty strings")
+    question = _optional_string(data, 'question', name)
+    follow_up = _optional_string(data, 'follow_up', name)
+    fields = []
+    for response in responses + ((follow_up,) if follow_up else ()):
+        for field in _template_fields(response):
+            if field not in fields:
+                fields.append(field)
+    rule = Rule(priority, name, keywords, words, tuple(patterns), responses, question,
+                follow_up, tuple(fields))
+    # Format specs and conversions are only checked by formatting: fill every
+    # template once now rather than fail on each reply after a reload
+    for template in responses + ((follow_up,) if follow_up else ()):
+        try:
+            rule._fill(template)
+        except (ValueError, KeyError, IndexError, AttributeError, TypeError) as e:
+            raise ValueError(f"Rule '{name}': response {template!r} cannot be filled in: {e}") from e
+    return rule
+
+
+def intent_examples(data: dict) -> List[Tuple[int, str]]:
+    """``(rule priority, text)`` pairs the intent layer is built from"""
+    return [(priority, text)
+            for priority, entry in enumerate(data.get('rules', []))
+            for text in entry.get('keywords', []) + entry.get('words', []) + entry.get('examples', [])]
+
+
+def compile_rules(data: dict,
+                  build_intents: Optional[Callable[[List[Tuple[int, str]]], 'IntentIndex']] = None) -> RuleMatcher:
+    """Build a matcher from the parsed contents of a rules file.
+
+    Every rule is checked before anything is built; ``InvalidRules`` lists
+    all the problems found.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('rules', []), list):
+        raise InvalidRules(["The rules file must be an object with a 'rules' list"])
+    rules = []
+    errors = []
+    names = set()
+    for priority, entry in enumerate(data.get('rules', [])):
+        try:
+            rule = compile_rule(priority, entry)
+            if not (rule.keywords or rule.words or rule.patterns or entry.get('examples')):
+                raise ValueError(f"Rule '{rule.name}' has nothing to match")
+            if rule.name in names:
+                raise ValueError(f"Rule '{rule.name}' is defined more than once")
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        names.add(rule.name)
+        rules.append(rule)
+    try:
+        default = compile_rule(len(rules), data.get('default') or {
+            'name': 'default', 'responses': ["Sorry, I didn't understand that."]
+        })
+    except ValueError as e:
+        errors.append(f"Default: {e}")
+    threshold = data.get('intent_threshold', INTENT_THRESHOLD)
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1:
+        errors.append(f"intent_threshold must be a number between 0 and 1, not {threshold!r}")
+    if errors:
+        raise InvalidRules(errors)
+    intents = build_intents(intent_examples(data)) if build_intents else None
+    return RuleMatcher(rules, default, intents)
+
+
+def load_rules(path: Path = RULES_FILE, use_intents: bool = True) -> RuleMatcher:
+    """Read and compile a rules file.
+
+    The intent vectors are cached in ``<rules>.intents.npz`` next to the rules
+    file and rebuilt only when the rules change.
+    """
+    path = Path(path)
+    raw = path.read_bytes()
+    try:
+        data = json.loads(raw.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise InvalidRules([f"{path.name} is not valid JSON: {e}"]) from e
+    if not use_intents or load_intents is None:
+        return compile_rules(data)
+
+    def build_intents(examples: List[Tuple[int, str]]) -> 'IntentIndex':
+        threshold = float(data.get('intent_threshold', INTENT_THRESHOLD))
+        return load_intents(examples, raw, path.with_suffix('.intents.npz'), threshold)
+
+    return compile_rules(data, build_intents)
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size, info.st_ino
+
+
+def _report_reload_error(path: Path, error: Exception):
+    print(f"Rules in {path} not reloaded, keeping the current ones: {error}", file=sys.stderr)
+
+
+class RulesWatcher:
+    """Reload a rules file in a background thread whenever it changes.
+
+    The file is polled every ``interval`` seconds (its modification time,
+    size and inode). A changed file is compiled off to the side and only a
+    complete, valid matcher is passed to ``on_reload``; a file that fails
+    validation is reported to ``on_error`` and the current matcher stays in
+    place until the file changes again.
+    """
+
+    def __init__(self, on_reload: Callable[[RuleMatcher], None], path: Path = RULES_FILE,
+                 interval: float = 2.0, use_intents: bool = True,
+                 on_error: Callable[[Path, Exception], None] = _report_reload_error):
+        self.path = Path(path)
+        self.on_reload = on_reload
+        self.on_error = on_error
+        self.interval = interval
+        self.use_intents = use_intents
+        self.reloads = 0
+        self._signature = _file_signature(self.path)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """Reload now if the file changed since the last check; True when a new matcher was installed"""
+        signature = _file_signature(self.path)
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            matcher = load_rules(self.path, self.use_intents)
+        except (OSError, ValueError) as e:
+            self.on_error(self.path, e)
+            return False
+        self.on_reload(matcher)
+        self.reloads += 1
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self) -> 'RulesWatcher':
+        self._thread = threading.Thread(target=self._run, name='rules-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,101 @@
+"""Asyncio chat server for the rule-based chatbot.
+
+Line-based TCP protocol: the client sends one UTF-8 message per line and gets
+one reply line back. Every connection is its own session with its own
+``Conversation``, so follow-up questions are answered per user. Matching is
+a few microseconds of CPU, so replies are computed inline on the event loop
+and a single process can hold thousands of concurrent sessions.
+
+The rules file is watched while the server runs: edits are validated and
+swapped in without dropping any session, and an invalid edit is reported and
+ignored.
+
+Usage::
+
+    python server.py --host 0.0.0.0 --port 8765
+    nc localhost 8765
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import Chatbot
+from Chatbot import Conversation
+from rules import RULES_FILE, load_rules
+
+MAX_LINE_BYTES = 64 * 1024
+
+
+class ChatServer:
+    def __init__(self, idle_timeout: Optional[float] = 300.0):
+        self.idle_timeout = idle_timeout
+        self.active_sessions = 0
+        self.total_sessions = 0
+        self.messages = 0
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conversation = Conversation()
+        self.active_sessions += 1
+        self.total_sessions += 1
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                if not line:
+                    break
+                message = line.decode('utf-8', errors='replace').rstrip('\r\n')
+                writer.write((conversation.reply(message) + '\n').encode('utf-8'))
+                await writer.drain()
+                self.messages += 1
+                if "bye" in message.lower():
+                    break
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            # Idle, over-long line or client gone: drop the session
+            pass
+        finally:
+            self.active_sessions -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str, port: int, backlog: int = 4096):
+        server = await asyncio.start_server(self.handle_client, host, port,
+                                            limit=MAX_LINE_BYTES, backlog=backlog)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Chatbot server listening on {addresses}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rule-based chatbot TCP server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--idle-timeout', type=float, default=300.0,
+                        help="seconds before an idle session is closed (0 to disable)")
+    parser.add_argument('--rules', type=Path, default=RULES_FILE, help="rules file to serve")
+    parser.add_argument('--reload-interval', type=float, default=2.0,
+                        help="seconds between checks of the rules file for changes (0 to disable)")
+    args = parser.parse_args(argv)
+
+    # Loaded before serving, so a broken rules file stops the server instead of its first reply
+    try:
+        Chatbot.set_matcher(load_rules(args.rules))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.reload_interval > 0:
+        Chatbot.watch_rules(args.rules, args.reload_interval)
+
+    chat_server = ChatServer(args.idle_timeout or None)
+    try:
+        asyncio.run(chat_server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print(f"\nServed {chat_server.messages} messages in {chat_server.total_sessions} sessions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
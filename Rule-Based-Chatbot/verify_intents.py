@@ -0,0 +1,87 @@
+"""Check the intent layer against messages it must and must not match.
+
+Keyword rules are exact, but the fuzzy intent layer decides on a similarity
+threshold, so common words can drag an unrelated message over it. This
+harness runs the shipped rules with:
+
+1. typos and rewordings that must reach their rule
+2. messages that must fall back to the default reply (no rule covers them,
+   or they are made of common words only)
+3. ``intent_threshold`` values that ``compile_rules`` must reject
+
+Run with ``python verify_intents.py``; exits non-zero on any mismatch.
+"""
+import json
+import sys
+
+from rules import RULES_FILE, InvalidRules, compile_rules, load_intents, load_rules
+
+MATCHES = {
+    "richset person": "richest_person",
+    "wealthiest individuals": "richest_person",
+    "tell me somthing funny": "joke",
+    "fastest vehicle": "fastest_car",
+    "explain artifical intelligence": "what_is_ai",
+    "who founded gogle": "founder_google",
+    "how many ppl live on earth": "world_population",
+    "is it going to rain today": "weather",
+    "i need assistance": "help",
+    "good mornin": "greeting",
+    "how are you": "greeting",
+}
+
+NO_MATCH = [
+    "what",
+    "how",
+    "who are you",
+    "how old are you",
+    "where do you live",
+    "what is the capital of france",
+    "what are you doing",
+    "do you like pizza",
+    "are you a robot",
+    "i am sad",
+    "asdf qwerty",
+]
+
+BAD_THRESHOLDS = [-0.1, 1.5, "0.5", True, None]
+
+
+def verify() -> int:
+    """Run all checks and return the number of failures"""
+    if load_intents is None:
+        print("The intent layer needs NumPy")
+        return 1
+    matcher = load_rules()
+    failures = 0
+
+    for message, expected in MATCHES.items():
+        intent = matcher.match_intent(message)
+        if intent is None or intent[0].name != expected:
+            failures += 1
+            print(f"[match] {message!r}: got {intent and (intent[0].name, round(intent[1], 2))}, expected {expected}")
+
+    for message in NO_MATCH:
+        rule = matcher.match(message)
+        if rule is not matcher.default:
+            failures += 1
+            intent = matcher.match_intent(message)
+            print(f"[no match] {message!r}: got {rule.name} ({intent and round(intent[1], 2)}), expected default")
+
+    with open(RULES_FILE, encoding='utf-8') as f:
+        data = json.load(f)
+    for threshold in BAD_THRESHOLDS:
+        try:
+            compile_rules(dict(data, intent_threshold=threshold))
+        except InvalidRules:
+            continue
+        failures += 1
+        print(f"[threshold] intent_threshold={threshold!r} was accepted")
+
+    checked = len(MATCHES) + len(NO_MATCH) + len(BAD_THRESHOLDS)
+    print(f"Checked {checked} cases: {failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if verify() else 0)
@@ -8,13 +8,26 @@ from typing import List, Tuple, Optional
 from enum import Enum
 from dataclasses import dataclass
 from collections import defaultdict
-import pickle
 import random
 from colorama import Fore, Back, Style, init
 from tabulate import tabulate
+from bitboard import FULL_BOARD, WIN_TABLE, mask_to_moves
+from engine import (O, X, Bound, LineBoard, TTEntry, get_geometry, iterative_deepening,
+                    score_from_table, score_to_table)
+from renderer import BoardRenderer, clear_screen
+from solved_table import load_solved_table
+from stats_store import StatsStore, StatsSummary
 
 init(autoreset=True)
 
+# The 3x3 minimax scores wins 10 - depth, so every non-zero score is a win or loss
+CLASSIC_MATE_BOUND = 1
+
+# MEDIUM without NumPy (no MCTS): the original blunder-prone search
+BLUNDER_RATE = 0.3
+BLUNDER_CANDIDATES = 5
+BLUNDER_DEPTH = 2
+
 class Difficulty(Enum):
     EASY = 1
     MEDIUM = 2
@@ -43,37 +56,59 @@ class GameStats:
         }
 
 class TicTacToe:
-    def __init__(self, difficulty: Difficulty = Difficulty.HARD):
-        self.board = [' ' for _ in range(9)]
+    def __init__(self, difficulty: Difficulty = Difficulty.HARD, size: int = 3,
+                 win_length: Optional[int] = None, time_budget: float = 1.0,
+                 think_delay: float = 0.5, search_workers: int = 1,
+                 stats_file: Optional[Path] = Path('game_stats.bin')):
+        self.size = size
+        self.win_length = win_length if win_length is not None else min(size, 5)
+        self.geometry = get_geometry(self.size, self.win_length)
+        self.is_classic = self.size == 3 and self.win_length == 3
+        self.time_budget = time_budget
+        self.think_delay = think_delay
+        self.board = [' ' for _ in range(self.geometry.cells)]
+        self.position = LineBoard(self.geometry)
         self.human = 'X'
         self.ai = 'O'
         self.difficulty = difficulty
         self.move_history = []
+        self.first_mover = 'unknown'
         self.stats = GameStats()
-        self.stats_file = Path('game_stats.pkl')
+        self.summary = StatsSummary()
+        # Without a stats file the totals are only kept for this session
+        self.stats_file = stats_file
+        self.legacy_stats_file = Path('game_stats.pkl')
+        self.stats_store = StatsStore(stats_file) if stats_file is not None else None
+        self.renderer = BoardRenderer(self.size)
         self.transposition_table = {}
-        self.load_stats()
+        self.search_table = {}
+        self.search_workers = search_workers
+        self.parallel_search = None
+        self.solved_table = load_solved_table() if self.is_classic else None
+        if self.stats_store is not None:
+            self.load_stats()
     
     def load_stats(self):
-        """Load game statistics from file"""
+        """Load the running totals (the game history itself stays on disk)"""
         try:
-            if self.stats_file.exists():
-                with open(self.stats_file, 'rb') as f:
-                    self.stats = pickle.load(f)
+            if not self.stats_file.exists() and self.legacy_stats_file.exists():
+                self.stats_store.migrate_pickle(self.legacy_stats_file)
+            self.apply_summary(self.stats_store.summary())
         except Exception as e:
             print(f"{Fore.RED}Error loading stats: {e}{Style.RESET_ALL}")
     
-    def save_stats(self):
-        """Save game statistics to file"""
-        try:
-            with open(self.stats_file, 'wb') as f:
-                pickle.dump(self.stats, f)
-        except Exception as e:
-            print(f"{Fore.RED}Error saving stats: {e}{Style.RESET_ALL}")
+    def apply_summary(self, summary: StatsSummary):
+        """Copy store totals into the in-memory stats"""
+        self.summary = summary
+        self.stats.human_wins = summary.human_wins
+        self.stats.ai_wins = summary.ai_wins
+        self.stats.draws = summary.draws
+        self.stats.total_games = summary.total_games
+        self.stats.average_moves = summary.average_moves
     
     def display_stats(self):
         """Display game statistics in table format"""
-        os.system('clear' if os.name == 'posix' else 'cls')
+        clear_screen()
         print(f"\n{Fore.CYAN}{'='*50}")
         print(f"{Fore.CYAN}          GAME STATISTICS")
         print(f"{Fore.CYAN}{'='*50}{Style.RESET_ALL}\n")
@@ -90,63 +125,73 @@ class TicTacToe:
         print(tabulate(stats_data, headers=["Metric", "Value"], tablefmt="fancy_grid"))
         print()
     
-    def print_board(self):
-        """Print the game board with colors"""
-        os.system('clear' if os.name == 'posix' else 'cls')
-        print("\n")
+    def display_analytics(self):
+        """Display win rates per difficulty, first mover and day"""
+        clear_screen()
+        print(f"\n{Fore.CYAN}{'='*50}")
+        print(f"{Fore.CYAN}          GAME ANALYTICS")
+        print(f"{Fore.CYAN}{'='*50}{Style.RESET_ALL}\n")
         
-        def color_cell(cell):
-            if cell == 'X':
-                return f"{Fore.GREEN}{cell}{Style.RESET_ALL}"
-            elif cell == 'O':
-                return f"{Fore.RED}{cell}{Style.RESET_ALL}"
-            else:
-                return cell
+        try:
+            from analytics import aggregate, format_report, load_history
+        except ImportError as e:
+            print(f"{Fore.RED}Analytics needs NumPy: {e}{Style.RESET_ALL}\n")
+            return
         
-        board_display = [
-            f"  {color_cell(self.board[0])}  |  {color_cell(self.board[1])}  |  {color_cell(self.board[2])}",
-            "_____|_____|_____",
-            f"  {color_cell(self.board[3])}  |  {color_cell(self.board[4])}  |  {color_cell(self.board[5])}",
-            "_____|_____|_____",
-            f"  {color_cell(self.board[6])}  |  {color_cell(self.board[7])}  |  {color_cell(self.board[8])}"
-        ]
+        history = load_history(self.stats_file) if self.stats_file is not None else []
+        if len(history) == 0:
+            print(f"{Fore.YELLOW}No games recorded yet.{Style.RESET_ALL}\n")
+            return
         
-        for line in board_display:
-            print(line)
-        print()
+        for by in (['difficulty'], ['first_mover'], ['day']):
+            print(format_report(aggregate(history, by), by))
+            print()
+    
+    def print_board(self):
+        """Print the game board with colors (only the changed squares on a terminal)"""
+        self.renderer.draw(self.board)
     
     def print_positions(self):
         """Print position guide"""
         print(f"{Fore.CYAN}Position numbers:{Style.RESET_ALL}")
-        print("     |     |     ")
-        print("  0  |  1  |  2  ")
-        print("_____|_____|_____")
-        print("     |     |     ")
-        print("  3  |  4  |  5  ")
-        print("_____|_____|_____")
-        print("     |     |     ")
-        print("  6  |  7  |  8  ")
-        print("     |     |     \n")
+        size = self.size
+        spacer = '|'.join(['     '] * size)
+        for row in range(size):
+            print(spacer)
+            print('|'.join(f"{row * size + col:^5}" for col in range(size)))
+            print('|'.join(['_____'] * size) if row < size - 1 else spacer + "\n")
+    
+    @property
+    def x_bits(self) -> int:
+        return self.position.bits[X]
+    
+    @property
+    def o_bits(self) -> int:
+        return self.position.bits[O]
+    
+    def get_bits(self, player: str) -> int:
+        """Get the bitboard for a player"""
+        return self.x_bits if player == 'X' else self.o_bits
+    
+    def make_move(self, position: int, player: str):
+        """Place a piece on both the line-count board and the display board"""
+        self.position.play(position, X if player == 'X' else O)
+        self.board[position] = player
     
     def is_winner(self, player: str) -> bool:
         """Check if player is winner"""
-        winning_combos = [
-            [0, 1, 2], [3, 4, 5], [6, 7, 8],
-            [0, 3, 6], [1, 4, 7], [2, 5, 8],
-            [0, 4, 8], [2, 4, 6]
-        ]
-        return any(all(self.board[i] == player for i in combo) for combo in winning_combos)
+        return self.position.winner == (X if player == 'X' else O)
     
     def is_board_full(self) -> bool:
         """Check if board is full"""
-        return ' ' not in self.board
+        return self.position.is_full()
     
     def get_empty_moves(self) -> List[int]:
         """Get list of empty positions"""
-        return [i for i in range(9) if self.board[i] == ' ']
+        return mask_to_moves(self.geometry.full_mask & ~self.position.occupied())
     
     def get_board_state(self) -> str:
-        """Get board state as string for transposition table"""
+        """Get board state as string"""
         return ''.join(self.board)
     
     def evaluate(self) -> int:
@@ -157,47 +202,131 @@ class TicTacToe:
             return -10
         return 0
     
-    def minimax(self, depth: int, is_maximizing: bool, alpha: int = float('-inf'), beta: int = float('inf')) -> int:
-        """Minimax with alpha-beta pruning and transposition table"""
-        board_state = self.get_board_state()
+    def minimax(self, ai_bits: int, human_bits: int, depth: int, is_maximizing: bool,
+                alpha: int = float('-inf'), beta: int = float('inf')) -> int:
+        """Minimax with alpha-beta pruning and a bound-aware transposition table (3x3 only)"""
+        # Equal piece counts occur with either side to move, so the key includes it
+        board_key = ai_bits | human_bits << 9 | is_maximizing << 18
         
-        if board_state in self.transposition_table:
-            return self.transposition_table[board_state]
+        first_bit = 0
+        entry = self.transposition_table.get(board_key)
+        if entry is not None:
+            value = score_from_table(entry.value, depth, CLASSIC_MATE_BOUND)
+            if entry.bound is Bound.EXACT:
+                return value
+            if entry.bound is Bound.LOWER and value >= beta:
+                return value
+            if entry.bound is Bound.UPPER and value <= alpha:
+                return value
+            first_bit = 1 << entry.best_move
         
-        score = self.evaluate()
+        if WIN_TABLE[ai_bits]:
+            return 10 - depth
+        if WIN_TABLE[human_bits]:
+            return depth - 10
         
-        if score == 10:
-            return score - depth
-        if score == -10:
-            return score + depth
-        
-        if self.is_board_full():
+        empty = FULL_BOARD & ~(ai_bits | human_bits)
+        if not empty:
             return 0
         
+        alpha_orig = alpha
+        beta_orig = beta
+        best_bit = 0
+        
+        # The stored best move is searched first, then the rest in square order
         if is_maximizing:
             best_score = float('-inf')
-            for move in self.get_empty_moves():
-                self.board[move] = self.ai
-                score = self.minimax(depth + 1, False, alpha, beta)
-                self.board[move] = ' '
-                best_score = max(score, best_score)
-                alpha = max(alpha, best_score)
+            while empty:
+                move_bit = first_bit or empty & -empty
+                first_bit = 0
+                empty ^= move_bit
+                score = self.minimax(ai_bits | move_bit, human_bits, depth + 1, False, alpha, beta)
+                if score > best_score:
+                    best_score = score
+                    best_bit = move_bit
+                if best_score > alpha:
+                    alpha = best_score
                 if beta <= alpha:
                     break
         else:
             best_score = float('inf')
-            for move in self.get_empty_moves():
-                self.board[move] = self.human
-                score = self.minimax(depth + 1, True, alpha, beta)
-                self.board[move] = ' '
-                best_score = min(score, best_score)
-                beta = min(beta, best_score)
+            while empty:
+                move_bit = first_bit or empty & -empty
+                first_bit = 0
+                empty ^= move_bit
+                score = self.minimax(ai_bits, human_bits | move_bit, depth + 1, True, alpha, beta)
+                if score < best_score:
+                    best_score = score
+                    best_bit = move_bit
+                if best_score < beta:
+                    beta = best_score
                 if beta <= alpha:
                     break
         
-        self.transposition_table[board_state] = best_score
+        if best_score <= alpha_orig:
+            bound = Bound.UPPER
+        elif best_score >= beta_orig:
+            bound = Bound.LOWER
+        else:
+            bound = Bound.EXACT
+        self.transposition_table[board_key] = TTEntry(
+            score_to_table(best_score, depth, CLASSIC_MATE_BOUND), bound, best_bit.bit_length() - 1
+        )
         return best_score
     
+    def score_moves(self, moves: List[int]) -> Optional[int]:
+        """Return the move with the highest minimax score (first one on ties)"""
+        ai_bits = self.get_bits(self.ai)
+        human_bits = self.get_bits(self.human)
+        best_score = float('-inf')
+        best_move = None
+        for move in moves:
+            score = self.minimax(ai_bits | 1 << move, human_bits, 0, False)
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_move
+    
+    def search_move(self, max_depth: Optional[int] = None) -> Optional[int]:
+        """Iterative-deepening search within the per-move time budget (any board size)"""
+        player = X if self.ai == 'X' else O
+        if self.search_workers > 1:
+            if self.parallel_search is None:
+                from parallel_search import ParallelSearch
+                self.parallel_search = ParallelSearch(self.search_workers)
+            return self.parallel_search.search(self.position, player, self.time_budget, max_depth).move
+        result = iterative_deepening(self.position, player, self.time_budget, max_depth, self.search_table)
+        return result.move
+
+    def mcts_move(self, playouts: int) -> Optional[int]:
+        """Monte Carlo tree search with a playout budget, cut short by the per-move time budget"""
+        from mcts import mcts_search
+        result = mcts_search(self.position, X if self.ai == 'X' else O, playouts, self.time_budget,
+                             rng=random.getrandbits(64))
+        return result.move
+    
+    def medium_move(self, empty_moves: List[int]) -> Optional[int]:
+        """MCTS with a small playout budget; without NumPy, the old MEDIUM"""
+        try:
+            from mcts import MEDIUM_PLAYOUTS
+        except ImportError:
+            return self.blunder_move(empty_moves)
+        return self.mcts_move(MEDIUM_PLAYOUTS)
+    
+    def blunder_move(self, empty_moves: List[int]) -> Optional[int]:
+        """A random move 30% of the time, else the best of the first 5 empty squares"""
+        if random.random() < BLUNDER_RATE:
+            return random.choice(empty_moves)
+        if self.is_classic:
+            return self.score_moves(empty_moves[:BLUNDER_CANDIDATES])
+        return self.search_move(BLUNDER_DEPTH)
+    
+    def close(self):
+        """Stop the parallel search processes, if any were started"""
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+            self.parallel_search = None
+    
     def get_best_move(self) -> Optional[int]:
         """Get best move for AI based on difficulty"""
         empty_moves = self.get_empty_moves()
@@ -206,81 +335,65 @@ class TicTacToe:
             return random.choice(empty_moves) if empty_moves else None
         
         elif self.difficulty == Difficulty.MEDIUM:
-            if random.random() < 0.3:
-                return random.choice(empty_moves)
-            best_score = float('-inf')
-            best_move = None
-            for move in empty_moves[:5]:
-                self.board[move] = self.ai
-                score = self.minimax(0, False)
-                self.board[move] = ' '
-                if score > best_score:
-                    best_score = score
-                    best_move = move
-            return best_move
+            return self.medium_move(empty_moves) if empty_moves else None
+        
+        elif not self.is_classic:
+            return self.search_move() if empty_moves else None
         
         else:
-            best_score = float('-inf')
-            best_move = None
-            for move in empty_moves:
-                self.board[move] = self.ai
-                score = self.minimax(0, False)
-                self.board[move] = ' '
-                if score > best_score:
-                    best_score = score
-                    best_move = move
-            return best_move
+            if self.solved_table is not None and empty_moves:
+                move = self.solved_table.best_move(self.get_bits(self.ai), self.get_bits(self.human))
+                if move is not None:
+                    return move
+            return self.score_moves(empty_moves)
     
     def make_human_move(self):
         """Handle human player move"""
         while True:
+            # Every rejected entry adds lines under the board, which may scroll the
+            # screen out from under the incremental frame: redraw in full next time
             try:
-                position = int(input(f"{Fore.CYAN}Enter your move (0-8): {Style.RESET_ALL}"))
-                if position < 0 or position > 8:
-                    print(f"{Fore.RED}Invalid! Please enter a number between 0 and 8.{Style.RESET_ALL}")
+                last = self.geometry.cells - 1
+                position = int(input(f"{Fore.CYAN}Enter your move (0-{last}): {Style.RESET_ALL}"))
+                if position < 0 or position > last:
+                    print(f"{Fore.RED}Invalid! Please enter a number between 0 and {last}.{Style.RESET_ALL}")
+                    self.renderer.invalidate()
                     continue
                 if self.board[position] != ' ':
                     print(f"{Fore.RED}That position is already taken!{Style.RESET_ALL}")
+                    self.renderer.invalidate()
                     continue
-                self.board[position] = self.human
+                self.make_move(position, self.human)
                 self.move_history.append(position)
                 break
             except ValueError:
                 print(f"{Fore.RED}Invalid input! Please enter a number.{Style.RESET_ALL}")
+                self.renderer.invalidate()
     
     def make_ai_move(self):
         """Handle AI move"""
         print(f"{Fore.YELLOW}AI is thinking...{Style.RESET_ALL}")
-        time.sleep(0.5)
+        if self.think_delay:
+            time.sleep(self.think_delay)
         move = self.get_best_move()
         if move is not None:
-            self.board[move] = self.ai
+            self.make_move(move, self.ai)
             self.move_history.append(move)
             print(f"{Fore.YELLOW}AI placed O at position {move}{Style.RESET_ALL}\n")
     
     def record_game(self, result: str):
-        """Record game results"""
-        self.stats.total_games += 1
-        
-        if result == 'human':
-            self.stats.human_wins += 1
-        elif result == 'ai':
-            self.stats.ai_wins += 1
-        else:
-            self.stats.draws += 1
-        
-        game_record = {
-            'result': result,
-            'timestamp': datetime.now().isoformat(),
-            'moves': len(self.move_history),
-            'difficulty': self.difficulty.name
-        }
-        self.stats.games_played.append(game_record)
-        
-        total_moves = sum(g['moves'] for g in self.stats.games_played)
-        self.stats.average_moves = total_moves / self.stats.total_games
-        
-        self.save_stats()
+        """Record game results by appending one record to the stats store"""
+        if self.stats_store is None:
+            self.apply_summary(self.summary.add(result, len(self.move_history)))
+            return
+        try:
+            summary = self.stats_store.append(
+                result, len(self.move_history), self.difficulty.value,
+                self.first_mover, self.size, self.win_length
+            )
+            self.apply_summary(summary)
+        except Exception as e:
+            print(f"{Fore.RED}Error saving stats: {e}{Style.RESET_ALL}")
     
     def play(self):
         """Main game loop"""
@@ -288,10 +401,12 @@ class TicTacToe:
         print(f"{Fore.CYAN}  Welcome to Advanced Tic-Tac-Toe AI Game")
         print(f"{Fore.CYAN}{'='*50}{Style.RESET_ALL}")
         self.print_positions()
+        self.renderer.invalidate()
         
         human_first = input(f"{Fore.CYAN}Do you want to go first? (yes/no): {Style.RESET_ALL}").lower() == 'yes'
         
         current_turn = 'human' if human_first else 'ai'
+        self.first_mover = current_turn
         
         while True:
             self.print_board()
@@ -326,70 +441,79 @@ class TicTacToe:
     
     def reset(self):
         """Reset for new game"""
-        self.board = [' ' for _ in range(9)]
+        self.board = [' ' for _ in range(self.geometry.cells)]
+        self.position = LineBoard(self.geometry)
         self.move_history = []
-        self.transposition_table = {}
+        self.search_table = {}
+        if self.parallel_search is not None:
+            self.parallel_search.new_game()
+
+def play_rounds(game: TicTacToe):
+    """Play games until the player declines a rematch"""
+    game.play()
+    play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
+    while play_again == 'yes':
+        game.reset()
+        game.play()
+        play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
+
+def read_int(prompt: str, low: int, high: int, default: int) -> int:
+    """Read an integer in [low, high], falling back to default on bad input"""
+    try:
+        value = int(input(f"{Fore.CYAN}{prompt} [{default}]: {Style.RESET_ALL}") or default)
+    except ValueError:
+        return default
+    return min(max(value, low), high)
 
 def main():
     """Main entry point"""
     while True:
-        os.system('clear' if os.name == 'posix' else 'cls')
+        clear_screen()
         print(f"\n{Fore.CYAN}{'='*50}")
         print(f"{Fore.CYAN}        TIC-TAC-TOE AI MENU")
         print(f"{Fore.CYAN}{'='*50}{Style.RESET_ALL}\n")
         print("1. Play Game (Hard)")
         print("2. Play Game (Medium)")
         print("3. Play Game (Easy)")
-        print("4. View Statistics")
-        print("5. Exit")
+        print("4. Play Custom Board (N x N, K in a row)")
+        print("5. View Statistics")
+        print("6. View Analytics")
+        print("7. Exit")
         
         choice = input(f"\n{Fore.CYAN}Select an option: {Style.RESET_ALL}").strip()
         
         if choice == '1':
-            game = TicTacToe(Difficulty.HARD)
-            game.play()
-            play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
-            if play_again != 'yes':
-                continue
-            game.reset()
-            while play_again == 'yes':
-                game.play()
-                play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
-                if play_again == 'yes':
-                    game.reset()
+            play_rounds(TicTacToe(Difficulty.HARD))
         
         elif choice == '2':
-            game = TicTacToe(Difficulty.MEDIUM)
-            game.play()
-            play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
-            if play_again != 'yes':
-                continue
-            game.reset()
-            while play_again == 'yes':
-                game.play()
-                play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
-                if play_again == 'yes':
-                    game.reset()
+            play_rounds(TicTacToe(Difficulty.MEDIUM))
         
         elif choice == '3':
-            game = TicTacToe(Difficulty.EASY)
-            game.play()
-            play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
-            if play_again != 'yes':
-                continue
-            game.reset()
-            while play_again == 'yes':
-                game.play()
-                play_again = input(f"\n{Fore.CYAN}Play again? (yes/no): {Style.RESET_ALL}").lower()
-                if play_again == 'yes':
-                    game.reset()
+            play_rounds(TicTacToe(Difficulty.EASY))
         
         elif choice == '4':
+            size = read_int("Board size (3-15)", 3, 15, 4)
+            win_length = read_int(f"Marks in a row to win (3-{size})", 3, size, min(size, 5))
+            seconds = read_int("AI seconds per move (1-60)", 1, 60, 2)
+            cpus = os.cpu_count() or 1
+            workers = read_int(f"Search processes (1-{cpus})", 1, cpus, 1) if cpus > 1 else 1
+            game = TicTacToe(Difficulty.HARD, size, win_length, float(seconds), search_workers=workers)
+            try:
+                play_rounds(game)
+            finally:
+                game.close()
+        
+        elif choice == '5':
             game = TicTacToe()
             game.display_stats()
             input(f"{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
         
-        elif choice == '5':
+        elif choice == '6':
+            game = TicTacToe()
+            game.display_analytics()
+            input(f"{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
+        
+        elif choice == '7':
             print(f"\n{Fore.CYAN}Thanks for playing!{Style.RESET_ALL}\n")
             sys.exit(0)
         
@@ -0,0 +1,190 @@
+"""Vectorized analytics over the game history.
+
+The fixed-width records written by ``stats_store`` are memory-mapped as a
+NumPy structured array, so every field is available as a column without
+parsing the file or building Python objects per game. Grouping combines the
+integer codes of the requested keys into one group index and aggregates with
+``np.bincount``; Python only loops over the resulting groups, which keeps
+reports interactive on histories of tens of millions of games.
+
+Usage::
+
+    python analytics.py                          # per difficulty, all time
+    python analytics.py --by day difficulty --days 7
+    python analytics.py --by hour first_mover --stats-file game_stats.bin
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from tabulate import tabulate
+
+from stats_store import DIFFICULTIES, FIRST_MOVERS, HEADER, RECORD, RESULTS
+
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('result', 'u1'),
+    ('moves', 'u1'),
+    ('difficulty', 'u1'),
+    ('first_mover', 'u1'),
+    ('size', 'u1'),
+    ('win_length', 'u1'),
+    ('pad', 'V2')
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+GROUP_KEYS = ('difficulty', 'first_mover', 'board', 'day', 'hour')
+
+HUMAN = RESULTS.index('human')
+AI = RESULTS.index('ai')
+DRAW = RESULTS.index('draw')
+
+
+def load_history(path: Path) -> np.ndarray:
+    """Memory-map the history records as a structured array (no copy)"""
+    path = Path(path)
+    if not path.exists():
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    count = (path.stat().st_size - HEADER.size) // RECORD.size
+    if count <= 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+
+def local_utc_offset() -> float:
+    """Seconds east of UTC for the local timezone right now"""
+    return datetime.now().astimezone().utcoffset().total_seconds()
+
+
+def _key_codes(history: np.ndarray, key: str, utc_offset: float) -> np.ndarray:
+    if key == 'difficulty':
+        return history['difficulty'].astype(np.int64)
+    if key == 'first_mover':
+        return history['first_mover'].astype(np.int64)
+    if key == 'board':
+        return history['size'].astype(np.int64) << 8 | history['win_length']
+    local = history['timestamp'] + utc_offset
+    if key == 'day':
+        return np.floor_divide(local, 86400).astype(np.int64)
+    if key == 'hour':
+        return (np.floor_divide(local, 3600) % 24).astype(np.int64)
+    raise ValueError(f"Unknown group key '{key}' (choose from {', '.join(GROUP_KEYS)})")
+
+
+def _key_label(key: str, code: int) -> str:
+    if key == 'difficulty':
+        return DIFFICULTIES.get(code, 'UNKNOWN')
+    if key == 'first_mover':
+        return FIRST_MOVERS[code] if code < len(FIRST_MOVERS) else 'unknown'
+    if key == 'board':
+        size, win_length = code >> 8, code & 0xFF
+        return f"{size}x{size}, {win_length} in a row"
+    if key == 'day':
+        return datetime.fromtimestamp(code * 86400, timezone.utc).date().isoformat()
+    return f"{code:02d}:00"
+
+
+def aggregate(history: np.ndarray, by: Sequence[str] = ('difficulty',),
+              since: Optional[float] = None, until: Optional[float] = None,
+              utc_offset: Optional[float] = None) -> List[Dict]:
+    """Aggregate games per group of ``by`` keys within an optional time window.
+
+    Returns one dict per non-empty group (sorted by key) with game counts,
+    wins per side, draws, win rates and average moves.
+    """
+    if utc_offset is None:
+        utc_offset = local_utc_offset()
+    for key in by:
+        if key not in GROUP_KEYS:
+            raise ValueError(f"Unknown group key '{key}' (choose from {', '.join(GROUP_KEYS)})")
+
+    if since is not None or until is not None:
+        timestamps = history['timestamp']
+        mask = np.ones(len(history), dtype=bool)
+        if since is not None:
+            mask &= timestamps >= since
+        if until is not None:
+            mask &= timestamps < until
+        history = history[mask]
+    if len(history) == 0:
+        return []
+
+    group_index = np.zeros(len(history), dtype=np.int64)
+    key_values = []
+    for key in by:
+        values, inverse = np.unique(_key_codes(history, key, utc_offset), return_inverse=True)
+        group_index = group_index * len(values) + inverse.reshape(-1)
+        key_values.append(values)
+
+    group_count = int(np.prod([len(values) for values in key_values])) if key_values else 1
+    results = history['result']
+    games = np.bincount(group_index, minlength=group_count)
+    human_wins = np.bincount(group_index, weights=results == HUMAN, minlength=group_count)
+    ai_wins = np.bincount(group_index, weights=results == AI, minlength=group_count)
+    draws = np.bincount(group_index, weights=results == DRAW, minlength=group_count)
+    moves = np.bincount(group_index, weights=history['moves'], minlength=group_count)
+
+    rows = []
+    for group in np.flatnonzero(games):
+        row = {}
+        remainder = int(group)
+        for key, values in reversed(list(zip(by, key_values))):
+            remainder, position = divmod(remainder, len(values))
+            row[key] = _key_label(key, int(values[position]))
+        row = {key: row[key] for key in by}
+        total = int(games[group])
+        row.update({
+            'games': total,
+            'human_wins': int(human_wins[group]),
+            'ai_wins': int(ai_wins[group]),
+            'draws': int(draws[group]),
+            'human_win_rate': human_wins[group] / total * 100,
+            'ai_win_rate': ai_wins[group] / total * 100,
+            'average_moves': moves[group] / total
+        })
+        rows.append(row)
+    return rows
+
+
+def format_report(rows: List[Dict], by: Sequence[str]) -> str:
+    """Render aggregated rows as a table"""
+    headers = [key.replace('_', ' ').title() for key in by] + \
+        ["Games", "Your Wins", "AI Wins", "Draws", "Win Rate", "AI Win Rate", "Avg Moves"]
+    table = [
+        [row[key] for key in by] + [
+            row['games'], row['human_wins'], row['ai_wins'], row['draws'],
+            f"{row['human_win_rate']:.1f}%", f"{row['ai_win_rate']:.1f}%", f"{row['average_moves']:.1f}"
+        ]
+        for row in rows
+    ]
+    return tabulate(table, headers=headers, tablefmt="fancy_grid", disable_numparse=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tic-Tac-Toe game history analytics")
+    parser.add_argument('--stats-file', type=Path, default=Path('game_stats.bin'))
+    parser.add_argument('--by', nargs='+', default=['difficulty'], choices=GROUP_KEYS)
+    parser.add_argument('--days', type=float, default=None, help="only games from the last N days")
+    parser.add_argument('--utc', action='store_true', help="bucket days/hours in UTC instead of local time")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    history = load_history(args.stats_file)
+    since = time.time() - args.days * 86400 if args.days is not None else None
+    rows = aggregate(history, args.by, since=since, utc_offset=0.0 if args.utc else None)
+    elapsed = time.perf_counter() - start
+
+    if not rows:
+        print("No games recorded in this window.")
+        return 0
+    print(format_report(rows, args.by))
+    print(f"{len(history)} games scanned in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
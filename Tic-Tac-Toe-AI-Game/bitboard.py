@@ -0,0 +1,46 @@
+"""Bitboard helpers for the Tic-Tac-Toe engine.
+
+Each player's pieces are stored as a 9-bit integer: bit ``i`` is set when the
+player occupies square ``i`` (0-8, row-major, same numbering as the UI).
+"""
+from typing import List
+
+FULL_BOARD = 0x1FF
+
+WIN_MASKS = tuple(sum(1 << i for i in combo) for combo in (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),
+    (0, 4, 8), (2, 4, 6)
+))
+
+# WIN_TABLE[bits] is 1 when the 9-bit position ``bits`` contains a full line,
+# so a win check is a single index instead of a scan over the masks.
+WIN_TABLE = bytes(
+    1 if any(bits & mask == mask for mask in WIN_MASKS) else 0
+    for bits in range(FULL_BOARD + 1)
+)
+
+
+def is_win(bits: int) -> bool:
+    """Check if a player's bitboard contains a winning line"""
+    return WIN_TABLE[bits] == 1
+
+
+def empty_mask(x_bits: int, o_bits: int) -> int:
+    """Get a bitmask of the empty squares"""
+    return FULL_BOARD & ~(x_bits | o_bits)
+
+
+def mask_to_moves(mask: int) -> List[int]:
+    """Expand a bitmask into a list of square indices (lowest first)"""
+    moves = []
+    while mask:
+        low = mask & -mask
+        moves.append(low.bit_length() - 1)
+        mask ^= low
+    return moves
+
+
+def to_cells(x_bits: int, o_bits: int) -> List[str]:
+    """Build the list-of-cells view used for display"""
+    return ['X' if x_bits >> i & 1 else 'O' if o_bits >> i & 1 else ' ' for i in range(9)]
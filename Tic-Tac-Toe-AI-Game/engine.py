@@ -0,0 +1,342 @@
+"""General N×N, K-in-a-row engine.
+
+``LineBoard`` keeps, for every winning line, how many pieces each player has
+on it. A move only touches the lines through its square, so win detection and
+the heuristic evaluation are updated incrementally instead of rescanning the
+board. ``iterative_deepening`` searches the position with alpha-beta and a
+transposition table, deepening one ply at a time until a wall-clock budget
+runs out, and returns the best move of the last completed depth.
+"""
+import random
+import time
+from enum import Enum
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+
+from bitboard import mask_to_moves
+
+X = 0
+O = 1
+
+WIN_SCORE = 10 ** 9
+
+
+class Bound(Enum):
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+
+class TTEntry(NamedTuple):
+    """Transposition table entry; ``value`` is stored relative to its own node"""
+    value: int
+    bound: Bound
+    best_move: int
+    draft: int = 0
+
+
+# More plies than any search reaches: scores this close to WIN_SCORE are wins or losses
+MAX_PLY = 10_000
+MATE_BOUND = WIN_SCORE - MAX_PLY
+
+
+def score_to_table(score: int, ply: int, mate_bound: int = MATE_BOUND) -> int:
+    """Make a win or loss score relative to the node at ``ply``; heuristic scores are stored as is"""
+    if score >= mate_bound:
+        return score + ply
+    if score <= -mate_bound:
+        return score - ply
+    return score
+
+
+def score_from_table(value: int, ply: int, mate_bound: int = MATE_BOUND) -> int:
+    """Re-apply the ply adjustment to a stored win or loss score when probing at ``ply``"""
+    if value >= mate_bound:
+        return value - ply
+    if value <= -mate_bound:
+        return value + ply
+    return value
+
+
+class BoardGeometry:
+    """Precomputed lines, masks and hash keys for one board size and win length"""
+
+    def __init__(self, size: int, win_length: int):
+        if size < 3:
+            raise ValueError("Board size must be at least 3")
+        if not 3 <= win_length <= size:
+            raise ValueError(f"Win length must be between 3 and {size}")
+
+        self.size = size
+        self.win_length = win_length
+        self.cells = size * size
+        self.full_mask = (1 << self.cells) - 1
+
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row = row + d_row * (win_length - 1)
+                    end_col = col + d_col * (win_length - 1)
+                    if 0 <= end_row < size and 0 <= end_col < size:
+                        lines.append(tuple((row + d_row * i) * size + col + d_col * i
+                                           for i in range(win_length)))
+        self.lines = tuple(lines)
+        self.line_masks = tuple(sum(1 << cell for cell in line) for line in lines)
+
+        through = [[] for _ in range(self.cells)]
+        for index, line in enumerate(lines):
+            for cell in line:
+                through[cell].append(index)
+        self.lines_through = tuple(tuple(indices) for indices in through)
+
+        center = (size - 1) / 2
+        self.center_order = tuple(sorted(
+            range(self.cells),
+            key=lambda cell: (abs(cell // size - center) + abs(cell % size - center), cell)
+        ))
+
+        # weights[n] is the value of an unblocked line holding n pieces of one player. Every
+        # line one piece short of a win must still add up to less than MATE_BOUND, or the
+        # table and the root cutoff would take heuristic scores for wins: long win
+        # lengths use a smaller base than 10
+        base = next((base for base in range(10, 1, -1)
+                     if base ** (win_length - 2) * len(lines) < MATE_BOUND), None)
+        if base is None:
+            raise ValueError(f"Win length {win_length} is too long to evaluate on a {size}x{size} board")
+        self.weights = (0,) + tuple(base ** (n - 1) for n in range(1, win_length + 1))
+
+        rng = random.Random(size * 1000 + win_length)
+        self.zobrist = (
+            tuple(rng.getrandbits(64) for _ in range(self.cells)),
+            tuple(rng.getrandbits(64) for _ in range(self.cells))
+        )
+        self.side_key = rng.getrandbits(64)
+
+        # Small boards consider every empty square; large ones only squares near play
+        self.local_moves = size > 5
+
+        first_col = sum(1 << row * size for row in range(size))
+        self._not_first_col = self.full_mask & ~first_col
+        self._not_last_col = self.full_mask & ~(first_col << size - 1)
+
+    def neighbours(self, occupied: int) -> int:
+        """Get the mask of squares within one step (including diagonals) of ``occupied``"""
+        row_grown = occupied | (occupied << 1) & self._not_first_col | (occupied >> 1) & self._not_last_col
+        return (row_grown | row_grown << self.size | row_grown >> self.size) & self.full_mask
+
+
+@lru_cache(maxsize=None)
+def get_geometry(size: int, win_length: int) -> BoardGeometry:
+    """Get the shared geometry for a board variant"""
+    return BoardGeometry(size, win_length)
+
+
+class LineBoard:
+    """Bitboard position with incrementally maintained line counts.
+
+    ``score`` is the heuristic evaluation from X's point of view: every line
+    still open to only one player is worth ``weights[pieces]`` to that player.
+    """
+
+    def __init__(self, geometry: BoardGeometry):
+        self.geometry = geometry
+        self.bits = [0, 0]
+        self.counts = ([0] * len(geometry.lines), [0] * len(geometry.lines))
+        self.score = 0
+        self.hash = 0
+        self.winner: Optional[int] = None
+
+    def gain(self, cell: int, player: int) -> int:
+        """Heuristic change for ``player`` if they played ``cell``"""
+        weights = self.geometry.weights
+        own_counts = self.counts[player]
+        opp_counts = self.counts[1 - player]
+        delta = 0
+        for line in self.geometry.lines_through[cell]:
+            own = own_counts[line]
+            opp = opp_counts[line]
+            if opp == 0:
+                delta += weights[own + 1] - weights[own]
+            elif own == 0:
+                delta += weights[opp]
+        return delta
+
+    def play(self, cell: int, player: int):
+        """Place a piece and update line counts, evaluation, hash and winner"""
+        geometry = self.geometry
+        delta = self.gain(cell, player)
+        own_counts = self.counts[player]
+        win_length = geometry.win_length
+        for line in geometry.lines_through[cell]:
+            own_counts[line] += 1
+            if own_counts[line] == win_length:
+                self.winner = player
+        self.score += delta if player == X else -delta
+        self.bits[player] |= 1 << cell
+        self.hash ^= geometry.zobrist[player][cell]
+
+    def undo(self, cell: int, player: int):
+        """Take back a piece; positions are never extended past a win"""
+        geometry = self.geometry
+        own_counts = self.counts[player]
+        for line in geometry.lines_through[cell]:
+            own_counts[line] -= 1
+        delta = self.gain(cell, player)
+        self.score -= delta if player == X else -delta
+        self.bits[player] &= ~(1 << cell)
+        self.hash ^= geometry.zobrist[player][cell]
+        self.winner = None
+
+    def occupied(self) -> int:
+        return self.bits[X] | self.bits[O]
+
+    def is_full(self) -> bool:
+        return self.occupied() == self.geometry.full_mask
+
+    def candidate_moves(self, player: int) -> List[int]:
+        """Candidate squares (only those near play on large boards), most promising first"""
+        geometry = self.geometry
+        occupied = self.occupied()
+        if not occupied:
+            return [geometry.center_order[0]]
+        if geometry.local_moves:
+            moves = mask_to_moves(geometry.neighbours(occupied) & ~occupied)
+        else:
+            moves = mask_to_moves(geometry.full_mask & ~occupied)
+        gain = self.gain
+        opponent = 1 - player
+        moves.sort(key=lambda cell: gain(cell, player) + gain(cell, opponent), reverse=True)
+        return moves
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget is used up"""
+
+
+class SearchResult(NamedTuple):
+    move: Optional[int]
+    score: int
+    depth: int
+    nodes: int
+
+
+def make_negamax(position: LineBoard, table: Dict[int, TTEntry], deadline: float):
+    """Build the alpha-beta search over ``position`` and a node counter for it.
+
+    ``negamax(to_move, depth_left, ply, alpha, beta)`` scores the position for
+    ``to_move`` and raises ``SearchTimeout`` once ``time.perf_counter()`` passes
+    ``deadline``; ``nodes()`` is the number of nodes searched so far.
+    """
+    geometry = position.geometry
+    full_mask = geometry.full_mask
+    side_key = geometry.side_key
+    nodes = 0
+
+    def negamax(to_move: int, depth_left: int, ply: int, alpha: int, beta: int) -> int:
+        nonlocal nodes
+        nodes += 1
+        if nodes & 1023 == 0 and time.perf_counter() > deadline:
+            raise SearchTimeout
+
+        if position.winner is not None:
+            return -(WIN_SCORE - ply)
+        if position.occupied() == full_mask:
+            return 0
+        if depth_left == 0:
+            return position.score if to_move == X else -position.score
+
+        key = position.hash ^ side_key if to_move else position.hash
+        first_move = -1
+        entry = table.get(key)
+        if entry is not None:
+            if entry.draft >= depth_left:
+                value = score_from_table(entry.value, ply)
+                if entry.bound is Bound.EXACT:
+                    return value
+                if entry.bound is Bound.LOWER and value >= beta:
+                    return value
+                if entry.bound is Bound.UPPER and value <= alpha:
+                    return value
+            first_move = entry.best_move
+
+        moves = position.candidate_moves(to_move)
+        if first_move in moves:
+            moves.remove(first_move)
+            moves.insert(0, first_move)
+
+        alpha_orig = alpha
+        best_score = -WIN_SCORE - 1
+        best_move = moves[0]
+        for move in moves:
+            position.play(move, to_move)
+            try:
+                score = -negamax(1 - to_move, depth_left - 1, ply + 1, -beta, -alpha)
+            finally:
+                position.undo(move, to_move)
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if best_score > alpha:
+                alpha = best_score
+            if alpha >= beta:
+                break
+
+        if best_score <= alpha_orig:
+            bound = Bound.UPPER
+        elif best_score >= beta:
+            bound = Bound.LOWER
+        else:
+            bound = Bound.EXACT
+        table[key] = TTEntry(score_to_table(best_score, ply), bound, best_move, depth_left)
+        return best_score
+
+    def node_count() -> int:
+        return nodes
+
+    return negamax, node_count
+
+
+def search_depth_limit(position: LineBoard, max_depth: Optional[int]) -> int:
+    """The deepest useful search: never past the number of empty squares"""
+    empty_count = position.geometry.cells - bin(position.occupied()).count('1')
+    return empty_count if max_depth is None else min(max_depth, empty_count)
+
+
+def iterative_deepening(position: LineBoard, player: int, time_budget: float,
+                        max_depth: Optional[int] = None,
+                        table: Optional[Dict[int, TTEntry]] = None) -> SearchResult:
+    """Search ``position`` for ``player`` one ply deeper at a time within ``time_budget`` seconds"""
+    table = {} if table is None else table
+    negamax, nodes = make_negamax(position, table, time.perf_counter() + time_budget)
+
+    depth_limit = search_depth_limit(position, max_depth)
+    root_moves = position.candidate_moves(player)
+    result = SearchResult(root_moves[0] if root_moves else None, 0, 0, 0)
+
+    for depth in range(1, depth_limit + 1):
+        try:
+            best_score = -WIN_SCORE - 1
+            best_move = root_moves[0]
+            alpha = -WIN_SCORE - 1
+            for move in root_moves:
+                position.play(move, player)
+                try:
+                    score = -negamax(1 - player, depth - 1, 1, -WIN_SCORE - 1, -alpha)
+                finally:
+                    position.undo(move, player)
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+                    alpha = score
+        except SearchTimeout:
+            break
+
+        result = SearchResult(best_move, best_score, depth, nodes())
+        # Search the previous best move first at the next depth
+        root_moves.remove(best_move)
+        root_moves.insert(0, best_move)
+        if abs(best_score) >= WIN_SCORE - depth_limit:
+            break
+
+    return result._replace(nodes=nodes())
@@ -0,0 +1,245 @@
+"""Monte Carlo tree search (UCT) for any board variant.
+
+``mcts_search`` grows a search tree with UCT selection and scores new leaves
+with random playouts until a playout or time budget is spent, then plays the
+most visited root move. It gives an answer whenever it is stopped, so the
+same code plays a weak or a strong game depending only on its budget.
+
+- **Batched Rollouts**: Each leaf is scored by ``batch_size`` random games at
+  once. The games are NumPy arrays (one row per game): a random move order is
+  an ``argsort`` of random keys, and every step adds one piece to the line
+  counts of all unfinished games and checks them for a complete line
+- **Array-Backed Tree**: Nodes are indices into flat NumPy arrays (parent
+  links, moves, child ranges, visits and rewards), not Python objects; the
+  children of a node are stored next to each other, so UCT scores a whole
+  child range in one vectorized expression
+- **Incremental Descent**: Selection plays moves on one ``LineBoard``, which
+  detects wins and supplies the starting line counts for the rollouts
+"""
+import math
+import time
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from bitboard import mask_to_moves
+from engine import LineBoard, get_geometry
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_EXPLORATION = 1.4
+
+# Playout budgets of the MEDIUM difficulty and of the full-strength agent
+MEDIUM_PLAYOUTS = 128
+STRONG_PLAYOUTS = 2048
+
+# Padding for the per-cell line lists: a column that can never complete a line
+_PAD_START = -10_000
+
+_OPEN, _WON, _DRAWN = 0, 1, 2
+
+
+class MCTSResult(NamedTuple):
+    move: Optional[int]
+    playouts: int
+    iterations: int
+    nodes: int
+    value: float  # expected score of ``move`` for the mover (1 win, 0.5 draw, 0 loss)
+
+
+@lru_cache(maxsize=None)
+def _lines_through(size: int, win_length: int) -> np.ndarray:
+    """``(cells, m)`` line indices through each cell, padded with the extra column ``len(lines)``"""
+    geometry = get_geometry(size, win_length)
+    width = max(len(lines) for lines in geometry.lines_through)
+    table = np.full((geometry.cells, width), len(geometry.lines), dtype=np.intp)
+    for cell, lines in enumerate(geometry.lines_through):
+        table[cell, :len(lines)] = lines
+    return table
+
+
+def rollout(position: LineBoard, player: int, batch_size: int, rng: np.random.Generator) -> Tuple[int, int]:
+    """Play ``batch_size`` uniformly random games from ``position`` with ``player`` to move.
+
+    Returns ``(wins, draws)`` counted for ``player``.
+    """
+    geometry = position.geometry
+    if position.winner is not None:
+        return (batch_size if position.winner == player else 0), 0
+    empty = np.array(mask_to_moves(geometry.full_mask & ~position.occupied()), dtype=np.intp)
+    if not empty.size:
+        return 0, batch_size
+
+    through = _lines_through(geometry.size, geometry.win_length)
+    win_length = geometry.win_length
+    # Every game gets its own random order of the empty squares
+    order = empty[np.argsort(rng.random((batch_size, empty.size)), axis=1)]
+    counts = np.empty((2, batch_size, len(geometry.lines) + 1), dtype=np.int16)
+    for piece in (0, 1):
+        counts[piece, :, :-1] = position.counts[piece]
+        counts[piece, :, -1] = _PAD_START
+
+    winners = np.full(batch_size, -1, dtype=np.int8)
+    active = np.arange(batch_size)
+    to_move = player
+    for step in range(empty.size):
+        rows = active[:, None]
+        lines = through[order[active, step]]
+        own = counts[to_move]
+        own[rows, lines] += 1
+        won = (own[rows, lines] == win_length).any(axis=1)
+        if won.any():
+            winners[active[won]] = to_move
+            active = active[~won]
+            if not active.size:
+                break
+        to_move = 1 - to_move
+
+    wins = int(np.count_nonzero(winners == player))
+    return wins, int(np.count_nonzero(winners < 0))
+
+
+def _child_moves(position: LineBoard, rng: np.random.Generator) -> np.ndarray:
+    """Moves to expand, in random order: plain UCT has no prior, so the budget alone sets the strength"""
+    geometry = position.geometry
+    occupied = position.occupied()
+    candidates = geometry.full_mask & ~occupied
+    if geometry.local_moves and occupied:
+        candidates &= geometry.neighbours(occupied)
+    return rng.permutation(mask_to_moves(candidates))
+
+
+class SearchTree:
+    """Flat, growable arrays of tree nodes; node 0 is the root"""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 1
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.move = np.full(capacity, -1, dtype=np.int16)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.child_count = np.zeros(capacity, dtype=np.int16)
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.visits = np.zeros(capacity, dtype=np.float64)
+        # Total score of the node for the player who made its move
+        self.reward = np.zeros(capacity, dtype=np.float64)
+
+    def _grow(self, needed: int):
+        capacity = len(self.parent)
+        while capacity < needed:
+            capacity *= 2
+        for name, fill in (('parent', -1), ('move', -1), ('first_child', -1), ('child_count', 0),
+                           ('state', 0), ('visits', 0), ('reward', 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def expand(self, node: int, moves):
+        """Add one child per move, contiguously"""
+        start = self.size
+        end = start + len(moves)
+        if end > len(self.parent):
+            self._grow(end)
+        self.parent[start:end] = node
+        self.move[start:end] = moves
+        self.first_child[node] = start
+        self.child_count[node] = len(moves)
+        self.size = end
+
+    def select_child(self, node: int, exploration: float) -> int:
+        """The child with the highest UCT score; unvisited children come first, in order"""
+        start = self.first_child[node]
+        end = start + self.child_count[node]
+        visits = self.visits[start:end]
+        unvisited = np.flatnonzero(visits == 0)
+        if unvisited.size:
+            return start + int(unvisited[0])
+        scores = self.reward[start:end] / visits + exploration * np.sqrt(math.log(self.visits[node]) / visits)
+        return start + int(np.argmax(scores))
+
+    def backpropagate(self, path: np.ndarray, reward: float, playouts: int):
+        """Add ``reward`` (for the mover of the last node) up ``path``, switching sides every ply"""
+        self.visits[path] += playouts
+        leaf_first = path[::-1]
+        self.reward[leaf_first[0::2]] += reward
+        self.reward[leaf_first[1::2]] += playouts - reward
+
+
+def mcts_search(position: LineBoard, player: int, playouts: Optional[int] = None,
+                time_budget: Optional[float] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                exploration: float = DEFAULT_EXPLORATION,
+                rng: Union[None, int, np.random.Generator] = None) -> MCTSResult:
+    """Search ``position`` for ``player`` until ``playouts`` games or ``time_budget`` seconds are used.
+
+    At least one budget is required; with both, whichever runs out first
+    stops the search. ``rng`` is a NumPy generator or a seed for one.
+    ``position`` is left as it was.
+    """
+    if playouts is None and time_budget is None:
+        raise ValueError("mcts_search needs a playout budget, a time budget or both")
+    rng = np.random.default_rng(rng)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+    tree = SearchTree()
+    root_moves = _child_moves(position, rng) if position.winner is None else []
+    if not len(root_moves):
+        return MCTSResult(None, 0, 0, 1, 0.0)
+    tree.expand(0, root_moves)
+    if len(root_moves) == 1:
+        return MCTSResult(int(root_moves[0]), 0, 0, tree.size, 0.0)
+
+    geometry = position.geometry
+    full_mask = geometry.full_mask
+    played = []
+    done = 0
+    iterations = 0
+    while (playouts is None or done < playouts) and (deadline is None or time.perf_counter() < deadline):
+        node = 0
+        path = [0]
+        to_move = player
+        try:
+            # Selection: descend through expanded nodes
+            while tree.first_child[node] >= 0:
+                node = tree.select_child(node, exploration)
+                position.play(int(tree.move[node]), to_move)
+                played.append((int(tree.move[node]), to_move))
+                path.append(node)
+                to_move = 1 - to_move
+                if position.winner is not None:
+                    tree.state[node] = _WON
+                    break
+                if position.occupied() == full_mask:
+                    tree.state[node] = _DRAWN
+                    break
+
+            # Expansion: a leaf seen before gets its children and one is played
+            state = tree.state[node]
+            if state == _OPEN and tree.visits[node] > 0:
+                tree.expand(node, _child_moves(position, rng))
+                node = tree.first_child[node]
+                position.play(int(tree.move[node]), to_move)
+                played.append((int(tree.move[node]), to_move))
+                path.append(node)
+                to_move = 1 - to_move
+
+            # Simulation, scored for the player who moved into the leaf
+            if state == _WON:
+                reward = float(batch_size)
+            elif state == _DRAWN:
+                reward = batch_size / 2
+            else:
+                wins, draws = rollout(position, to_move, batch_size, rng)
+                reward = batch_size - wins - draws + draws / 2
+        finally:
+            while played:
+                position.undo(*played.pop())
+
+        tree.backpropagate(np.array(path, dtype=np.intp), reward, batch_size)
+        done += batch_size
+        iterations += 1
+
+    start = tree.first_child[0]
+    visits = tree.visits[start:start + tree.child_count[0]]
+    best = start + int(np.argmax(visits))
+    value = float(tree.reward[best] / tree.visits[best]) if tree.visits[best] else 0.0
+    return MCTSResult(int(tree.move[best]), done, iterations, tree.size, value)
@@ -0,0 +1,172 @@
+"""Root-splitting parallel search for the N×N engine.
+
+``ParallelSearch`` runs the same iterative deepening as
+``engine.iterative_deepening`` but hands the root moves of every depth to a
+process pool:
+
+- **Own Board per Worker**: A task carries the position as two bitboards and
+  the worker rebuilds its own ``LineBoard`` from them; workers keep their own
+  transposition table for the whole game
+- **Shared Alpha**: The best exact root score found so far at the current
+  depth lives in a ``multiprocessing.Value``; a worker reads it when it starts
+  a root move and raises it when it finds a better one
+- **Young Brothers Wait**: The first root move (the previous depth's best) is
+  searched on its own, so the other moves start with its score as their bound
+  instead of an open window
+- **Deterministic Merge**: Each move is searched with the window
+  ``(alpha - 1, +inf)``, so every move that could be the best or tie it gets an
+  exact score. The winner is the highest score, ties going to the earliest
+  move in root order, which is the move the serial search picks, however the
+  tasks were scheduled
+
+A depth that is not finished within the time budget is discarded, as in the
+serial search.
+"""
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from multiprocessing import Value
+from typing import Dict, List, Optional, Tuple
+
+from bitboard import mask_to_moves
+from engine import (WIN_SCORE, LineBoard, SearchResult, SearchTimeout, TTEntry, get_geometry,
+                    make_negamax, search_depth_limit)
+
+NO_BOUND = -WIN_SCORE - 1
+
+# Per-process worker state: the shared alpha and one transposition table
+_shared_alpha = None
+_table_key: Optional[Tuple[int, int, int]] = None
+_table: Dict[int, TTEntry] = {}
+
+
+def _init_worker(shared_alpha):
+    global _shared_alpha
+    _shared_alpha = shared_alpha
+
+
+def _worker_table(key: Tuple[int, int, int]) -> Dict[int, TTEntry]:
+    """The table for this board variant and game; a new game starts an empty one"""
+    global _table_key, _table
+    if key != _table_key:
+        _table_key = key
+        _table = {}
+    return _table
+
+
+def _search_root_move(size: int, win_length: int, game: int, bits: Tuple[int, int], player: int,
+                      move: int, depth: int, time_left: float) -> Tuple[int, bool, int]:
+    """Search one root move to ``depth`` in a worker.
+
+    Returns ``(score, exact, nodes)``; ``exact`` is False when the move failed
+    low against the shared alpha, in which case ``score`` is only an upper bound.
+    """
+    deadline = time.perf_counter() + time_left
+    if time_left <= 0:
+        raise SearchTimeout
+
+    position = LineBoard(get_geometry(size, win_length))
+    for piece, piece_bits in enumerate(bits):
+        for cell in mask_to_moves(piece_bits):
+            position.play(cell, piece)
+    negamax, nodes = make_negamax(position, _worker_table((size, win_length, game)), deadline)
+
+    alpha = _shared_alpha.value
+    # One below the bound, so a move that only ties it still gets an exact score
+    floor = alpha - 1 if alpha > NO_BOUND else NO_BOUND
+    position.play(move, player)
+    score = -negamax(1 - player, depth - 1, 1, NO_BOUND, -floor)
+    exact = score > floor
+    if exact:
+        with _shared_alpha.get_lock():
+            if score > _shared_alpha.value:
+                _shared_alpha.value = score
+    return score, exact, nodes()
+
+
+class ParallelSearch:
+    """Iterative deepening with the root moves split across ``workers`` processes"""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.shared_alpha = Value('q', NO_BOUND)
+        self.game = 0
+        # The current depth's tasks, cancelled if the search is abandoned midway
+        self._futures: List[Future] = []
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(self.shared_alpha,))
+
+    def new_game(self):
+        """Forget the workers' transposition tables (they are only valid for one game)"""
+        self.game += 1
+
+    def close(self):
+        # shutdown(cancel_futures=True) needs Python 3.9; queued tasks are cancelled by hand
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+        self.pool.shutdown()
+
+    def __enter__(self) -> 'ParallelSearch':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _search_depth(self, position: LineBoard, player: int, root_moves: List[int], depth: int,
+                      deadline: float) -> Tuple[Optional[Tuple[int, int]], int]:
+        """Search every root move to ``depth``; returns ``((score, move) or None on timeout, nodes)``"""
+        geometry = position.geometry
+        task = (geometry.size, geometry.win_length, self.game, tuple(position.bits), player)
+        self.shared_alpha.value = NO_BOUND
+
+        def submit(move: int):
+            return self.pool.submit(_search_root_move, *task, move, depth, deadline - time.time())
+
+        futures = self._futures = [submit(root_moves[0])]
+        wait(futures)
+        if futures[0].exception() is None:
+            futures += [submit(move) for move in root_moves[1:]]
+        # Every task gives up at the deadline on its own, so none outlives this depth
+        wait(futures)
+
+        nodes = 0
+        timed_out = False
+        best: Optional[Tuple[int, int]] = None
+        for index, future in enumerate(futures):
+            error = future.exception()
+            if isinstance(error, SearchTimeout):
+                timed_out = True
+                continue
+            if error is not None:
+                raise error
+            score, exact, task_nodes = future.result()
+            nodes += task_nodes
+            # Strictly greater: ties keep the earlier move in root order
+            if exact and (best is None or score > best[0]):
+                best = (score, root_moves[index])
+        return (None if timed_out else best), nodes
+
+    def search(self, position: LineBoard, player: int, time_budget: float,
+               max_depth: Optional[int] = None) -> SearchResult:
+        """Search ``position`` for ``player`` like ``iterative_deepening``, in parallel"""
+        deadline = time.time() + time_budget
+        depth_limit = search_depth_limit(position, max_depth)
+        root_moves = position.candidate_moves(player)
+        result = SearchResult(root_moves[0] if root_moves else None, 0, 0, 0)
+        nodes = 0
+
+        for depth in range(1, depth_limit + 1):
+            best, depth_nodes = self._search_depth(position, player, root_moves, depth, deadline)
+            nodes += depth_nodes
+            if best is None:
+                break
+            best_score, best_move = best
+            result = SearchResult(best_move, best_score, depth, nodes)
+            # Search the previous best move first at the next depth
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+            if abs(best_score) >= WIN_SCORE - depth_limit:
+                break
+
+        return result._replace(nodes=nodes)
@@ -0,0 +1,121 @@
+"""Terminal rendering for the game without shelling out to ``clear``.
+
+``os.system('clear')`` starts a shell for every frame and the board was then
+re-printed line by line. ``BoardRenderer`` keeps the last frame instead:
+
+- **Incremental Frames**: On a terminal, only the squares that changed since
+  the last frame are redrawn, by moving the cursor to them with ANSI escape
+  codes; the text under the board (prompts, messages) is cleared in the same
+  write. A full frame is drawn for a new game, when the board would not fit
+  on the screen (in height or width) and after the game printed more lines
+  under the board than the space kept for prompts
+- **Cached Cells**: The colored ``X``/``O`` strings are built once
+- **One Write per Frame**: Every frame is assembled in memory and written and
+  flushed in a single call
+- **Move Log**: When the output is not a terminal (a pipe, a file, a test
+  harness), no escape codes are written; each frame prints only the moves
+  played since the previous one, one ``X 4`` line per move
+"""
+import shutil
+import sys
+from typing import List, Optional, Sequence, TextIO
+
+from colorama import Fore, Style
+
+CLEAR_SCREEN = '\x1b[H\x1b[2J'
+CLEAR_BELOW = '\x1b[J'
+
+CELL_TEXT = {
+    'X': f"{Fore.GREEN}X{Style.RESET_ALL}",
+    'O': f"{Fore.RED}O{Style.RESET_ALL}",
+    ' ': ' ',
+}
+
+# Lines above the board (two blank lines) and the space kept free below it for prompts
+TOP_MARGIN = 2
+PROMPT_LINES = 6
+
+
+def is_terminal(stream: TextIO) -> bool:
+    isatty = getattr(stream, 'isatty', None)
+    return bool(isatty and isatty())
+
+
+def clear_screen(stream: Optional[TextIO] = None):
+    """Clear the terminal with one escape sequence; nothing is written to a pipe or file"""
+    stream = stream or sys.stdout
+    if is_terminal(stream):
+        stream.write(CLEAR_SCREEN)
+        stream.flush()
+
+
+class BoardRenderer:
+    """Draw a ``size`` × ``size`` board, redrawing only what changed since the last frame"""
+
+    def __init__(self, size: int, stream: Optional[TextIO] = None):
+        self.size = size
+        self._stream = stream
+        self.last: Optional[List[str]] = None
+        self.writes = 0
+
+    @property
+    def stream(self) -> TextIO:
+        # Looked up on every frame so a replaced or wrapped sys.stdout is honoured
+        return self._stream or sys.stdout
+
+    def invalidate(self):
+        """Forget the last frame; the next one is drawn in full (use after anything else drew the screen)"""
+        self.last = None
+
+    def _write(self, text: str):
+        stream = self.stream
+        stream.write(text)
+        stream.flush()
+        self.writes += 1
+
+    def full_frame(self, board: Sequence[str]) -> str:
+        size = self.size
+        separator = '|'.join(['_____'] * size)
+        lines = [CLEAR_SCREEN + '\n' * TOP_MARGIN]
+        for row in range(size):
+            if row:
+                lines.append(separator + '\n')
+            cells = board[row * size:(row + 1) * size]
+            lines.append("  " + "  |  ".join(CELL_TEXT[cell] for cell in cells) + '\n')
+        lines.append('\n')
+        return ''.join(lines)
+
+    def _fits(self) -> bool:
+        """Cursor addressing needs the whole board and the prompts under it on screen, without wrapping"""
+        terminal = shutil.get_terminal_size()
+        height = TOP_MARGIN + 2 * self.size + PROMPT_LINES
+        # The widest line is the row separator, 6 * size - 1 characters
+        return height <= terminal.lines and 6 * self.size <= terminal.columns
+
+    def incremental_frame(self, board: Sequence[str]) -> str:
+        size = self.size
+        parts = []
+        for cell, (old, new) in enumerate(zip(self.last, board)):
+            if old != new:
+                row, col = divmod(cell, size)
+                # 1-based screen position of the cell's character (see full_frame)
+                parts.append(f"\x1b[{TOP_MARGIN + 1 + 2 * row};{3 + 6 * col}H{CELL_TEXT[new]}")
+        # Park the cursor under the board and clear the old prompts
+        parts.append(f"\x1b[{TOP_MARGIN + 2 * size + 1};1H{CLEAR_BELOW}")
+        return ''.join(parts)
+
+    def move_log(self, board: Sequence[str]) -> str:
+        last = self.last or [' '] * len(board)
+        return ''.join(f"{new} {cell}\n" for cell, (old, new) in enumerate(zip(last, board)) if old != new)
+
+    def draw(self, board: Sequence[str]):
+        """Render ``board`` (one ``'X'``, ``'O'`` or ``' '`` per square) in a single write"""
+        if not is_terminal(self.stream):
+            text = self.move_log(board)
+        elif self.last is None or len(self.last) != len(board) or not self._fits():
+            text = self.full_frame(board)
+        else:
+            text = self.incremental_frame(board)
+        if text:
+            self._write(text)
+        self.last = list(board)
@@ -0,0 +1,251 @@
+"""Headless self-play simulator for the 3x3 game.
+
+Plays games between pluggable agents without any terminal I/O or thinking
+delay, spreads them over a process pool and returns aggregated results and
+the distribution of game lengths.
+
+An agent is a callable ``agent(mover_bits, opponent_bits, rng) -> square``
+built by a zero-argument factory registered in ``AGENTS``. Factories run once
+per worker process, so agents backed by the solved table all read the same
+memory-mapped file (shared read-only through the page cache).
+
+Usage::
+
+    python simulate.py hard random --games 1000000 --workers 8
+    python simulate.py medium medium --games 100000 --json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bitboard import FULL_BOARD, WIN_TABLE, mask_to_moves
+from engine import X, LineBoard, get_geometry
+from solved_table import load_solved_table
+
+Agent = Callable[[int, int, random.Random], int]
+
+BLUNDER_RATE = 0.3
+BLUNDER_CANDIDATES = 5
+
+
+def make_random_agent() -> Agent:
+    """Uniformly random legal moves (EASY)"""
+    def agent(mover_bits: int, opponent_bits: int, rng: random.Random) -> int:
+        return rng.choice(mask_to_moves(FULL_BOARD & ~(mover_bits | opponent_bits)))
+    return agent
+
+
+def make_hard_agent() -> Agent:
+    """Perfect play from the solved table (HARD)"""
+    table = load_solved_table()
+    if table is None:
+        raise RuntimeError("Solved-position table is unavailable")
+
+    def agent(mover_bits: int, opponent_bits: int, rng: random.Random) -> int:
+        return table.best_move(mover_bits, opponent_bits)
+    return agent
+
+
+def make_mcts_agent(playouts: Optional[int] = None) -> Agent:
+    """Monte Carlo tree search with a fixed playout budget (``STRONG_PLAYOUTS`` by default; needs NumPy)"""
+    from mcts import STRONG_PLAYOUTS, mcts_search
+    playouts = playouts or STRONG_PLAYOUTS
+    geometry = get_geometry(3, 3)
+
+    def agent(mover_bits: int, opponent_bits: int, rng: random.Random) -> int:
+        # The search only cares whose turn it is, so the mover always plays X here
+        position = LineBoard(geometry)
+        for player, bits in enumerate((mover_bits, opponent_bits)):
+            for cell in mask_to_moves(bits):
+                position.play(cell, player)
+        return mcts_search(position, X, playouts, rng=rng.getrandbits(64)).move
+    return agent
+
+
+def make_medium_agent() -> Agent:
+    """MEDIUM: Monte Carlo tree search with a small playout budget"""
+    from mcts import MEDIUM_PLAYOUTS
+    return make_mcts_agent(MEDIUM_PLAYOUTS)
+
+
+def make_blunder_agent() -> Agent:
+    """The old MEDIUM: a random move 30% of the time, else the best of the first 5 empty squares"""
+    table = load_solved_table()
+    if table is None:
+        raise RuntimeError("Solved-position table is unavailable")
+
+    def agent(mover_bits: int, opponent_bits: int, rng: random.Random) -> int:
+        moves = mask_to_moves(FULL_BOARD & ~(mover_bits | opponent_bits))
+        if rng.random() < BLUNDER_RATE:
+            return rng.choice(moves)
+        best_move = moves[0]
+        best_score = None
+        for move in moves[:BLUNDER_CANDIDATES]:
+            score = table.score_after(mover_bits, opponent_bits, move)
+            if best_score is None or score > best_score:
+                best_score = score
+                best_move = move
+        return best_move
+    return agent
+
+
+AGENTS: Dict[str, Callable[[], Agent]] = {
+    'random': make_random_agent,
+    'easy': make_random_agent,
+    'medium': make_medium_agent,
+    'hard': make_hard_agent,
+    'mcts': make_mcts_agent,
+    'blunder': make_blunder_agent,
+}
+
+
+def register_agent(name: str, factory: Callable[[], Agent]):
+    """Make a new agent available to ``simulate`` and the CLI"""
+    AGENTS[name] = factory
+
+
+@dataclass
+class SimulationResult:
+    games: int = 0
+    x_wins: int = 0
+    o_wins: int = 0
+    draws: int = 0
+    move_lengths: Counter = field(default_factory=Counter)
+    elapsed: float = 0.0
+
+    def merge(self, other: 'SimulationResult'):
+        self.games += other.games
+        self.x_wins += other.x_wins
+        self.o_wins += other.o_wins
+        self.draws += other.draws
+        self.move_lengths.update(other.move_lengths)
+
+    def to_dict(self):
+        return {
+            'games': self.games,
+            'x_wins': self.x_wins,
+            'o_wins': self.o_wins,
+            'draws': self.draws,
+            'average_moves': sum(n * c for n, c in self.move_lengths.items()) / max(1, self.games),
+            'move_lengths': {str(n): self.move_lengths[n] for n in sorted(self.move_lengths)},
+            'elapsed': self.elapsed,
+            'games_per_second': self.games / self.elapsed if self.elapsed else 0.0
+        }
+
+
+def play_game(agent_x: Agent, agent_o: Agent, rng: random.Random) -> Tuple[Optional[str], int]:
+    """Play one game with X moving first; returns (winner or None, number of moves)"""
+    bits = [0, 0]
+    agents = (agent_x, agent_o)
+    player = 0
+    moves = 0
+    while True:
+        mover = bits[player]
+        opponent = bits[1 - player]
+        mover |= 1 << agents[player](mover, opponent, rng)
+        bits[player] = mover
+        moves += 1
+        if WIN_TABLE[mover]:
+            return 'XO'[player], moves
+        if (mover | opponent) == FULL_BOARD:
+            return None, moves
+        player = 1 - player
+
+
+def run_games(agent_x_name: str, agent_o_name: str, games: int, seed: int) -> SimulationResult:
+    """Play a chunk of games in the current process"""
+    agent_x = AGENTS[agent_x_name]()
+    agent_o = AGENTS[agent_o_name]()
+    rng = random.Random(seed)
+    result = SimulationResult()
+    start = time.perf_counter()
+    for _ in range(games):
+        winner, moves = play_game(agent_x, agent_o, rng)
+        if winner == 'X':
+            result.x_wins += 1
+        elif winner == 'O':
+            result.o_wins += 1
+        else:
+            result.draws += 1
+        result.move_lengths[moves] += 1
+    result.games = games
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _run_chunk(args: Tuple[str, str, int, int]) -> SimulationResult:
+    return run_games(*args)
+
+
+def simulate(agent_x: str, agent_o: str, games: int, workers: Optional[int] = None,
+             chunk_size: int = 20000, seed: int = 0) -> SimulationResult:
+    """Play ``games`` games between two registered agents across a process pool.
+
+    Games are split into fixed-size chunks, each seeded from ``seed`` and its
+    index, so results are reproducible regardless of the number of workers.
+    """
+    for name in (agent_x, agent_o):
+        if name not in AGENTS:
+            raise ValueError(f"Unknown agent '{name}' (choose from {', '.join(sorted(AGENTS))})")
+
+    # Build the table before forking so workers map the same file
+    load_solved_table()
+
+    chunks: List[Tuple[str, str, int, int]] = []
+    for index, start in enumerate(range(0, games, chunk_size)):
+        chunks.append((agent_x, agent_o, min(chunk_size, games - start), seed * 1_000_003 + index))
+
+    total = SimulationResult()
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            total.merge(_run_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(_run_chunk, chunks):
+                total.merge(result)
+    total.elapsed = time.perf_counter() - start
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Headless Tic-Tac-Toe self-play simulator")
+    parser.add_argument('agent_x', help="agent playing X (moves first)")
+    parser.add_argument('agent_o', help="agent playing O")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        result = simulate(args.agent_x, args.agent_o, args.games, args.workers, args.chunk_size, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = result.to_dict()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    print(f"{args.agent_x} (X) vs {args.agent_o} (O): {result.games} games in {result.elapsed:.2f}s "
+          f"({summary['games_per_second']:.0f} games/s)")
+    for label, count in (('X wins', result.x_wins), ('O wins', result.o_wins), ('Draws', result.draws)):
+        print(f"  {label:<8} {count:>10}  {count / max(1, result.games) * 100:5.1f}%")
+    print(f"  Average moves {summary['average_moves']:.2f}")
+    for moves, count in summary['move_lengths'].items():
+        print(f"    {moves} moves: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
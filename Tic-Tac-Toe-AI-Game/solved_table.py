@@ -0,0 +1,217 @@
+"""Precomputed perfect-play table for 3x3 Tic-Tac-Toe.
+
+Every legal, non-terminal position is stored once in canonical form (the
+smallest packed key over the 8 rotations/reflections of the board), together
+with the best move and its score for the player to move. The table is written
+to a small binary file and memory-mapped, so a cold process gets perfect-play
+moves without running any search.
+
+File layout (little-endian)::
+
+    magic  b'TTTS'  | version u16 | reserved u16 | count u32
+    keys   count x u32   sorted canonical keys (mover_bits | opponent_bits << 9)
+    moves  count x u8    best move, in the canonical frame
+    scores count x i8    score for the mover (wins > 0, losses < 0, draw 0)
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from bitboard import FULL_BOARD, WIN_TABLE
+
+MAGIC = b'TTTS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+TABLE_FILE = Path(__file__).with_name('solved_positions.bin')
+
+WIN_SCORE = 10
+
+# The 8 board symmetries as square permutations: square ``i`` maps to ``perm[i]``.
+_ROTATE = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+_MIRROR = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+
+
+def _compose(first: Tuple[int, ...], second: Tuple[int, ...]) -> Tuple[int, ...]:
+    return tuple(second[first[i]] for i in range(9))
+
+
+def _build_symmetries() -> List[Tuple[int, ...]]:
+    perms = []
+    perm = tuple(range(9))
+    for _ in range(4):
+        perms.append(perm)
+        perms.append(_compose(perm, _MIRROR))
+        perm = _compose(perm, _ROTATE)
+    return perms
+
+
+SYMMETRIES = _build_symmetries()
+INVERSE_SYMMETRIES = [tuple(perm.index(i) for i in range(9)) for perm in SYMMETRIES]
+
+# BIT_MAPS[t][bits] is the bitboard ``bits`` transformed by symmetry ``t``.
+BIT_MAPS = [
+    array('H', (sum(1 << perm[i] for i in range(9) if bits >> i & 1) for bits in range(FULL_BOARD + 1)))
+    for perm in SYMMETRIES
+]
+
+
+def canonicalize(mover_bits: int, opponent_bits: int) -> Tuple[int, int]:
+    """Return the canonical packed key and the symmetry index that produced it"""
+    best_key = -1
+    best_sym = 0
+    for sym, bit_map in enumerate(BIT_MAPS):
+        key = bit_map[mover_bits] | bit_map[opponent_bits] << 9
+        if best_key < 0 or key < best_key:
+            best_key = key
+            best_sym = sym
+    return best_key, best_sym
+
+
+def solve() -> Dict[int, Tuple[int, int]]:
+    """Solve every legal non-terminal position, keyed by canonical key.
+
+    Scores are from the mover's point of view: a win in ``n`` more plies scores
+    ``WIN_SCORE - n`` and a loss scores the negation, so faster wins and slower
+    losses are preferred.
+    """
+    values: Dict[int, int] = {}
+    entries: Dict[int, Tuple[int, int]] = {}
+
+    def negamax(mover: int, opponent: int) -> int:
+        key = mover | opponent << 9
+        if key in values:
+            return values[key]
+        if WIN_TABLE[opponent]:
+            values[key] = -WIN_SCORE
+            return -WIN_SCORE
+        empty = FULL_BOARD & ~(mover | opponent)
+        if not empty:
+            values[key] = 0
+            return 0
+
+        best_score = -WIN_SCORE - 1
+        best_move = -1
+        while empty:
+            move_bit = empty & -empty
+            empty ^= move_bit
+            child = negamax(opponent, mover | move_bit)
+            score = -child + 1 if child > 0 else -child - 1 if child < 0 else 0
+            if score > best_score:
+                best_score = score
+                best_move = move_bit.bit_length() - 1
+
+        values[key] = best_score
+        canonical_key, sym = canonicalize(mover, opponent)
+        if canonical_key not in entries:
+            entries[canonical_key] = (SYMMETRIES[sym][best_move], best_score)
+        return best_score
+
+    # From the empty board the mover has either as many pieces as the opponent
+    # or one fewer, which covers the AI moving first as well as second.
+    negamax(0, 0)
+    return entries
+
+
+def build_table(path: Path = TABLE_FILE) -> Path:
+    """Solve the game and write the binary table atomically"""
+    entries = solve()
+    keys = sorted(entries)
+    key_array = array('I', keys)
+    score_array = array('b', (entries[k][1] for k in keys))
+    if sys.byteorder != 'little':
+        key_array.byteswap()
+
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(keys)))
+        f.write(key_array.tobytes())
+        f.write(bytes(entries[k][0] for k in keys))
+        f.write(score_array.tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+
+class SolvedTable:
+    """Read-only, memory-mapped view of the solved-position file"""
+
+    def __init__(self, path: Path = TABLE_FILE):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, count = HEADER.unpack_from(self._mmap, 0)
+        expected_size = HEADER.size + count * 6
+        if magic != MAGIC or version != VERSION or len(self._mmap) != expected_size:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a valid solved-position table")
+
+        view = memoryview(self._mmap)
+        keys_start = HEADER.size
+        moves_start = keys_start + count * 4
+        scores_start = moves_start + count
+        if sys.byteorder == 'little':
+            self._keys = view[keys_start:moves_start].cast('I')
+        else:
+            self._keys = array('I', view[keys_start:moves_start])
+            self._keys.byteswap()
+        self._moves = view[moves_start:scores_start]
+        self._scores = view[scores_start:].cast('b')
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, mover_bits: int, opponent_bits: int) -> Optional[Tuple[int, int]]:
+        """Return ``(best_move, score)`` for the player to move, or None if unknown"""
+        key, sym = canonicalize(mover_bits, opponent_bits)
+        index = bisect_left(self._keys, key)
+        if index == self.count or self._keys[index] != key:
+            return None
+        return INVERSE_SYMMETRIES[sym][self._moves[index]], self._scores[index]
+
+    def best_move(self, mover_bits: int, opponent_bits: int) -> Optional[int]:
+        """Return the perfect-play move for the player to move"""
+        entry = self.lookup(mover_bits, opponent_bits)
+        return entry[0] if entry is not None else None
+
+    def score_after(self, mover_bits: int, opponent_bits: int, square: int) -> Optional[int]:
+        """Return the mover's score for playing ``square``, or None if unknown"""
+        after = mover_bits | 1 << square
+        if WIN_TABLE[after]:
+            return WIN_SCORE - 1
+        if (after | opponent_bits) == FULL_BOARD:
+            return 0
+        entry = self.lookup(opponent_bits, after)
+        if entry is None:
+            return None
+        child = entry[1]
+        return -child + 1 if child > 0 else -child - 1 if child < 0 else 0
+
+
+_loaded_table: Optional[SolvedTable] = None
+
+
+def load_solved_table(path: Path = TABLE_FILE) -> Optional[SolvedTable]:
+    """Memory-map the solved table once per process, building it if missing"""
+    global _loaded_table
+    if _loaded_table is not None and _loaded_table.path == Path(path):
+        return _loaded_table
+    try:
+        try:
+            _loaded_table = SolvedTable(path)
+        except (FileNotFoundError, ValueError):
+            build_table(Path(path))
+            _loaded_table = SolvedTable(path)
+    except OSError:
+        return None
+    return _loaded_table
+
+
+if __name__ == "__main__":
+    built = build_table()
+    print(f"Wrote {len(SolvedTable(built))} canonical positions to {built}")
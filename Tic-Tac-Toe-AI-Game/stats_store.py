@@ -0,0 +1,246 @@
+"""Append-only game statistics store.
+
+Each finished game appends one fixed-size binary record, and the running
+totals live in a small header that is rewritten in place, so recording a game
+costs O(1) regardless of history size. Reading the totals only touches the
+header; the history is streamed from disk on demand.
+
+Writers take an exclusive file lock around "append record, update header", so
+several game processes can share one file without losing counts. The record
+is written before the header: if a writer dies in between, the next writer
+sees the mismatch and recomputes the header from the records.
+
+File layout (little-endian)::
+
+    header  magic b'TTTG' | version u16 | record size u16
+            total_games u64 | human_wins u64 | ai_wins u64 | draws u64 | total_moves u64
+    record  timestamp f64 | result u8 | moves u8 | difficulty u8 | first_mover u8
+            board size u8 | win length u8 | 2 pad bytes
+"""
+import os
+import pickle
+import struct
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b'TTTG'
+VERSION = 1
+HEADER = struct.Struct('<4sHH5Q')
+RECORD = struct.Struct('<d6Bxx')
+
+RESULTS = ('human', 'ai', 'draw')
+FIRST_MOVERS = ('unknown', 'human', 'ai')
+DIFFICULTIES = {1: 'EASY', 2: 'MEDIUM', 3: 'HARD'}
+
+READ_CHUNK_RECORDS = 4096
+
+
+class GameRecord(NamedTuple):
+    timestamp: float
+    result: str
+    moves: int
+    difficulty: str
+    first_mover: str
+    size: int
+    win_length: int
+
+    def to_dict(self):
+        return {
+            'result': self.result,
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat(),
+            'moves': self.moves,
+            'difficulty': self.difficulty,
+            'first_mover': self.first_mover,
+            'size': self.size,
+            'win_length': self.win_length
+        }
+
+
+class StatsSummary(NamedTuple):
+    total_games: int = 0
+    human_wins: int = 0
+    ai_wins: int = 0
+    draws: int = 0
+    total_moves: int = 0
+
+    @property
+    def average_moves(self) -> float:
+        return self.total_moves / self.total_games if self.total_games else 0.0
+
+    def add(self, result: str, moves: int) -> 'StatsSummary':
+        """The totals with one more game counted"""
+        totals = list(self)
+        totals[0] += 1
+        totals[1 + RESULTS.index(result)] += 1
+        totals[4] += moves
+        return StatsSummary(*totals)
+
+
+@contextmanager
+def _locked(f, exclusive: bool):
+    """Hold an advisory lock on an open file for the duration of the block"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class StatsStore:
+    """Append-only statistics file with O(1) updates of the running totals"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return os.fdopen(fd, 'r+b')
+
+    def _read_header(self, f) -> Optional[StatsSummary]:
+        f.seek(0)
+        data = f.read(HEADER.size)
+        if len(data) < HEADER.size:
+            return None
+        magic, version, record_size, *totals = HEADER.unpack(data)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{self.path} is not a game statistics file")
+        return StatsSummary(*totals)
+
+    def _write_header(self, f, summary: StatsSummary):
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, *summary))
+
+    def _checked_header(self, f) -> StatsSummary:
+        """Read the header, repairing it if a previous writer was interrupted"""
+        summary = self._read_header(f)
+        if summary is None:
+            summary = StatsSummary()
+            self._write_header(f, summary)
+            f.truncate(HEADER.size)
+            return summary
+
+        size = f.seek(0, os.SEEK_END)
+        record_count = (size - HEADER.size) // RECORD.size
+        complete_size = HEADER.size + record_count * RECORD.size
+        if size != complete_size:
+            f.truncate(complete_size)
+        if record_count != summary.total_games:
+            summary = self._recount(f)
+            self._write_header(f, summary)
+        return summary
+
+    def _recount(self, f) -> StatsSummary:
+        totals = [0, 0, 0, 0, 0]
+        for record in self._iter_records(f):
+            totals[0] += 1
+            totals[1 + RESULTS.index(record.result)] += 1
+            totals[4] += record.moves
+        return StatsSummary(*totals)
+
+    def append(self, result: str, moves: int, difficulty: int, first_mover: str = 'unknown',
+               size: int = 3, win_length: int = 3, timestamp: Optional[float] = None) -> StatsSummary:
+        """Append one game and return the updated totals"""
+        if timestamp is None:
+            timestamp = datetime.now().timestamp()
+        result_code = RESULTS.index(result)
+        record = RECORD.pack(timestamp, result_code, min(moves, 255), difficulty,
+                             FIRST_MOVERS.index(first_mover), size, win_length)
+
+        with self._open() as f, _locked(f, exclusive=True):
+            summary = self._checked_header(f)
+            f.seek(0, os.SEEK_END)
+            f.write(record)
+            f.flush()
+            summary = summary.add(result, moves)
+            self._write_header(f, summary)
+            f.flush()
+        return summary
+
+    def summary(self) -> StatsSummary:
+        """Read only the running totals"""
+        if not self.path.exists():
+            return StatsSummary()
+        with open(self.path, 'rb') as f, _locked(f, exclusive=False):
+            return self._read_header(f) or StatsSummary()
+
+    def _iter_records(self, f) -> Iterator[GameRecord]:
+        f.seek(HEADER.size)
+        while True:
+            chunk = f.read(RECORD.size * READ_CHUNK_RECORDS)
+            usable = len(chunk) - len(chunk) % RECORD.size
+            for timestamp, result, moves, difficulty, first_mover, size, win_length \
+                    in RECORD.iter_unpack(chunk[:usable]):
+                yield GameRecord(timestamp, RESULTS[result], moves, DIFFICULTIES.get(difficulty, 'UNKNOWN'),
+                                 FIRST_MOVERS[first_mover], size, win_length)
+            if len(chunk) < RECORD.size * READ_CHUNK_RECORDS:
+                return
+
+    def iter_games(self) -> Iterator[GameRecord]:
+        """Stream the game history from disk"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            yield from self._iter_records(f)
+
+    def migrate_pickle(self, pickle_path: Path) -> int:
+        """Create the store from a legacy ``game_stats.pkl``; returns the number of games imported.
+
+        The history is imported into a temporary file that is linked into
+        place only once the import succeeded, so a pickle that fails to load
+        leaves no store behind and the next launch tries again. Linking fails
+        if another process created the store first, so concurrent first
+        launches do not import the history twice.
+        """
+        if self.path.exists():
+            return 0
+        with open(pickle_path, 'rb') as f:
+            legacy = _LegacyUnpickler(f).load()
+        games = getattr(legacy, 'games_played', None) or []
+        difficulties = {name: value for value, name in DIFFICULTIES.items()}
+
+        scratch = StatsStore(self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp"))
+        try:
+            for game in games:
+                scratch.append(game['result'], game['moves'], difficulties.get(game.get('difficulty'), 0),
+                               timestamp=datetime.fromisoformat(game['timestamp']).timestamp())
+            # Writes the header when there were no games, so an empty history is migrated too
+            with scratch._open() as f, _locked(f, exclusive=True):
+                scratch._checked_header(f)
+            try:
+                os.link(scratch.path, self.path)
+            except FileExistsError:
+                return 0
+        finally:
+            try:
+                scratch.path.unlink()
+            except FileNotFoundError:
+                pass
+        return len(games)
+
+
+class _LegacyGameStats:
+    """Stand-in for the GameStats class pickled from ``__main__`` by older versions"""
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if name == 'GameStats':
+            return _LegacyGameStats
+        return super().find_class(module, name)
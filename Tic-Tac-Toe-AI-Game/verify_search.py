@@ -0,0 +1,171 @@
+"""Check TicTacToe.minimax against plain full minimax on every reachable position.
+
+The transposition table stores bounds, so it is only correct if cut-off values
+are never reused as exact values. This harness compares the cached search with
+an exhaustive minimax (no pruning, no table) three ways:
+
+1. full window, fresh table for every position
+2. full window, one table shared across all positions in random order
+3. random alpha/beta windows on the shared table, checking the fail-soft
+   contract (``v <= alpha`` means the true value is at most ``v``, ``v >= beta``
+   means it is at least ``v``, anything in between must be exact)
+
+It also checks that the N×N engine's table returns a stored score correctly
+when it is probed at another ply: heuristic scores unchanged, win and loss
+scores shifted by the difference in ply.
+
+Run with ``python verify_search.py``; exits non-zero on any mismatch.
+"""
+import importlib.util
+import random
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Tuple
+
+from bitboard import FULL_BOARD, WIN_TABLE
+from engine import (MATE_BOUND, WIN_SCORE, Bound, LineBoard, TTEntry, O, X, get_geometry, make_negamax,
+                    score_to_table)
+
+GAME_FILE = Path(__file__).with_name('Tic-Tac-Toe.py')
+
+
+def load_game_module():
+    """Import Tic-Tac-Toe.py, whose file name is not a valid module name"""
+    spec = importlib.util.spec_from_file_location('tic_tac_toe', GAME_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@lru_cache(maxsize=None)
+def plain_minimax(ai_bits: int, human_bits: int, depth: int, is_maximizing: bool) -> int:
+    """Exhaustive minimax with the same scoring as TicTacToe.minimax"""
+    if WIN_TABLE[ai_bits]:
+        return 10 - depth
+    if WIN_TABLE[human_bits]:
+        return depth - 10
+    empty = FULL_BOARD & ~(ai_bits | human_bits)
+    if not empty:
+        return 0
+
+    scores = []
+    for square in range(9):
+        if empty >> square & 1:
+            if is_maximizing:
+                scores.append(plain_minimax(ai_bits | 1 << square, human_bits, depth + 1, False))
+            else:
+                scores.append(plain_minimax(ai_bits, human_bits | 1 << square, depth + 1, True))
+    return max(scores) if is_maximizing else min(scores)
+
+
+def reachable_positions() -> Iterator[Tuple[int, int, bool]]:
+    """Yield ``(ai_bits, human_bits, ai_to_move)`` for every reachable non-terminal position"""
+    seen = set()
+    stack = [(0, 0, True), (0, 0, False)]
+    while stack:
+        ai_bits, human_bits, ai_to_move = stack.pop()
+        if (ai_bits, human_bits, ai_to_move) in seen:
+            continue
+        seen.add((ai_bits, human_bits, ai_to_move))
+        if WIN_TABLE[ai_bits] or WIN_TABLE[human_bits] or (ai_bits | human_bits) == FULL_BOARD:
+            continue
+        yield ai_bits, human_bits, ai_to_move
+        for square in range(9):
+            if not (ai_bits | human_bits) >> square & 1:
+                if ai_to_move:
+                    stack.append((ai_bits | 1 << square, human_bits, False))
+                else:
+                    stack.append((ai_bits, human_bits | 1 << square, True))
+
+
+def verify(seed: int = 0, window_trials: int = 4) -> int:
+    """Run all checks and return the number of mismatches"""
+    game_module = load_game_module()
+    # No stats file: verifying must not create or migrate game_stats.bin
+    game = game_module.TicTacToe(stats_file=None)
+    rng = random.Random(seed)
+    positions = list(reachable_positions())
+    failures = 0
+
+    def report(check, position, got, expected):
+        nonlocal failures
+        failures += 1
+        if failures <= 10:
+            print(f"[{check}] ai={position[0]:09b} human={position[1]:09b} "
+                  f"ai_to_move={position[2]}: got {got}, expected {expected}")
+
+    for position in positions:
+        game.transposition_table = {}
+        got = game.minimax(position[0], position[1], 0, position[2])
+        expected = plain_minimax(position[0], position[1], 0, position[2])
+        if got != expected:
+            report('fresh table', position, got, expected)
+
+    game.transposition_table = {}
+    shuffled = positions[:]
+    rng.shuffle(shuffled)
+    for position in shuffled:
+        got = game.minimax(position[0], position[1], 0, position[2])
+        expected = plain_minimax(position[0], position[1], 0, position[2])
+        if got != expected:
+            report('shared table', position, got, expected)
+
+    game.transposition_table = {}
+    for _ in range(window_trials):
+        rng.shuffle(shuffled)
+        for position in shuffled:
+            alpha, beta = sorted(rng.sample(range(-11, 12), 2))
+            got = game.minimax(position[0], position[1], 0, position[2], alpha, beta)
+            expected = plain_minimax(position[0], position[1], 0, position[2])
+            if (got <= alpha and expected > got) or (got >= beta and expected < got) or \
+                    (alpha < got < beta and got != expected):
+                report(f'window ({alpha}, {beta})', position, got, expected)
+
+    print(f"Checked {len(positions)} positions: {failures} mismatches")
+    return failures
+
+
+def verify_table_scores() -> int:
+    """Store scores in the engine's table at one ply, probe them at another; returns the mismatches"""
+    failures = 0
+    checked = 0
+    for stored_ply, probe_ply in ((3, 6), (1, 4), (6, 2)):
+        for score in (1, -1, 250, -250, WIN_SCORE - 9, -(WIN_SCORE - 9)):
+            position = LineBoard(get_geometry(5, 4))
+            position.play(12, X)
+            key = position.hash ^ position.geometry.side_key
+            table = {key: TTEntry(score_to_table(score, stored_ply), Bound.EXACT, 0, WIN_SCORE)}
+            negamax, _ = make_negamax(position, table, float('inf'))
+            got = negamax(O, 4, probe_ply, -WIN_SCORE - 1, WIN_SCORE + 1)
+            # A win in k plies from the node scores WIN_SCORE - (ply + k) wherever it is found
+            shift = probe_ply - stored_ply
+            expected = score - shift if score >= MATE_BOUND else score + shift if score <= -MATE_BOUND else score
+            checked += 1
+            if got != expected:
+                failures += 1
+                print(f"[table] {score} stored at ply {stored_ply}, probed at ply {probe_ply}: "
+                      f"got {got}, expected {expected}")
+    print(f"Checked {checked} stored scores: {failures} mismatches")
+    return failures
+
+
+def verify_heuristic_bound(max_size: int = 15) -> int:
+    """Every board the menu offers must keep heuristic scores below MATE_BOUND; returns the failures"""
+    failures = 0
+    checked = 0
+    for size in range(3, max_size + 1):
+        for win_length in range(3, size + 1):
+            geometry = get_geometry(size, win_length)
+            # The best evaluation short of a win: every line one piece from completion
+            highest = geometry.weights[win_length - 1] * len(geometry.lines)
+            checked += 1
+            if highest >= MATE_BOUND:
+                failures += 1
+                print(f"[bound] {size}x{size}, {win_length} in a row: heuristic reaches {highest}")
+    print(f"Checked {checked} board variants: {failures} over the mate bound")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if verify() + verify_table_scores() + verify_heuristic_bound() else 0)
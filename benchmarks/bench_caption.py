@@ -0,0 +1,52 @@
+"""Captioning benchmarks: images per second and batch latency.
+
+The sample images are captioned in batches of every size in ``BATCH_SIZES``
+with every beam width in ``BEAMS``. Each batch is one preprocess, generate
+and decode pass; the cache is not involved. The model is loaded offline
+(a snapshot or the Hugging Face cache) and never downloaded, so this group
+is skipped on machines without torch, transformers or the model files.
+"""
+import os
+from typing import Dict, Optional
+
+from common import add_project_path, best, latency_metrics, metric, repeat
+
+CAPTION_DIR = add_project_path('Image-captioning')
+
+BATCH_SIZES = (1, 4, 8)
+BEAMS = (1, 4)
+
+
+def unavailable() -> Optional[str]:
+    """Why this group cannot run here, or None"""
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    try:
+        import torch  # noqa: F401
+        import transformers  # noqa: F401
+    except ImportError as e:
+        return f"needs torch and transformers ({e})"
+    from image_caption import get_model
+    try:
+        get_model()
+    except OSError as e:
+        return f"model files are not available offline ({e})"
+    return None
+
+
+def run(quick: bool = False, repeats: int = 5) -> Dict[str, Dict]:
+    from image_caption import SAMPLE_IMAGES, decode, generate, load_image, preprocess
+
+    samples = [load_image(str(CAPTION_DIR / name)) for name in SAMPLE_IMAGES]
+    results: Dict[str, Dict] = {}
+    repeats = max(2, repeats // 2) if quick else repeats
+    for batch_size in BATCH_SIZES[:2] if quick else BATCH_SIZES:
+        images = [samples[index % len(samples)] for index in range(batch_size)]
+        for beams in BEAMS:
+            def caption():
+                decode(generate(preprocess(images), num_beams=beams))
+
+            timings = repeat(caption, repeats)
+            name = f'caption.batch{batch_size}.beams{beams}'
+            results[f'{name}.images_per_second'] = metric(batch_size / best(timings), 'images/s', True)
+            results.update(latency_metrics(f'{name}.batch_latency', timings, unit='ms'))
+    return results
@@ -0,0 +1,91 @@
+"""Chatbot benchmarks: messages per second through the matcher.
+
+The corpus is the load generator's (``loadgen.build_corpus``): rule keywords
+with filler words, yes/no answers and unmatched text that falls through to
+the intent layer and the default reply. Every rule is checked to be hit.
+
+- ``chatbot.get_response``: the stateless ``get_response``
+- ``chatbot.conversation``: ``Conversation.reply`` with follow-up handling
+- ``chatbot.default``: unmatched messages only (the fuzzy fallback path)
+- ``chatbot.keywords_only``: the same corpus with the intent layer disabled
+"""
+import random
+import time
+from collections import Counter
+from itertools import cycle
+from typing import Dict
+
+from common import add_project_path, best, latency_metrics, metric, repeat
+
+CHATBOT_DIR = add_project_path('Rule-Based-Chatbot')
+
+CORPUS_SIZE = 100_000
+QUICK_CORPUS_SIZE = 10_000
+
+
+def _corpus(size: int):
+    from loadgen import UNMATCHED, build_corpus
+    from rules import load_rules
+    corpus = build_corpus(size=size, seed=0)
+    matcher = load_rules()
+    # Make sure every rule shows up at least once, whatever the random mix
+    for rule in matcher.rules:
+        triggers = rule.keywords + rule.words
+        if triggers and rule.name != 'bye':
+            corpus.append(f"tell me {triggers[0]}")
+    random.Random(0).shuffle(corpus)
+    default = [f"{text} {index}" for index, text in zip(range(size // 10), cycle(UNMATCHED))]
+    return corpus, default, matcher
+
+
+def run(quick: bool = False, repeats: int = 5) -> Dict[str, Dict]:
+    import Chatbot
+    from rules import load_rules
+
+    corpus, default, matcher = _corpus(QUICK_CORPUS_SIZE if quick else CORPUS_SIZE)
+    # Chatbot loads its rules on first use; keep that out of the timings
+    Chatbot.set_matcher(matcher)
+    hits = Counter(matcher.match(message).name for message in corpus)
+    results: Dict[str, Dict] = {}
+
+    def responses():
+        for message in corpus:
+            Chatbot.get_response(message)
+
+    seconds = best(repeat(responses, repeats))
+    results['chatbot.get_response.messages_per_second'] = metric(
+        len(corpus) / seconds, 'messages/s', True, messages=len(corpus), rules_hit=len(hits),
+        default_share=round(hits.get(matcher.default.name, 0) / len(corpus), 4))
+
+    def conversation():
+        session = Chatbot.Conversation()
+        for message in corpus:
+            session.reply(message)
+
+    seconds = best(repeat(conversation, repeats))
+    results['chatbot.conversation.messages_per_second'] = metric(len(corpus) / seconds, 'messages/s', True)
+
+    def fallbacks():
+        for message in default:
+            Chatbot.get_response(message)
+
+    seconds = best(repeat(fallbacks, repeats))
+    results['chatbot.default.messages_per_second'] = metric(len(default) / seconds, 'messages/s', True)
+
+    keywords_only = load_rules(use_intents=False)
+
+    def keyword_matches():
+        for message in corpus:
+            keywords_only.match(message).render()
+
+    seconds = best(repeat(keyword_matches, repeats))
+    results['chatbot.keywords_only.messages_per_second'] = metric(len(corpus) / seconds, 'messages/s', True)
+
+    latencies = []
+    for _ in range(repeats):
+        for message in corpus[:len(corpus) // 5]:
+            start = time.perf_counter()
+            Chatbot.get_response(message)
+            latencies.append(time.perf_counter() - start)
+    results.update(latency_metrics('chatbot.get_response.latency', latencies))
+    return results
@@ -0,0 +1,137 @@
+"""Tic-Tac-Toe benchmarks: HARD move latency and minimax nodes per second.
+
+Every reachable 3x3 position with the AI to move is searched:
+
+- ``game.hard.move_latency``: ``get_best_move`` at HARD, as the game plays it
+  (a solved-table lookup)
+- ``game.minimax``: the full alpha-beta search HARD falls back to (what
+  ``score_moves`` runs for every empty square), each position with an empty
+  transposition table. Nodes are counted in a separate pass so counting does
+  not slow down the timed one
+- ``game.engine``: the N×N engine at a fixed depth on 4x4 and 5x5 boards
+- ``game.engine.parallel``: the same searches split across one process per
+  CPU (``parallel_search``), with the speedup over one process; only on
+  machines with more than one CPU
+- ``game.mcts``: Monte Carlo tree search playouts per second from the empty
+  3x3 and 7x7 (five in a row) boards
+"""
+import os
+import time
+from typing import Dict, List, Tuple
+
+from common import add_project_path, best, latency_metrics, metric, repeat
+
+GAME_DIR = add_project_path('Tic-Tac-Toe-AI-Game')
+
+from bitboard import FULL_BOARD, mask_to_moves  # noqa: E402
+
+ENGINE_CASES = ((4, 4, 7), (5, 4, 6))  # (size, win length, depth)
+MCTS_CASES = ((3, 3, 4096), (7, 5, 2048))  # (size, win length, playouts)
+
+
+def _positions(quick: bool) -> List[Tuple[int, int]]:
+    from verify_search import reachable_positions
+    positions = sorted((ai, human) for ai, human, ai_to_move in reachable_positions() if ai_to_move)
+    return positions[::10] if quick else positions
+
+
+def _set_position(game, ai_bits: int, human_bits: int):
+    game.reset()
+    for square in range(9):
+        if ai_bits >> square & 1:
+            game.make_move(square, game.ai)
+        elif human_bits >> square & 1:
+            game.make_move(square, game.human)
+
+
+def _search_all(game, positions: List[Tuple[int, int]]):
+    """Score every move of every position like ``score_moves``, each with an empty table"""
+    for ai_bits, human_bits in positions:
+        game.transposition_table = {}
+        empty = FULL_BOARD & ~(ai_bits | human_bits)
+        for move in mask_to_moves(empty):
+            game.minimax(ai_bits | 1 << move, human_bits, 0, False)
+
+
+def _count_nodes(game, positions: List[Tuple[int, int]]) -> int:
+    nodes = 0
+    search = game.minimax
+
+    def counted(*args):
+        nonlocal nodes
+        nodes += 1
+        return search(*args)
+
+    # The recursion calls self.minimax, so an instance attribute sees every node
+    game.minimax = counted
+    try:
+        _search_all(game, positions)
+    finally:
+        del game.minimax
+    return nodes
+
+
+def run(quick: bool = False, repeats: int = 5) -> Dict[str, Dict]:
+    from engine import X, LineBoard, get_geometry, iterative_deepening
+    from verify_search import load_game_module
+
+    game_module = load_game_module()
+    positions = _positions(quick)
+    results: Dict[str, Dict] = {}
+    game = game_module.TicTacToe(difficulty=game_module.Difficulty.HARD, think_delay=0, stats_file=None)
+
+    latencies = []
+    for _ in range(repeats):
+        for ai_bits, human_bits in positions:
+            _set_position(game, ai_bits, human_bits)
+            start = time.perf_counter()
+            game.get_best_move()
+            latencies.append(time.perf_counter() - start)
+    results.update(latency_metrics('game.hard.move_latency', latencies))
+
+    seconds = best(repeat(lambda: _search_all(game, positions), repeats))
+    nodes = _count_nodes(game, positions)
+    results['game.minimax.nodes_per_second'] = metric(nodes / seconds, 'nodes/s', True,
+                                                      nodes=nodes, positions=len(positions))
+    results['game.minimax.mean_move_ms'] = metric(seconds / len(positions) * 1e3, 'ms', False)
+
+    serial_seconds = {}
+
+    for size, win_length, depth in ENGINE_CASES[:1] if quick else ENGINE_CASES:
+        geometry = get_geometry(size, win_length)
+        outcome = {}
+
+        def search():
+            outcome['result'] = iterative_deepening(LineBoard(geometry), X, float('inf'), depth)
+
+        seconds = best(repeat(search, max(1, repeats // 2)))
+        name = f'game.engine.{size}x{size}k{win_length}.depth{depth}'
+        results[f'{name}.nodes_per_second'] = metric(outcome['result'].nodes / seconds, 'nodes/s', True,
+                                                     nodes=outcome['result'].nodes)
+        results[f'{name}.seconds'] = metric(seconds, 's', False)
+        serial_seconds[(size, win_length, depth)] = seconds
+
+    workers = os.cpu_count() or 1
+    if workers > 1:
+        from parallel_search import ParallelSearch
+        with ParallelSearch(workers) as parallel:
+            for (size, win_length, depth), serial in serial_seconds.items():
+                geometry = get_geometry(size, win_length)
+
+                def search():
+                    # A fresh game each time, so every run starts with empty worker tables
+                    parallel.new_game()
+                    parallel.search(LineBoard(geometry), X, float('inf'), depth)
+
+                seconds = best(repeat(search, max(1, repeats // 2)))
+                name = f'game.engine.parallel.{size}x{size}k{win_length}.depth{depth}'
+                results[f'{name}.seconds'] = metric(seconds, 's', False, workers=workers)
+                results[f'{name}.speedup'] = metric(serial / seconds, 'x', True, gate=False)
+
+    from mcts import mcts_search
+    for size, win_length, playouts in MCTS_CASES:
+        geometry = get_geometry(size, win_length)
+        seconds = best(repeat(lambda: mcts_search(LineBoard(geometry), X, playouts, rng=0), repeats))
+        results[f'game.mcts.{size}x{size}k{win_length}.playouts_per_second'] = metric(
+            playouts / seconds, 'playouts/s', True, playouts=playouts)
+    return results
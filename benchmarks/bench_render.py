@@ -0,0 +1,164 @@
+"""Terminal rendering benchmarks: frame time and write syscalls per frame.
+
+A game's frames (one per move) are drawn into a pseudo-terminal, so stdout
+is a real TTY with the same line buffering as an interactive session. The
+raw file under the text stream counts every ``write`` that reaches the OS.
+
+- ``render.renderer``: ``BoardRenderer.draw`` as the game uses it now
+- ``render.legacy``: the previous ``print_board`` (``os.system('clear')``
+  then one ``print`` per board line), which also starts a process per frame
+
+Each is measured on a 3x3 game and on 40 moves of a 15x15 game.
+"""
+import io
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from common import add_project_path, metric
+
+GAME_DIR = add_project_path('Tic-Tac-Toe-AI-Game')
+
+CASES = ((3, 9), (15, 40))  # (board size, moves)
+
+
+def unavailable() -> Optional[str]:
+    """Why this group cannot run here, or None"""
+    if not hasattr(os, 'openpty'):
+        return "needs a pseudo-terminal (os.openpty)"
+    if shutil.which('clear') is None:
+        return "the legacy path needs the clear command"
+    return None
+
+
+class CountingFile(io.FileIO):
+    """A raw file that counts the write calls that reach the OS"""
+
+    writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+class Terminal:
+    """A pseudo-terminal whose output is drained (and discarded) by a thread"""
+
+    def __init__(self, rows: int = 60, columns: int = 200):
+        import fcntl
+        import struct
+        import termios
+        self.master, self.slave = os.openpty()
+        # Tall enough for the incremental path on every board in CASES
+        fcntl.ioctl(self.slave, termios.TIOCSWINSZ, struct.pack('HHHH', rows, columns, 0, 0))
+        self.raw = CountingFile(self.slave, 'w', closefd=False)
+        self.stream = io.TextIOWrapper(io.BufferedWriter(self.raw), encoding='utf-8', line_buffering=True)
+        self.reader = threading.Thread(target=self._drain, daemon=True)
+        self.reader.start()
+
+    def _drain(self):
+        try:
+            while os.read(self.master, 65536):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        self.stream.flush()
+        os.close(self.slave)
+        self.reader.join(timeout=5)
+        os.close(self.master)
+
+
+def _frames(size: int, moves: int, seed: int = 0) -> List[List[str]]:
+    """Boards after each move of a random game, starting with the empty board"""
+    rng = random.Random(seed)
+    board = [' '] * (size * size)
+    cells = list(range(size * size))
+    rng.shuffle(cells)
+    frames = [list(board)]
+    for index, cell in enumerate(cells[:moves]):
+        board[cell] = 'X' if index % 2 == 0 else 'O'
+        frames.append(list(board))
+    return frames
+
+
+def legacy_print_board(board: List[str], size: int):
+    """``TicTacToe.print_board`` before the renderer"""
+    from colorama import Fore, Style
+    os.system('clear' if os.name == 'posix' else 'cls')
+    print("\n")
+
+    def color_cell(cell):
+        if cell == 'X':
+            return f"{Fore.GREEN}{cell}{Style.RESET_ALL}"
+        elif cell == 'O':
+            return f"{Fore.RED}{cell}{Style.RESET_ALL}"
+        else:
+            return cell
+
+    separator = '|'.join(['_____'] * size)
+    board_display = []
+    for row in range(size):
+        if row:
+            board_display.append(separator)
+        cells = board[row * size:(row + 1) * size]
+        board_display.append("  " + "  |  ".join(color_cell(cell) for cell in cells))
+
+    for line in board_display:
+        print(line)
+    print()
+
+
+def _measure(draw, frames: List[List[str]], terminal: Terminal, repeats: int):
+    """Best per-frame seconds and write syscalls per frame"""
+    best_seconds = float('inf')
+    writes = 0
+    for _ in range(repeats):
+        before = terminal.raw.writes
+        start = time.perf_counter()
+        draw(frames)
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+        writes = terminal.raw.writes - before
+    return best_seconds / len(frames), writes / len(frames)
+
+
+def run(quick: bool = False, repeats: int = 5) -> Dict[str, Dict]:
+    from renderer import BoardRenderer
+
+    results: Dict[str, Dict] = {}
+    terminal = Terminal()
+    saved_stdout = sys.stdout
+    saved_fd = os.dup(1)
+    try:
+        # The legacy path prints to sys.stdout and its clear process writes to fd 1
+        sys.stdout = terminal.stream
+        os.dup2(terminal.slave, 1)
+        for size, moves in CASES[:1] if quick else CASES:
+            frames = _frames(size, moves)
+
+            def renderer(frames):
+                board_renderer = BoardRenderer(size, terminal.stream)
+                for board in frames:
+                    board_renderer.draw(board)
+
+            def legacy(frames):
+                for board in frames:
+                    legacy_print_board(board, size)
+
+            for name, draw in (('renderer', renderer), ('legacy', legacy)):
+                seconds, writes = _measure(draw, frames, terminal, max(2, repeats // 2) if quick else repeats)
+                prefix = f'render.{name}.{size}x{size}'
+                results[f'{prefix}.frame_us'] = metric(seconds * 1e6, 'us', False, frames=len(frames))
+                results[f'{prefix}.writes_per_frame'] = metric(
+                    writes, 'writes', False, processes_per_frame=1 if name == 'legacy' else 0)
+    finally:
+        sys.stdout = saved_stdout
+        os.dup2(saved_fd, 1)
+        os.close(saved_fd)
+        terminal.close()
+    return results
@@ -0,0 +1,102 @@
+"""Shared helpers for the benchmark suite: timing, metrics and baselines."""
+import gc
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def add_project_path(directory: str) -> Path:
+    """Make a project's modules importable (the projects are plain script folders)"""
+    path = ROOT / directory
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+    return path
+
+
+def metric(value: float, unit: str, higher_is_better: bool, gate: bool = True, **details) -> Dict:
+    """One result; metrics with ``gate=False`` are reported but never fail a comparison"""
+    entry = {"value": value, "unit": unit, "higher_is_better": higher_is_better, "gate": gate}
+    if details:
+        entry["details"] = details
+    return entry
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def repeat(function: Callable[[], object], repeats: int, warmup: int = 1) -> List[float]:
+    """Wall seconds of ``repeats`` calls after ``warmup`` untimed ones"""
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def best(timings: Sequence[float]) -> float:
+    """The fastest repetition: the one least disturbed by the rest of the machine"""
+    return min(timings)
+
+
+def latency_metrics(prefix: str, seconds: Sequence[float], unit: str = 'us') -> Dict[str, Dict]:
+    """p50/p95/p99 of per-call latencies; only the median gates comparisons, the tail is too noisy"""
+    scale = {'us': 1e6, 'ms': 1e3, 's': 1.0}[unit]
+    ordered = sorted(seconds)
+    return {f"{prefix}.p{int(fraction * 100)}": metric(percentile(ordered, fraction) * scale, unit, False,
+                                                       gate=fraction == 0.5)
+            for fraction in (0.5, 0.95, 0.99)}
+
+
+def environment() -> Dict:
+    """Where the numbers came from; results are only comparable on the same setup"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or None,
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """Every metric present in both runs with its relative change.
+
+    ``change`` is positive when the metric got better. A gating metric
+    regressed when it got worse by more than ``threshold`` (a fraction of the
+    baseline).
+    """
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if not current["higher_is_better"]:
+            change = -change
+        rows.append({"name": name, "baseline": previous["value"], "value": current["value"],
+                     "unit": current["unit"], "change": change,
+                     "regressed": current.get("gate", True) and change < -threshold})
+    return rows
+
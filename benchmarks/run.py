@@ -0,0 +1,126 @@
+"""Benchmark suite for the game, its terminal rendering, the chatbot and the captioner.
+
+Runs offline and writes every metric to a JSON file together with the
+environment it was measured on. With a baseline (by default
+``benchmarks/baseline.json``, if present) every shared metric is compared
+and the run fails when any of them got worse by more than ``--threshold``.
+
+Usage::
+
+    python benchmarks/run.py --save-baseline          # record a baseline on this machine
+    python benchmarks/run.py                          # compare against it
+    python benchmarks/run.py game chatbot --quick     # a subset, fewer samples
+
+Numbers are only comparable on the same machine and Python, so record the
+baseline where the comparisons will run. Groups whose dependencies are
+missing (captioning without torch or the model files, rendering without a
+pseudo-terminal) are reported as skipped.
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import compare, environment  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_BASELINE = HERE / 'baseline.json'
+DEFAULT_OUTPUT = HERE / 'results.json'
+DEFAULT_THRESHOLD = 0.10
+GROUPS = ('game', 'chatbot', 'render', 'caption')
+
+
+def run_group(name: str, quick: bool, repeats: int) -> Dict:
+    if name == 'game':
+        import bench_game as module
+    elif name == 'chatbot':
+        import bench_chatbot as module
+    elif name == 'render':
+        import bench_render as module
+    else:
+        import bench_caption as module
+    reason = module.unavailable() if hasattr(module, 'unavailable') else None
+    if reason:
+        return {"skipped": reason}
+    start = time.perf_counter()
+    metrics = module.run(quick=quick, repeats=repeats)
+    return {"metrics": metrics, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def run_suite(groups: List[str], quick: bool = False, repeats: int = 5) -> Dict:
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "quick": quick,
+        "environment": environment(),
+        "groups": {},
+        "metrics": {},
+    }
+    for name in groups:
+        print(f"Running {name} benchmarks...", file=sys.stderr)
+        outcome = run_group(name, quick, repeats)
+        metrics = outcome.pop("metrics", {})
+        results["groups"][name] = outcome
+        results["metrics"].update(metrics)
+        if "skipped" in outcome:
+            print(f"  skipped: {outcome['skipped']}", file=sys.stderr)
+    return results
+
+
+def format_value(value: float) -> str:
+    return f"{value:,.0f}" if abs(value) >= 100 else f"{value:.3g}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the game, chatbot and captioner")
+    parser.add_argument('groups', nargs='*', help=f"benchmark groups: {', '.join(GROUPS)} (default: all)")
+    parser.add_argument('--quick', action='store_true', help="fewer positions, messages and samples")
+    parser.add_argument('--repeats', type=int, default=5, help="timed repetitions per benchmark (the fastest is kept)")
+    parser.add_argument('-o', '--output', type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when a metric is worse than the baseline by more than this fraction")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.groups if name not in GROUPS]
+    if unknown:
+        parser.error(f"unknown benchmark group(s): {', '.join(unknown)} (choose from {', '.join(GROUPS)})")
+
+    results = run_suite(args.groups or list(GROUPS), args.quick, args.repeats)
+    args.output.write_text(json.dumps(results, indent=2) + "\n", encoding='utf-8')
+
+    baseline = None
+    if not args.save_baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if baseline.get("quick") != args.quick:
+            print(f"Note: baseline was recorded with quick={baseline.get('quick')}", file=sys.stderr)
+    rows = {row["name"]: row for row in compare(results["metrics"], baseline["metrics"], args.threshold)} \
+        if baseline else {}
+
+    width = max((len(name) for name in results["metrics"]), default=0)
+    for name, entry in results["metrics"].items():
+        line = f"{name:<{width}}  {format_value(entry['value']):>12} {entry['unit']}"
+        row = rows.get(name)
+        if row is not None:
+            marker = "REGRESSION" if row["regressed"] else ""
+            line += f"  ({row['change'] * 100:+.1f}% vs {format_value(row['baseline'])}) {marker}"
+        print(line.rstrip())
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n", encoding='utf-8')
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    regressions = [row for row in rows.values() if row["regressed"]]
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())